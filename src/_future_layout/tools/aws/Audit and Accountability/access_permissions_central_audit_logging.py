@@ -5,7 +5,7 @@ import json
 # Adjust the Python path to include the parent directory of aws
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from _config.config import environments, current_year, current_date
+from _config.config import environments, current_year, current_date, run_environments
 from _config.command_runner import CommandRunner
 from _config.aws_handler import AWSHandler
 
@@ -24,9 +24,7 @@ def main():
     """
     command_runner = CommandRunner()
 
-    for env_name, config in environments.items():
-        config.set_aws_credentials()  # Set AWS credentials
-
+    def collect(env_name, config):
         aws_handler = AWSHandler(env_name, config)
 
         # Generate the output file path for IAM policies related to CloudTrail access
@@ -87,5 +85,7 @@ def main():
         # Collect evidence for CloudTrail event selectors
         aws_handler.collect_evidence(command_runner, aws_command_cloudtrail_event_selectors, output_file_cloudtrail_event_selectors)
 
+    run_environments(environments, collect)
+
 if __name__ == "__main__":
     main()
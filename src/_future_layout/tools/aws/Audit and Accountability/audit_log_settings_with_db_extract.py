@@ -6,7 +6,7 @@ from datetime import datetime, timedelta
 # Adjust the Python path to include the parent directory of aws
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from _config.config import environments, current_year, current_date
+from _config.config import environments, current_year, current_date, run_environments
 from _config.command_runner import CommandRunner
 from _config.aws_handler import AWSHandler
 
@@ -22,9 +22,7 @@ def main():
     # Calculate the date 30 days ago from today for recent log extract
     start_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%dT%H:%M:%SZ')
 
-    for env_name, config in environments.items():
-        config.set_aws_credentials()  # Set AWS credentials
-
+    def collect(env_name, config):
         aws_handler = AWSHandler(env_name, config)
 
         # Generate the output file path
@@ -54,5 +52,7 @@ def main():
         for aws_command in aws_commands:
             aws_handler.collect_evidence(command_runner, aws_command, output_file)
 
+    run_environments(environments, collect)
+
 if __name__ == "__main__":
     main()
@@ -6,9 +6,15 @@ from datetime import datetime, timedelta
 # Adjust the Python path to include the parent directory of aws
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from _config.config import environments, current_year, current_date
+from _config.config import environments, current_year, current_date, run_environments
 from _config.command_runner import CommandRunner
 from _config.aws_handler import AWSHandler
+from _config.formats import LARGE_OUTPUT_FORMAT
+from _config.logs_insights import InsightsExtractor, trail_log_groups
+from _config.streaming import open_writer
+
+# Comma separated log groups to extract; unset extracts the groups CloudTrail delivers to
+LOG_GROUPS_ENV_VAR = 'AUDITBUDDY_AUDIT_LOG_GROUPS'
 
 
 def main():
@@ -19,18 +25,17 @@ def main():
     """
     command_runner = CommandRunner()
 
-    # Calculate the date 30 days ago from today for recent log extract
-    start_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%dT%H:%M:%SZ')
-
-    for env_name, config in environments.items():
-        config.set_aws_credentials()  # Set AWS credentials
+    # The recent log extract covers the last 30 days
+    end_time = datetime.now()
+    start_time = end_time - timedelta(days=30)
 
+    def collect(env_name, config):
         aws_handler = AWSHandler(env_name, config)
 
         # Generate the output file path
         output_file = f"/evidence-artifacts/{current_year}/{env_name}/{current_date}.audit_log_settings.json"
 
-        # Define the AWS CLI commands to gather evidence of audit log settings and recent logs
+        # Define the AWS CLI commands to gather evidence of audit log settings
         aws_commands = [
             [
                 'aws', 'cloudtrail', 'describe-trails',
@@ -39,13 +44,6 @@ def main():
             [
                 'aws', 'logs', 'describe-log-groups',
                 '--region', config.region, '--output', 'json'
-            ],
-            [
-                'aws', 'logs', 'filter-log-events',
-                '--log-group-name', '<your-log-group-name>',
-                '--start-time', str(int(datetime.now().timestamp() - 30 * 86400) * 1000),
-                '--end-time', str(int(datetime.now().timestamp()) * 1000),
-                '--region', config.region, '--output', 'json'
             ]
         ]
 
@@ -53,5 +51,21 @@ def main():
         for aws_command in aws_commands:
             aws_handler.collect_evidence(command_runner, aws_command, output_file)
 
+        # Extract the recent logs with parallel Logs Insights queries over time slices
+        engine = command_runner.engine_for(env_name, config).for_region(config.region)
+        log_groups = [group.strip() for group in os.getenv(LOG_GROUPS_ENV_VAR, '').split(',') if group.strip()]
+        log_groups = log_groups or trail_log_groups(engine, config.region)
+        if not log_groups:
+            print(f"No CloudTrail log group in {config.region} for {env_name} and {LOG_GROUPS_ENV_VAR} is unset, skipping the log extract")
+            return
+        extract_file = f"/evidence-artifacts/{current_year}/{env_name}/{current_date}.audit_log_extract.json"
+        extractor = InsightsExtractor(engine)
+        with open_writer(extract_file, LARGE_OUTPUT_FORMAT) as extract:
+            for row in extractor.rows(log_groups, start_time, end_time):
+                extract.write(row)
+        print(f"Log extract for {env_name} environment saved to {extract.path} ({extract.count} events, {extractor.report()})")
+
+    run_environments(environments, collect)
+
 if __name__ == "__main__":
     main()
@@ -1,12 +1,16 @@
 import sys
 import os
+from datetime import datetime
 
 # Adjust the Python path to include the parent directory of aws
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from _config.config import environments, current_year, current_date
+from _config.config import environments, current_year, current_date, run_environments
+from _config.cloudtrail_archive import caller_account, cloudtrail_archive, management_event
 from _config.command_runner import CommandRunner
-from _config.aws_handler import AWSHandler
+from _config.event_cache import EventPartitionCache, LOOKUP_EVENTS_RETENTION, archive_fetcher, lookup_events_fetcher
+from _config.formats import LARGE_OUTPUT_FORMAT
+from _config.streaming import open_writer
 
 def main():
     """
@@ -25,41 +29,45 @@ def main():
     """
     command_runner = CommandRunner()
 
-    for env_name, config in environments.items():
-        config.set_aws_credentials()  # Set AWS credentials
-
-        aws_handler = AWSHandler(env_name, config)
-
+    def collect(env_name, config):
         # Generate the output file path for CloudTrail event logs
         output_file_cloudtrail_logs = f"/evidence-artifacts/{current_year}/{env_name}/{current_date}.cloudtrail_audit_logs.json"
 
-        # Define the AWS CLI command for describing CloudTrail events
-        aws_command_cloudtrail_logs = [
-            'aws', 'cloudtrail', 'lookup-events', '--region', config.region, '--output', 'json',
-            '--start-time', '2023-01-01T00:00:00Z', '--end-time', current_date
-        ]
-
-        # Collect evidence for CloudTrail event logs
-        cloudtrail_logs = aws_handler.collect_evidence(command_runner, aws_command_cloudtrail_logs, output_file_cloudtrail_logs, return_data=True)
+        # Stream the raw CloudTrail events and the parsed view of each event side by side
+        parsed_output_file = f"/evidence-artifacts/{current_year}/{env_name}/{current_date}.parsed_audit_events.json"
+        engine = command_runner.engine_for(env_name, config)
+        account = caller_account(engine)
+        archive = cloudtrail_archive(engine)
+        if archive is not None:
+            # The trail's S3 archive reaches back past lookup-events' 90 days, in minutes instead of hours
+            cache = EventPartitionCache(account, config.region, 'archive:management')
+            fetch = archive_fetcher(archive, accounts=[account], regions=[config.region], predicate=management_event)
+            earliest = None
+        else:
+            # Describe CloudTrail events; lookup-events sees the last 90 days, older days come from the cache
+            cache = EventPartitionCache(account, config.region, 'lookup-events:all')
+            fetch = lookup_events_fetcher(engine, config.region)
+            earliest = datetime.utcnow() - LOOKUP_EVENTS_RETENTION
 
-        # Parse and store relevant details for each event
-        parsed_events = []
-        for event in cloudtrail_logs['Events']:
-            event_details = {
-                "EventType": event.get('EventName'),
-                "EventTime": event.get('EventTime'),
-                "EventSource": event.get('EventSource'),
-                "AWSRegion": event.get('AwsRegion'),
-                "SourceIPAddress": event.get('SourceIPAddress'),
-                "UserIdentity": event.get('Username', event.get('UserIdentity', {}).get('Arn')),
-                "EventOutcome": "Success" if event.get('ErrorCode') is None else f"Failed: {event.get('ErrorCode')}"
-            }
-            parsed_events.append(event_details)
+        # Past days are read from the day-partition cache, only new days are fetched
+        events = cache.events('2023-01-01T00:00:00Z', current_date, fetch, earliest)
+        with open_writer(output_file_cloudtrail_logs, LARGE_OUTPUT_FORMAT) as raw_events, \
+                open_writer(parsed_output_file, LARGE_OUTPUT_FORMAT) as parsed_events:
+            for event in events:
+                raw_events.write(event)
+                # Parse and store relevant details for each event
+                parsed_events.write({
+                    "EventType": event.get('EventName'),
+                    "EventTime": event.get('EventTime'),
+                    "EventSource": event.get('EventSource'),
+                    "AWSRegion": event.get('AwsRegion'),
+                    "SourceIPAddress": event.get('SourceIPAddress'),
+                    "UserIdentity": event.get('Username', event.get('UserIdentity', {}).get('Arn')),
+                    "EventOutcome": "Success" if event.get('ErrorCode') is None else f"Failed: {event.get('ErrorCode')}"
+                })
+        print(f"Evidence for {env_name} environment saved to {raw_events.path} ({raw_events.count} events, {cache.report()})")
 
-        # Save parsed events to a JSON file
-        parsed_output_file = f"/evidence-artifacts/{current_year}/{env_name}/{current_date}.parsed_audit_events.json"
-        with open(parsed_output_file, 'w') as f:
-            json.dump(parsed_events, f, indent=4)
+    run_environments(environments, collect)
 
 if __name__ == "__main__":
     main()
@@ -4,16 +4,14 @@ import os
 # Adjust the Python path to include the parent directory of aws
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from _config.config import environments, current_year, current_date
+from _config.config import environments, current_year, current_date, run_environments
 from _config.command_runner import CommandRunner
 from _config.aws_handler import AWSHandler
 
 def main():
     command_runner = CommandRunner()
 
-    for env_name, config in environments.items():
-        config.set_aws_credentials()  # Set AWS credentials
-
+    def collect(env_name, config):
         aws_handler = AWSHandler(env_name, config)
 
         # Database audit trail logs rules configuration
@@ -24,7 +22,7 @@ def main():
             '--region', config.region,
             '--output', 'json'
         ]
-        aws_handler.collect_evidence(command_runner, db_audit_command, db_audit_output_file)
+        aws_handler.stream_evidence(command_runner, db_audit_command, db_audit_output_file)
 
         # Incident response tool configuration
         ir_tool_output_file = f"/evidence-artifacts/{current_year}/{env_name}/{current_date}.incident_response_tool_config.json"
@@ -34,7 +32,9 @@ def main():
             '--lookup-attributes', 'AttributeKey=EventName,AttributeValue=StopLogging',
             '--output', 'json'
         ]
-        aws_handler.collect_evidence(command_runner, ir_tool_command, ir_tool_output_file)
+        aws_handler.stream_evidence(command_runner, ir_tool_command, ir_tool_output_file)
+
+    run_environments(environments, collect)
 
 if __name__ == "__main__":
     main()
@@ -6,7 +6,7 @@ from datetime import datetime, timedelta
 # Adjust the Python path to include the parent directory of aws
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from _config.config import environments, current_year, current_date
+from _config.config import environments, current_year, current_date, run_environments
 from _config.command_runner import CommandRunner
 from _config.aws_handler import AWSHandler
 
@@ -26,9 +26,7 @@ def main():
     command_runner = CommandRunner()
     start_time, end_time = get_time_range()
 
-    for env_name, config in environments.items():
-        config.set_aws_credentials()  # Set AWS credentials
-
+    def collect(env_name, config):
         aws_handler = AWSHandler(env_name, config)
 
         # Generate the output file path
@@ -45,5 +43,7 @@ def main():
         # Collect evidence
         aws_handler.collect_evidence(command_runner, privileged_functions_command, privileged_functions_output_file)
 
+    run_environments(environments, collect)
+
 if __name__ == "__main__":
     main()
@@ -7,16 +7,14 @@ from datetime import datetime, timedelta
 # Adjust the Python path to include the parent directory of aws
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from _config.config import environments, current_year, current_date
+from _config.config import environments, current_year, current_date, run_environments
 from _config.command_runner import CommandRunner
 from _config.aws_handler import AWSHandler
 
 def main():
     command_runner = CommandRunner()
 
-    for env_name, config in environments.items():
-        config.set_aws_credentials()  # Set AWS credentials
-
+    def collect(env_name, config):
         aws_handler = AWSHandler(env_name, config)
 
         # Calculate the start date for the last 183 days
@@ -48,6 +46,8 @@ def main():
                 output_file = commands[1]["output_file_template"].replace('<repository-name>', repository).replace('<commit-id>', commit)
                 aws_handler.collect_evidence(command_runner, commit_command, output_file)
 
+    run_environments(environments, collect)
+
 if __name__ == "__main__":
     main()
 
@@ -3,14 +3,13 @@ import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from _config.config import environments, current_year, current_date
+from _config.config import environments, current_year, current_date, run_environments
 from _config.command_runner import CommandRunner
 from _config.aws_handler import AWSHandler
 
 def main():
     command_runner = CommandRunner()
-    for env_name, config in environments.items():
-        config.set_aws_credentials()  # Set AWS credentials
+    def collect(env_name, config):
         aws_handler = AWSHandler(env_name, config)
         # Generate the output file path
         output_file = f"/evidence-artifacts/{current_year}/{env_name}/aws/configurations/{current_date}.configuration_management.json"
@@ -20,5 +19,7 @@ def main():
         ]
         # Collect evidence
         aws_handler.collect_evidence(command_runner, aws_command, output_file)
+
+    run_environments(environments, collect)
 if __name__ == "__main__":
     main()
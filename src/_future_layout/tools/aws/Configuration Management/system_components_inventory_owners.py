@@ -6,16 +6,15 @@ import os
 # Adjust the Python path to include the parent directory of aws
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from _config.config import environments, current_year, current_date
+from _config.config import environments, current_year, current_date, run_environments
 from _config.command_runner import CommandRunner
 from _config.aws_handler import AWSHandler
+from _config.inventory import ConfigInventory, inventory_enabled, inventory_resource_type
 
 def main():
     command_runner = CommandRunner()
 
-    for env_name, config in environments.items():
-        config.set_aws_credentials()  # Set AWS credentials
-
+    def collect(env_name, config):
         aws_handler = AWSHandler(env_name, config)
 
         # Define the AWS CLI commands and output file paths
@@ -47,8 +46,16 @@ def main():
             }
         ]
 
+        # One AWS Config query serves every resource type Config records,
+        # the rest fall back to the describe commands above
+        inventory = ConfigInventory(command_runner.engine_for(env_name, config))
+        if inventory_enabled():
+            inventory.prefetch([inventory_resource_type(command["aws_command"]) for command in commands])
+
         for command in commands:
-            aws_handler.collect_evidence(command_runner, command["aws_command"], command["output_file"])
+            aws_handler.collect_inventory_evidence(command_runner, inventory, command["aws_command"], command["output_file"])
+
+    run_environments(environments, collect)
 
 if __name__ == "__main__":
     main()
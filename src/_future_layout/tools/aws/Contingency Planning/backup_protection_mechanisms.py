@@ -6,16 +6,14 @@ import os
 # Adjust the Python path to include the parent directory of aws
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from _config.config import environments, current_year, current_date
+from _config.config import environments, current_year, current_date, run_environments
 from _config.command_runner import CommandRunner
 from _config.aws_handler import AWSHandler
 
 def main():
     command_runner = CommandRunner()
 
-    for env_name, config in environments.items():
-        config.set_aws_credentials()  # Set AWS credentials
-
+    def collect(env_name, config):
         aws_handler = AWSHandler(env_name, config)
 
         # Define the AWS CLI commands and output file paths
@@ -53,6 +51,8 @@ def main():
             else:
                 aws_handler.collect_evidence(command_runner, command["aws_command"], command["output_file"])
 
+    run_environments(environments, collect)
+
 if __name__ == "__main__":
     main()
 
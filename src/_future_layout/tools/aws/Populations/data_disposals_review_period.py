@@ -4,9 +4,12 @@ import os
 from datetime import datetime, timedelta
 # Adjust the Python path to include the parent directory of aws
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from _config.config import environments, current_year, current_date
+from _config.config import environments, current_year, current_date, run_environments
 from _config.command_runner import CommandRunner
-from _config.aws_handler import AWSHandler
+from _config.cloudtrail_archive import caller_account, cloudtrail_archive
+from _config.event_cache import EventPartitionCache, LOOKUP_EVENTS_RETENTION, archive_fetcher, lookup_events_fetcher
+from _config.formats import LARGE_OUTPUT_FORMAT
+from _config.streaming import open_writer
 
 def main():
     """
@@ -18,20 +21,30 @@ def main():
     command_runner = CommandRunner()
     # Calculate the date 365 days ago from today
     start_date = (datetime.now() - timedelta(days=365)).strftime('%Y-%m-%dT%H:%M:%SZ')
-    for env_name, config in environments.items():
-        config.set_aws_credentials()  # Set AWS credentials
-        aws_handler = AWSHandler(env_name, config)
+    def collect(env_name, config):
         # Generate the output file path
         output_file = f"/evidence-artifacts/{current_year}/{env_name}/{current_date}.data_disposals.json"
-        # Define the AWS CLI command to get CloudTrail events related to S3 object deletions in the past 365 days
-        aws_command = [
-            'aws', 'cloudtrail', 'lookup-events',
-            '--region', config.region,
-            '--start-time', start_date,
-            '--lookup-attributes', 'AttributeKey=EventName,AttributeValue=DeleteObject',
-            '--output', 'json'
-        ]
-        # Collect evidence
-        aws_handler.collect_evidence(command_runner, aws_command, output_file)
+
+        engine = command_runner.engine_for(env_name, config)
+        account = caller_account(engine)
+        archive = cloudtrail_archive(engine)
+        if archive is not None:
+            # The trail's S3 archive covers the whole year and holds the S3 data events lookup-events never returns
+            cache = EventPartitionCache(account, 'all', 'archive:DeleteObject')
+            fetch = archive_fetcher(archive, event_names=['DeleteObject'], accounts=[account])
+            earliest = None
+        else:
+            # Get CloudTrail events related to S3 object deletions; lookup-events sees the last 90 days,
+            # older days come from the cache of previous runs
+            cache = EventPartitionCache(account, config.region, 'lookup-events:EventName=DeleteObject')
+            fetch = lookup_events_fetcher(engine, config.region, 'AttributeKey=EventName,AttributeValue=DeleteObject')
+            earliest = datetime.utcnow() - LOOKUP_EVENTS_RETENTION
+
+        # Past days are read from the day-partition cache, only new days are fetched
+        with open_writer(output_file, LARGE_OUTPUT_FORMAT) as writer:
+            writer.write_all(cache.events(start_date, datetime.utcnow(), fetch, earliest))
+        print(f"Evidence for {env_name} environment saved to {writer.path} ({writer.count} events, {cache.report()})")
+
+    run_environments(environments, collect)
 if __name__ == "__main__":
     main()
@@ -6,9 +6,12 @@ from datetime import datetime, timedelta
 # Adjust the Python path to include the parent directory of aws
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from _config.config import environments, current_year, current_date
+from _config.config import environments, current_year, current_date, run_environments
 from _config.command_runner import CommandRunner
 from _config.aws_handler import AWSHandler
+from _config.formats import LARGE_OUTPUT_FORMAT
+from _config.s3_listing import bucket_objects
+from _config.streaming import open_writer
 
 def main():
     """
@@ -20,27 +23,29 @@ def main():
     - Removable hard drives (EBS volumes)
     - DVD/CD Blue Ray (simulated by S3 objects)
 
-    The evidence is gathered from AWS services (S3, EBS) and saved to JSON files.
-    The data is filtered to include only changes from the previous 365 days.
+    The evidence is gathered from AWS services (S3, EBS) and saved to JSON files, the S3 objects to
+    their own `media_inventory_s3_objects` file.
+    The data is filtered to include only changes from the previous 365 days. S3 objects come from the
+    bucket's S3 Inventory report when a recent one exists, otherwise from a listing partitioned by prefix.
     """
     command_runner = CommandRunner()
 
     # Calculate the date 365 days ago
     start_date = (datetime.utcnow() - timedelta(days=365)).strftime('%Y-%m-%dT%H:%M:%SZ')
 
-    for env_name, config in environments.items():
-        config.set_aws_credentials()  # Set AWS credentials
-
+    def collect(env_name, config):
         aws_handler = AWSHandler(env_name, config)
 
-        # Generate the output file path
+        # Generate the output file paths; the S3 population has its own file so the EBS evidence never replaces it
         output_file = f"/evidence-artifacts/{current_year}/{env_name}/{current_date}.media_inventory.json"
+        s3_output_file = f"/evidence-artifacts/{current_year}/{env_name}/{current_date}.media_inventory_s3_objects.json"
 
-        # Define the AWS CLI command for S3 objects with date filtering
-        s3_inventory_command = [
-            'aws', 's3api', 'list-objects-v2', '--bucket', config.app_bucket, '--region', config.region, '--query',
-            f"Contents[?LastModified>='{start_date}']", '--output', 'json'
-        ]
+        # Collect S3 objects modified in the period from the inventory report or a parallel listing
+        engine = command_runner.engine_for(env_name, config).for_region(config.region)
+        source, objects = bucket_objects(engine, config.app_bucket, modified_since=start_date)
+        with open_writer(s3_output_file, LARGE_OUTPUT_FORMAT) as writer:
+            writer.write_all(objects)
+        print(f"Evidence for {env_name} environment saved to {writer.path} ({writer.count} objects, {source.report()})")
 
         # Define the AWS CLI command for EBS volumes with date filtering
         ebs_inventory_command = [
@@ -48,8 +53,9 @@ def main():
         ]
 
         # Collect evidence
-        aws_handler.collect_evidence(command_runner, s3_inventory_command, output_file)
         aws_handler.collect_evidence(command_runner, ebs_inventory_command, output_file)
 
+    run_environments(environments, collect)
+
 if __name__ == "__main__":
     main()
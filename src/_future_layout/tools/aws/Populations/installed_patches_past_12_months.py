@@ -1,65 +1,77 @@
 # main.py
 import sys
 import os
-from datetime import datetime, timedelta
+import itertools
+from datetime import datetime, timedelta, timezone
 
 # Adjust the Python path to include the parent directory of aws
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from _config.config import environments, current_year, current_date
+from _config.config import environments, current_year, current_date, run_environments
+from _config.batching import BatchCoalescer, batch_operation
 from _config.command_runner import CommandRunner
-from _config.aws_handler import AWSHandler
+from _config.fanout import FanOut
+from _config.formats import LARGE_OUTPUT_FORMAT
+from _config.streaming import iter_items, open_writer
+
+# Patch states that mean the patch is on the instance
+INSTALLED_STATES = 'Installed,InstalledOther,InstalledPendingReboot,InstalledRejected'
 
 def main():
     """
     Main function to collect a list of all installed patches applied to information systems in the past 12 months.
-    The evidence is gathered from AWS Systems Manager (SSM) and saved to JSON files.
+    The evidence is gathered from AWS Systems Manager (SSM) and streamed to two population files:
+    - the patch state summary of every managed instance, fetched 50 instances per call
+    - every patch installed on a managed instance in the past 12 months, fetched per instance on a concurrent pool
     """
     command_runner = CommandRunner()
+    fanout = FanOut()
 
     # Calculate the date 12 months ago
-    start_date = (datetime.utcnow() - timedelta(days=365)).strftime('%Y-%m-%dT%H:%M:%SZ')
-
-    for env_name, config in environments.items():
-        config.set_aws_credentials()  # Set AWS credentials
+    start_date = datetime.now(timezone.utc) - timedelta(days=365)
 
-        aws_handler = AWSHandler(env_name, config)
+    def collect(env_name, config):
+        engine = command_runner.engine_for(env_name, config)
+        coalescer = BatchCoalescer(engine)
 
-        # Generate the output file path
+        # Generate the output file paths
         output_file = f"/evidence-artifacts/{current_year}/{env_name}/{current_date}.installed_patches.json"
+        states_output_file = f"/evidence-artifacts/{current_year}/{env_name}/{current_date}.installed_patch_states.json"
 
-        # Define the AWS CLI command to list all managed instances
+        # Define the AWS CLI commands to list all managed instances and their patch state summaries
         list_instances_command = [
             'aws', 'ssm', 'describe-instance-information', '--region', config.region, '--output', 'json'
         ]
-
-        # Collect instance information
-        instance_info = command_runner.run(list_instances_command)
-        instances = json.loads(instance_info).get('InstanceInformationList', [])
-
-        # Initialize a list to store all patch data
-        all_patch_data = []
-
-        # Iterate over each instance to collect patch information
-        for instance in instances:
-            instance_id = instance['InstanceId']
-
-            # Define the AWS CLI command for patch compliance information with date filtering
-            patch_compliance_command = [
-                'aws', 'ssm', 'list-compliance-items', '--resource-id', instance_id, '--resource-type', 'ManagedInstance',
-                '--filters', f"Key=ComplianceType,Values=Patch", f"Key=ExecutionStartTime,Values={start_date}", '--region', config.region, '--output', 'json'
+        patch_states_command = ['aws', 'ssm', 'describe-instance-patch-states', '--region', config.region, '--output', 'json']
+
+        def installed_patches(instance_id):
+            # Patches installed on the instance during the review period
+            data = engine.run_command([
+                'aws', 'ssm', 'describe-instance-patches', '--instance-id', instance_id,
+                '--filters', f"Key=State,Values={INSTALLED_STATES}", '--region', config.region, '--output', 'json'
+            ])
+            return [
+                dict(patch, InstanceId=instance_id) for patch in data.get('Patches', [])
+                if patch.get('InstalledTime') and datetime.fromisoformat(patch['InstalledTime'].replace('Z', '+00:00')) >= start_date
             ]
 
-            # Collect patch compliance data for the instance
-            patch_data = command_runner.run(patch_compliance_command)
-            patch_compliance = json.loads(patch_data).get('ComplianceItems', [])
-
-            # Add patch compliance data to the list
-            all_patch_data.extend(patch_compliance)
-
-        # Write all collected patch data to the output file
-        with open(output_file, 'w') as f:
-            json.dump(all_patch_data, f, indent=4)
+        # Stream instances a batch at a time so the population never sits in memory as a whole
+        instance_ids = (instance['InstanceId'] for instance in iter_items(engine.paginate(list_instances_command), 'InstanceInformationList'))
+        batch_size = batch_operation(patch_states_command).max_batch
+        with open_writer(states_output_file, LARGE_OUTPUT_FORMAT) as patch_states, \
+                open_writer(output_file, LARGE_OUTPUT_FORMAT) as patches:
+            while True:
+                batch = list(itertools.islice(instance_ids, batch_size))
+                if not batch:
+                    break
+                patch_states.write_all(state for state in coalescer.describe(patch_states_command, batch) if state)
+                for instance_patches in fanout.map(installed_patches, batch, service='ssm'):
+                    patches.write_all(instance_patches)
+
+        print(f"Evidence for {env_name} environment saved to {patches.path} "
+              f"({patches.count} installed patches on {patch_states.count} instances)")
+
+    run_environments(environments, collect)
 
 if __name__ == "__main__":
     main()
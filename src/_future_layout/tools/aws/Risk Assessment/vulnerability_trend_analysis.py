@@ -1,48 +1,68 @@
 # [main.py]
 import sys
 import os
-from datetime import datetime, timedelta
 
 # Adjust the Python path to include the parent directory of aws
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from _config.config import environments, current_year, current_date
+from _config.config import environments, current_year, current_date, run_environments
+from _config.cloudtrail_archive import caller_account
 from _config.command_runner import CommandRunner
-from _config.aws_handler import AWSHandler
+from _config.formats import LARGE_OUTPUT_FORMAT, write_evidence
+from _config.inspector import VulnerabilityTrends
+from _config.streaming import open_writer
+from _config.vulnerability_store import WINDOW_DAYS, VulnerabilityStore, ledger_row, pandas, snapshot_rows
 
 """
 This script collects logs for vulnerability trend analysis from the vulnerability scanning mechanism.
 
-It retrieves Amazon Inspector findings to analyze trends in vulnerabilities over the past 365 days. The logs are pulled from the past year and saved as JSON files in the specified evidence artifacts directory.
+It builds Amazon Inspector (v2) vulnerability trends over the past 365 days. Severity counts per account,
+finding type, resource and package are aggregated server-side by Inspector and appended as today's snapshot
+to a local time-series store; the year's trend is computed from the stored snapshots. Finding details are
+pulled only for the critical and high findings first observed since the previous run, and kept in the store's
+finding ledger with the findings closed since then, so the monthly counts still cover the year. Both are saved
+in the specified evidence artifacts directory.
 """
 
-def get_time_range():
-    end_time = datetime.utcnow()
-    start_time = end_time - timedelta(days=365)
-    return start_time.strftime('%Y-%m-%dT%H:%M:%S'), end_time.strftime('%Y-%m-%dT%H:%M:%S')
-
 def main():
     command_runner = CommandRunner()
-    start_time, end_time = get_time_range()
-
-    for env_name, config in environments.items():
-        config.set_aws_credentials()  # Set AWS credentials
 
-        aws_handler = AWSHandler(env_name, config)
+    def collect(env_name, config):
+        engine = command_runner.engine_for(env_name, config).for_region(config.region)
 
-        # Generate the output file path
+        # Generate the output file paths
         vulnerability_trend_output_file = f"/evidence-artifacts/{current_year}/{env_name}/{current_date}.vulnerability_trend_analysis.json"
+        vulnerability_findings_output_file = f"/evidence-artifacts/{current_year}/{env_name}/{current_date}.vulnerability_trend_findings.json"
+
+        # Findings first observed since the previous snapshot; the whole year on the first run
+        store = VulnerabilityStore(caller_account(engine), config.region)
+        days = store.days_to_collect()
+        trends = VulnerabilityTrends(engine, days=days)
+        ledger = []
+        with open_writer(vulnerability_findings_output_file, LARGE_OUTPUT_FORMAT) as findings:
+            for finding in trends.details():
+                findings.write(finding)
+                ledger.append(ledger_row(finding))
+
+        # Closures of findings listed by earlier runs; a whole-year run already has them
+        if days < WINDOW_DAYS:
+            ledger.extend(ledger_row(finding) for finding in trends.closed())
+        store.record_findings(ledger)
+
+        # Append today's aggregates, the year's trend and monthly counts are read back from the store
+        trend = trends.trend()
+        trend['monthly'] = store.monthly(trends.severities)
+        store.append(snapshot_rows(trend))
+        if pandas is not None:
+            trend['history'] = store.report()
+        else:
+            print("pandas is not installed, the vulnerability trend history is left out of the evidence")
 
-        # Define the AWS CLI command with output file path
-        # Collect Amazon Inspector findings for vulnerability trend analysis
-        vulnerability_trend_command = [
-            'aws', 'inspector', 'list-findings',
-            '--start-time', start_time, '--end-time', end_time,
-            '--region', config.region, '--output', 'json'
-        ]
+        trend_file = write_evidence(vulnerability_trend_output_file, trend)
+        print(f"Vulnerability trends for {env_name} environment saved to {trend_file}, "
+              f"{findings.count} new {'/'.join(trends.severities)} findings saved to {findings.path}")
 
-        # Collect evidence
-        aws_handler.collect_evidence(command_runner, vulnerability_trend_command, vulnerability_trend_output_file)
+    run_environments(environments, collect)
 
 if __name__ == "__main__":
     main()
@@ -6,9 +6,10 @@ import json
 # Adjust the Python path to include the parent directory of aws
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from _config.config import environments, current_year, current_date
+from _config.config import environments, current_year, current_date, run_environments
 from _config.command_runner import CommandRunner
 from _config.aws_handler import AWSHandler
+from _config.formats import write_evidence
 
 """
 Description: This script collects evidence of the certificate authority for the information system
@@ -20,9 +21,7 @@ the current date and environment name.
 def main():
     command_runner = CommandRunner()
 
-    for env_name, config in environments.items():
-        config.set_aws_credentials()  # Set AWS credentials
-
+    def collect(env_name, config):
         aws_handler = AWSHandler(env_name, config)
 
         # Generate the output file path
@@ -35,7 +34,7 @@ def main():
         ]
 
         # Run the command to list all certificates
-        certificates_output = command_runner.run_command(list_certificates_command)
+        certificates_output = command_runner.run_command(list_certificates_command, env_name=env_name, config=config)
         certificates = json.loads(certificates_output).get('CertificateSummaryList', [])
 
         # Initialize a list to hold detailed certificate information
@@ -49,7 +48,7 @@ def main():
                 '--certificate-arn', certificate_arn,
                 '--region', config.region, '--output', 'json'
             ]
-            certificate_info = command_runner.run_command(describe_certificate_command)
+            certificate_info = command_runner.run_command(describe_certificate_command, env_name=env_name, config=config)
             detailed_certificates_info.append(json.loads(certificate_info))
 
         # Collect CloudHSM cluster information
@@ -57,7 +56,7 @@ def main():
             'aws', 'cloudhsm', 'describe-clusters',
             '--region', config.region, '--output', 'json'
         ]
-        clusters_info = command_runner.run_command(describe_clusters_command)
+        clusters_info = command_runner.run_command(describe_clusters_command, env_name=env_name, config=config)
 
         # Combine all the evidence
         evidence = {
@@ -66,8 +65,9 @@ def main():
         }
 
         # Save the combined evidence to the output file
-        with open(output_file, 'w') as f:
-            json.dump(evidence, f, indent=4)
+        write_evidence(output_file, evidence)
+
+    run_environments(environments, collect)
 
 if __name__ == "__main__":
     main()
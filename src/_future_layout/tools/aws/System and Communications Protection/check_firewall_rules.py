@@ -4,16 +4,14 @@ import os
 # Adjust the Python path to include the parent directory of aws
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from _config.config import environments, current_year, current_date
+from _config.config import environments, current_year, current_date, run_environments
 from _config.command_runner import CommandRunner
 from _config.aws_handler import AWSHandler
 
 def main():
     command_runner = CommandRunner()
 
-    for env_name, config in environments.items():
-        config.set_aws_credentials()  # Set AWS credentials
-
+    def collect(env_name, config):
         aws_handler = AWSHandler(env_name, config)
 
         # Generate the output file path for WAF rules
@@ -60,5 +58,7 @@ def main():
         # Collect evidence for network ACLs
         aws_handler.collect_evidence(command_runner, network_acls_command, network_acls_output_file)
 
+    run_environments(environments, collect)
+
 if __name__ == "__main__":
     main()
@@ -3,7 +3,7 @@ import sys
 import os
 # Adjust the Python path to include the parent directory of aws
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from _config.config import environments, current_year, current_date
+from _config.config import environments, current_year, current_date, run_environments
 from _config.command_runner import CommandRunner
 from _config.aws_handler import AWSHandler
 
@@ -15,8 +15,7 @@ def main():
     and environment name.
     """
     command_runner = CommandRunner()
-    for env_name, config in environments.items():
-        config.set_aws_credentials()  # Set AWS credentials
+    def collect(env_name, config):
         aws_handler = AWSHandler(env_name, config)
         # Generate the output file path
         output_file = f"/evidence-artifacts/{current_year}/{env_name}/{current_date}.encryption_transfer_points.json"
@@ -44,5 +43,7 @@ def main():
         for aws_command in aws_commands:
             aws_handler.collect_evidence(command_runner, aws_command, output_file)
 
+    run_environments(environments, collect)
+
 if __name__ == "__main__":
     main()
@@ -6,7 +6,7 @@ from datetime import datetime, timedelta
 # Adjust the Python path to include the parent directory of aws
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from _config.config import environments, current_year, current_date
+from _config.config import environments, current_year, current_date, run_environments
 from _config.command_runner import CommandRunner
 from _config.aws_handler import AWSHandler
 
@@ -26,9 +26,7 @@ def main():
     command_runner = CommandRunner()
     start_time, end_time = get_time_range()
 
-    for env_name, config in environments.items():
-        config.set_aws_credentials()  # Set AWS credentials
-
+    def collect(env_name, config):
         aws_handler = AWSHandler(env_name, config)
 
         # Generate the output file paths
@@ -54,5 +52,7 @@ def main():
         aws_handler.collect_evidence(command_runner, external_boundary_command, external_boundary_output_file)
         aws_handler.collect_evidence(command_runner, internal_connections_command, internal_connections_output_file)
 
+    run_environments(environments, collect)
+
 if __name__ == "__main__":
     main()
@@ -4,7 +4,7 @@ import os
 # Adjust the Python path to include the parent directory of aws
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from _config.config import environments, current_year, current_date
+from _config.config import environments, current_year, current_date, run_environments
 from _config.command_runner import CommandRunner
 from _config.aws_handler import AWSHandler
 
@@ -19,9 +19,7 @@ def main():
     """
     command_runner = CommandRunner()
 
-    for env_name, config in environments.items():
-        config.set_aws_credentials()  # Set AWS credentials
-
+    def collect(env_name, config):
         aws_handler = AWSHandler(env_name, config)
 
         # Generate the output file path for AWS Config rules
@@ -57,5 +55,7 @@ def main():
         # Collect evidence for a sample CloudWatch alarm history
         aws_handler.collect_evidence(command_runner, aws_command_cw_alarm_history, output_file_cw_alarm_history)
 
+    run_environments(environments, collect)
+
 if __name__ == "__main__":
     main()
@@ -13,16 +13,14 @@ SOC 2 Control Numbers:
 # Adjust the Python path to include the parent directory of aws
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from _config.config import environments, current_year, current_date
+from _config.config import environments, current_year, current_date, run_environments
 from _config.command_runner import CommandRunner
 from _config.aws_handler import AWSHandler
 
 def main():
     command_runner = CommandRunner()
 
-    for env_name, config in environments.items():
-        config.set_aws_credentials()  # Set AWS credentials
-
+    def collect(env_name, config):
         aws_handler = AWSHandler(env_name, config)
 
         # Define the evidence description
@@ -45,9 +43,11 @@ def main():
         ]
 
         # Collect evidence
-        aws_handler.collect_evidence(command_runner, aws_command_cloudtrail, output_file_cloudtrail)
+        aws_handler.stream_evidence(command_runner, aws_command_cloudtrail, output_file_cloudtrail)
         aws_handler.collect_evidence(command_runner, aws_command_vpc_flow_logs, output_file_vpc_flow_logs)
-        aws_handler.collect_evidence(command_runner, aws_command_guardduty_findings, output_file_guardduty_findings)
+        aws_handler.stream_evidence(command_runner, aws_command_guardduty_findings, output_file_guardduty_findings)
+
+    run_environments(environments, collect)
 
 if __name__ == "__main__":
     main()
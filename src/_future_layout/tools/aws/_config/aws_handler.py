@@ -1,29 +1,62 @@
-import os
 import json
 
+from _config.formats import LARGE_OUTPUT_FORMAT, write_evidence
+from _config.inventory import inventory_enabled, inventory_resource_type
+from _config.streaming import stream_to_file
+
 class AWSHandler:
     def __init__(self, env_name, config):
         self.env_name = env_name
         self.config = config
 
-    def collect_evidence(self, command_runner, aws_command, output_file):
+    def collect_evidence(self, command_runner, aws_command, output_file, return_data=False):
         # Initialize an empty list to store JSON output
         output = []
 
         # Run the command and capture the output
         try:
-            command_output = command_runner.run_command(aws_command)
+            command_output = command_runner.run_command(aws_command, env_name=self.env_name, config=self.config)
             for line in command_output:
                 output.append(json.loads(line))
         except Exception as e:
             print(f"Error running command for {self.env_name}: {e}")
             return
 
-        # Ensure the output directory exists
-        os.makedirs(os.path.dirname(output_file), exist_ok=True)
-
-        # Write the JSON output to the specified file path
-        with open(output_file, 'w') as f:
-            json.dump(output, f, indent=4)
+        # Write the output in the configured format, pretty JSON by default
+        output_file = write_evidence(output_file, output)
 
         print(f"Evidence for {self.env_name} environment saved to {output_file}")
+
+        if return_data:
+            return output[0] if len(output) == 1 else output
+
+    def stream_evidence(self, command_runner, aws_command, output_file, result_key=None):
+        """
+        Writes the items of a paginated command to the output file page by
+        page instead of holding the whole response in memory, as compressed
+        JSON Lines unless AUDITBUDDY_OUTPUT_FORMAT says otherwise.
+        """
+        try:
+            writer = stream_to_file(command_runner.paginate(aws_command, env_name=self.env_name, config=self.config),
+                                    output_file, result_key, LARGE_OUTPUT_FORMAT)
+        except Exception as e:
+            print(f"Error running command for {self.env_name}: {e}")
+            return
+
+        print(f"Evidence for {self.env_name} environment saved to {writer.path} ({writer.count} items)")
+        return writer.count
+
+    def collect_inventory_evidence(self, command_runner, inventory, aws_command, output_file):
+        """
+        Writes the AWS Config configuration items for the command's resource type
+        when Config records it, otherwise runs the command like collect_evidence.
+        """
+        resource_type = inventory_resource_type(aws_command)
+        items = inventory.resources(resource_type) if resource_type and inventory_enabled() else None
+        if items is None:
+            return self.collect_evidence(command_runner, aws_command, output_file)
+
+        output_file = write_evidence(output_file, {'Source': 'AWS Config', 'ResourceType': resource_type,
+                                                   'ConfigurationItems': items})
+
+        print(f"Evidence for {self.env_name} environment saved to {output_file} ({len(items)} {resource_type} from AWS Config)")
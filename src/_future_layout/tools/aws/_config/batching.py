@@ -0,0 +1,152 @@
+import json
+import threading
+from concurrent.futures import Future
+
+from _config.engine import AWSCommandError
+
+# How long a partial batch waits for more identifiers before it is sent anyway
+DEFAULT_LINGER = 0.05
+_coalescer_lock = threading.Lock()
+
+
+class BatchOperation:
+    """
+    How a describe API takes many identifiers in one call and where each
+    identifier's result is found in the response.
+    """
+
+    def __init__(self, parameter, max_batch, result_key, id_fields, filter_name=None):
+        self.parameter = parameter
+        self.max_batch = max_batch
+        self.result_key = result_key
+        self.id_fields = id_fields
+        self.filter_name = filter_name
+
+    def args(self, identifiers):
+        if self.filter_name:
+            return [self.parameter, json.dumps([{'Name': self.filter_name, 'Values': identifiers}])]
+        return [self.parameter, *identifiers]
+
+    def match(self, items, identifier):
+        # Callers may pass a name or an ARN, results carry both
+        for item in items:
+            for field in self.id_fields:
+                value = item.get(field)
+                if value and (value == identifier or value.endswith('/' + identifier)):
+                    return item
+        return None
+
+
+# Describe APIs that accept a list of identifiers, keyed by aws CLI service and operation
+BATCH_OPERATIONS = {
+    ('ecs', 'describe-clusters'): BatchOperation('--clusters', 100, 'clusters', ('clusterArn', 'clusterName')),
+    ('ecs', 'describe-services'): BatchOperation('--services', 10, 'services', ('serviceArn', 'serviceName')),
+    ('ecs', 'describe-tasks'): BatchOperation('--tasks', 100, 'tasks', ('taskArn',)),
+    ('elbv2', 'describe-tags'): BatchOperation('--resource-arns', 20, 'TagDescriptions', ('ResourceArn',)),
+    ('ecr', 'batch-get-repository-scanning-configuration'): BatchOperation(
+        '--repository-names', 25, 'scanningConfigurations', ('repositoryName', 'repositoryArn')),
+    ('rds', 'describe-db-instances'): BatchOperation(
+        '--filters', 50, 'DBInstances', ('DBInstanceIdentifier', 'DBInstanceArn'), filter_name='db-instance-id'),
+    ('rds', 'describe-db-clusters'): BatchOperation(
+        '--filters', 50, 'DBClusters', ('DBClusterIdentifier', 'DBClusterArn'), filter_name='db-cluster-id'),
+    ('rds', 'describe-db-snapshots'): BatchOperation(
+        '--filters', 50, 'DBSnapshots', ('DBSnapshotIdentifier', 'DBSnapshotArn'), filter_name='db-snapshot-id'),
+    ('ssm', 'describe-instance-patch-states'): BatchOperation('--instance-ids', 50, 'InstancePatchStates', ('InstanceId',)),
+}
+
+
+def batch_operation(command):
+    try:
+        return BATCH_OPERATIONS[(command[1], command[2])]
+    except (IndexError, KeyError):
+        raise ValueError(f"No batch operation for {' '.join(command[:3])}")
+
+
+class BatchCoalescer:
+    """
+    Gathers identifiers for the same describe operation and scope, sends
+    them in batches of the API's maximum size and routes each result back to
+    the caller that asked for it. `command` is the aws CLI command without the
+    identifier parameter; its remaining arguments (e.g. `--cluster`) are the scope.
+    """
+
+    def __init__(self, engine, linger=DEFAULT_LINGER):
+        self.engine = engine
+        self.linger = linger
+        self._pending = {}
+        self._timers = {}
+        self._lock = threading.Lock()
+
+    def submit(self, command, identifier):
+        """
+        Queues one identifier and returns a Future for its result, or None
+        when the API did not return it. Full batches are sent right away,
+        partial ones after `linger` seconds or on flush().
+        """
+        operation = batch_operation(command)
+        key = tuple(command)
+        future = Future()
+        with self._lock:
+            pending = self._pending.setdefault(key, [])
+            pending.append((identifier, future))
+            batch = None
+            if len(pending) >= operation.max_batch:
+                batch = self._take(key)
+            elif key not in self._timers:
+                timer = threading.Timer(self.linger, self.flush, [key])
+                timer.daemon = True
+                self._timers[key] = timer
+                timer.start()
+        if batch:
+            self._send(key, operation, batch)
+        return future
+
+    def get(self, command, identifier):
+        return self.submit(command, identifier).result()
+
+    def describe(self, command, identifiers):
+        # Results in the order of `identifiers`
+        futures = [self.submit(command, identifier) for identifier in identifiers]
+        self.flush(tuple(command))
+        return [future.result() for future in futures]
+
+    def flush(self, key=None):
+        with self._lock:
+            keys = [key] if key is not None else list(self._pending)
+            batches = [(key, self._take(key)) for key in keys if key in self._pending]
+        for key, batch in batches:
+            self._send(key, batch_operation(key), batch)
+
+    def _take(self, key):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        return self._pending.pop(key)
+
+    def _send(self, key, operation, batch):
+        identifiers = list(dict.fromkeys(identifier for identifier, _ in batch))
+        command = list(key) + operation.args(identifiers)
+        try:
+            response = self.engine.run_command(command)
+        except AWSCommandError as e:
+            # Like a failed per-identifier call, the batch's identifiers get no result
+            print(f"Command failed: {' '.join(command)}\nError: {e}")
+            response = {}
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        items = response.get(operation.result_key, [])
+        for identifier, future in batch:
+            future.set_result(operation.match(items, identifier))
+
+
+def coalescer(config):
+    """
+    Returns the BatchCoalescer of a region-scoped config, shared by every
+    collector and fan-out worker of that region.
+    """
+    with _coalescer_lock:
+        if config.get('coalescer') is None or config['coalescer'].engine is not config['engine']:
+            config['coalescer'] = BatchCoalescer(config['engine'])
+        return config['coalescer']
@@ -0,0 +1,124 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+
+# Operations whose responses change while a run is in progress (query polling)
+UNCACHEABLE_OPERATIONS = {
+    'GetQueryResults',
+    'GetQueryExecution',
+    'DescribeQueries',
+    'GetCredentialReport',
+}
+READ_ONLY_PREFIXES = ('Describe', 'List', 'Get', 'Lookup', 'BatchGet', 'Select', 'Search')
+# Memory the cached responses of a run may hold, in MiB of serialized JSON
+CACHE_SIZE_ENV_VAR = 'AUDITBUDDY_REQUEST_CACHE_MB'
+DEFAULT_CACHE_MB = 256
+
+
+def is_cacheable(operation):
+    return operation.startswith(READ_ONLY_PREFIXES) and operation not in UNCACHEABLE_OPERATIONS
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class RequestCache:
+    """
+    Run-scoped memoization of read-only AWS API responses, keyed by
+    (environment, region, service, operation, normalized params). Concurrent
+    callers asking for the same key wait on the single in-flight request
+    instead of sending their own. Responses are held as serialized JSON
+    within a byte budget, least recently used first out, and live until
+    evicted or the cache is dropped at the end of the run.
+    """
+
+    def __init__(self, max_bytes=None):
+        if max_bytes is None:
+            max_bytes = int(os.getenv(CACHE_SIZE_ENV_VAR, DEFAULT_CACHE_MB)) * 1024 * 1024
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(env_name, region, service, operation, params):
+        return (env_name, region, service, operation, json.dumps(params or {}, sort_keys=True, default=str))
+
+    def get_or_fetch(self, key, fetch):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _InFlight()
+                self.misses += 1
+                owner = True
+            else:
+                owner = False
+                if entry.done.is_set():
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+                else:
+                    self.waits += 1
+
+        if owner:
+            try:
+                value = fetch()
+                serialized = json.dumps(value, default=str).encode('utf-8')
+            except Exception as e:
+                # Failures are not cached, the next caller retries the request
+                entry.error = e
+                with self._lock:
+                    del self._entries[key]
+                entry.done.set()
+                raise
+            with self._lock:
+                self._admit(key, entry, serialized)
+            entry.done.set()
+            # Nobody else holds the fetched structure, the owner can keep it
+            return value
+
+        entry.done.wait()
+        if entry.error is not None:
+            raise entry.error
+        # Callers mutate the returned structures, so each gets its own copy
+        return json.loads(entry.value)
+
+    def _admit(self, key, entry, serialized):
+        # Called with the lock held
+        entry.value = serialized
+        if len(serialized) > self.max_bytes:
+            # Served to the callers already waiting on it, never kept
+            del self._entries[key]
+            return
+        self.bytes += len(serialized)
+        for old_key in list(self._entries):
+            if self.bytes <= self.max_bytes:
+                break
+            old = self._entries[old_key]
+            # In-flight entries hold nothing yet and stay
+            if old_key != key and old.done.is_set() and old.error is None:
+                del self._entries[old_key]
+                self.bytes -= len(old.value)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'waits': self.waits, 'misses': self.misses, 'entries': len(self._entries),
+                    'bytes': self.bytes, 'evictions': self.evictions}
+
+    def report(self):
+        stats = self.stats()
+        requests = stats['hits'] + stats['waits'] + stats['misses']
+        saved = stats['hits'] + stats['waits']
+        ratio = (saved / requests * 100) if requests else 0.0
+        return (f"Request cache: {requests} requests, {stats['misses']} sent, "
+                f"{stats['hits']} hits, {stats['waits']} waited on in-flight ({ratio:.1f}% deduplicated), "
+                f"{stats['bytes'] / 1024 / 1024:.1f} MiB held, {stats['evictions']} evicted")
@@ -0,0 +1,59 @@
+import os
+
+from _config.cache import RequestCache
+from _config.config import run_environments
+from _config.delta import DeltaCollector
+from _config.engine import AWSExecutionEngine
+from _config.fanout import FanOut
+from _config.organizations import sweep_accounts
+from _config.ratelimit import AdaptiveRateLimiter
+from _config.regions import sweep_regions
+from _config.scheduler import CollectorScheduler
+from _config.session import AWSSession
+
+
+def run_collection(environments, name, region_collectors, account_collectors=None):
+    """
+    Runs a service collector script over every environment, member account
+    and region. Environments collect concurrently, each on its own session
+    instead of the process-wide os.environ, and share one request cache,
+    fan-out and rate limiter.
+
+    region_collectors(config, scheduler, delta) schedules the collectors of
+    one region; they run longest chain first, and delta.collect carries a
+    file forward when CloudTrail shows no change to its services.
+    account_collectors(config, scheduler) schedules the collectors of global
+    services, run once per account alongside the region sweep.
+    """
+    cache = RequestCache()
+    fanout = FanOut()
+    rate_limiter = AdaptiveRateLimiter()
+
+    def collect_region(config):
+        delta = DeltaCollector(config, name)
+        scheduler = CollectorScheduler(config, name)
+        region_collectors(config, scheduler, delta)
+        scheduler.run()
+        delta.save()
+
+    def collect_account(config):
+        for file_path in config['output_files'].values():
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        if account_collectors is None:
+            sweep_regions(config, collect_region)
+            return
+        scheduler = CollectorScheduler(config, f"{name}-account")
+        scheduler.add('regions', sweep_regions, config, collect_region)
+        account_collectors(config, scheduler)
+        scheduler.run()
+
+    def collect(env_name, config):
+        session = AWSSession(config['access_key'], config['secret_key'], config['region'])
+        config['engine'] = AWSExecutionEngine(env_name, config['region'], cache=cache, session=session,
+                                              rate_limiter=rate_limiter)
+        config['fanout'] = fanout
+        sweep_accounts(config, collect_account)
+
+    run_environments(environments, collect)
+    print(cache.report())
+    print(rate_limiter.report())
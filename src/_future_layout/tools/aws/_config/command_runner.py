@@ -1,9 +1,57 @@
+import json
 import subprocess
+import threading
+
+from _config.cache import RequestCache
+from _config.engine import AWSExecutionEngine
+from _config.ratelimit import AdaptiveRateLimiter
+
+# Runners created in this process, reported by run_environments at the end of the run
+_runners = []
+_runners_lock = threading.Lock()
+
 
 class CommandRunner:
-    @staticmethod
-    def run_command(command):
+    def __init__(self, engine=None, cache=None, rate_limiter=None):
+        self.engine = engine
+        self.cache = cache or RequestCache()
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter()
+        self._engines = {}
+        self._lock = threading.Lock()
+        with _runners_lock:
+            _runners.append(self)
+
+    def engine_for(self, env_name=None, config=None):
+        if self.engine is not None:
+            return self.engine
+        # One engine per environment, created from that environment's own session
+        with self._lock:
+            if env_name not in self._engines:
+                session = config.session() if config is not None else None
+                self._engines[env_name] = AWSExecutionEngine(env_name, cache=self.cache, session=session,
+                                                             rate_limiter=self.rate_limiter)
+            return self._engines[env_name]
+
+    def run_command(self, command, env_name=None, config=None):
+        # aws CLI commands run in-process through the execution engine
+        if command and command[0] == 'aws':
+            return json.dumps(self.engine_for(env_name, config).run_command(command)).splitlines()
         result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
         if result.returncode != 0:
             raise Exception(f"Command failed: {result.stderr}")
         return result.stdout.splitlines()
+
+    def paginate(self, command, env_name=None, config=None):
+        # Pages of an aws CLI command, one at a time
+        return self.engine_for(env_name, config).paginate(command)
+
+    def report(self):
+        print(self.cache.report())
+        print(self.rate_limiter.report())
+
+
+def report_runners():
+    with _runners_lock:
+        runners = list(_runners)
+    for runner in runners:
+        runner.report()
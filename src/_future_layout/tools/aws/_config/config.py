@@ -1,16 +1,23 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 
+from _config.command_runner import report_runners
+from _config.evidence_store import EvidenceStore
+from _config.session import AWSSession
+
 class EnvironmentConfig:
     def __init__(self, access_key, secret_key, region):
         self.access_key = access_key
         self.secret_key = secret_key
         self.region = region
+        self._session = None
 
-    def set_aws_credentials(self):
-        os.environ['AWS_ACCESS_KEY_ID'] = self.access_key
-        os.environ['AWS_SECRET_ACCESS_KEY'] = self.secret_key
-        os.environ['AWS_DEFAULT_REGION'] = self.region
+    def session(self):
+        # Credentials stay on the session object instead of the process environment
+        if self._session is None:
+            self._session = AWSSession(self.access_key, self.secret_key, self.region)
+        return self._session
 
 current_year = datetime.now(timezone.utc).strftime('%Y')
 current_date = datetime.now(timezone.utc).strftime('%Y-%m-%d')
@@ -27,3 +34,22 @@ environments = {
         region='us-east-1'
     )
 }
+
+def run_environments(environments, collect):
+    """
+    Runs collect(env_name, config) for every environment concurrently. A
+    failure in one environment is reported without stopping the others.
+    """
+    with ThreadPoolExecutor(max_workers=len(environments) or 1) as executor:
+        futures = {env_name: executor.submit(collect, env_name, config) for env_name, config in environments.items()}
+    for env_name, future in futures.items():
+        if future.exception() is not None:
+            print(f"Evidence collection failed for {env_name}: {future.exception()}")
+
+    # Request cache hits and misses and rate limiter throttles of the run
+    report_runners()
+
+    # Move what this run wrote into the content-addressed store when it is enabled
+    evidence_store = EvidenceStore.from_env()
+    if evidence_store is not None:
+        print(evidence_store.ingest_written())
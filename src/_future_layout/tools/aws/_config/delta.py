@@ -0,0 +1,162 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+from datetime import datetime, timedelta, timezone
+
+from _config.engine import AWSCommandError
+from _config.evidence_store import record_written
+from _config.formats import PARTIAL_SUFFIX, path_format, with_format, written_path
+from _config.streaming import iter_items
+
+# AUDITBUDDY_DELTA=on re-collects only what CloudTrail shows changed since the
+# last run; AUDITBUDDY_DELTA=full forces a full refresh and records a new baseline.
+DELTA_ENV_VAR = 'AUDITBUDDY_DELTA'
+DELTA_STATE_ENV_VAR = 'AUDITBUDDY_DELTA_STATE_DIR'
+FULL_REFRESH_ENV_VAR = 'AUDITBUDDY_DELTA_FULL_REFRESH_DAYS'
+DEFAULT_STATE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'auditbuddy', 'delta')
+DEFAULT_FULL_REFRESH_DAYS = 7
+# CloudTrail can deliver events several minutes late, look back past the last run
+EVENT_DELIVERY_MARGIN = timedelta(minutes=20)
+
+
+def delta_mode():
+    return os.getenv(DELTA_ENV_VAR, 'off').lower()
+
+
+class DeltaCollector:
+    """
+    Collects the evidence files of one region-scoped config incrementally.
+    A file tied to a service is re-collected only when CloudTrail recorded a
+    write event from that service since the previous run; otherwise the
+    previous run's file is carried forward. Files collected without a service
+    (time-windowed or health data) are always collected. A full refresh runs
+    every AUDITBUDDY_DELTA_FULL_REFRESH_DAYS days to guard against drift.
+    """
+
+    def __init__(self, config, name, state_dir=None):
+        self.config = config
+        self.name = name
+        self.started = datetime.now(timezone.utc)
+        self.enabled = delta_mode() in ('on', 'full')
+        state_dir = state_dir or os.getenv(DELTA_STATE_ENV_VAR) or DEFAULT_STATE_DIR
+        key = f"{name}|{config['engine'].env_name}|{config['region']}"
+        self.path = os.path.join(state_dir, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+        self.state = self._load() if self.enabled else {}
+        self.full = not self.enabled or delta_mode() == 'full' or self._refresh_due()
+        self.files = {}
+        self.collected = 0
+        self.reused = 0
+        self._changed = None
+        # Collectors of a region may run concurrently
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _refresh_due(self):
+        if 'last_run' not in self.state or 'last_full' not in self.state:
+            return True
+        days = int(os.getenv(FULL_REFRESH_ENV_VAR, DEFAULT_FULL_REFRESH_DAYS))
+        return datetime.fromisoformat(self.state['last_full']) + timedelta(days=days) <= self.started
+
+    def changed_sources(self):
+        """
+        Event sources (e.g. `elasticloadbalancing.amazonaws.com`) of the write
+        events CloudTrail recorded in the region since the previous run.
+        """
+        with self._lock:
+            if self._changed is None:
+                self._changed = self._lookup_changes()
+            return self._changed
+
+    def _lookup_changes(self):
+        start = datetime.fromisoformat(self.state['last_run']) - EVENT_DELIVERY_MARGIN
+        command = [
+            'aws', 'cloudtrail', 'lookup-events',
+            '--lookup-attributes', 'AttributeKey=ReadOnly,AttributeValue=false',
+            '--start-time', start.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            '--region', self.config['region'],
+            '--output', 'json'
+        ]
+        return {event['EventSource'] for event in iter_items(self.config['engine'].paginate(command), 'Events')}
+
+    def changed(self, services):
+        # The lookup and the fallback to a full collection happen under the lock,
+        # so concurrent collectors see one lookup and one decision
+        with self._lock:
+            if self.full:
+                return True
+            if self._changed is None:
+                try:
+                    self._changed = self._lookup_changes()
+                except AWSCommandError as e:
+                    print(f"CloudTrail lookup failed, collecting {self.name} in full: {e}")
+                    self.full = True
+                    return True
+            return any(f"{service}.amazonaws.com" in self._changed for service in services)
+
+    def collect(self, fetch, key, *services):
+        """
+        Runs fetch(config, output_file) for the output file `key` unless none
+        of `services` changed and the previous run's file can be reused.
+        """
+        if services and not self.changed(services) and self.reuse(key):
+            return
+        fetch(self.config, self.config['output_files'][key])
+        self.record(key)
+
+    def reuse(self, *keys):
+        # Carries the previous run's files forward; False when any is missing
+        previous = {key: self.state.get('files', {}).get(key) for key in keys}
+        if not all(path and os.path.exists(path) for path in previous.values()):
+            return False
+        for key, path in previous.items():
+            # Keep the format the previous file was written in
+            output_file = with_format(self.config['output_files'][key], path_format(path))
+            if os.path.abspath(path) != os.path.abspath(output_file):
+                # Copied and moved into place, output_file may be hardlinked to an evidence blob
+                shutil.copyfile(path, output_file + PARTIAL_SUFFIX)
+                os.replace(output_file + PARTIAL_SUFFIX, output_file)
+            record_written(output_file)
+            with self._lock:
+                self.files[key] = output_file
+                self.reused += 1
+        return True
+
+    def record(self, *keys):
+        for key in keys:
+            output_file = written_path(self.config['output_files'][key]) or self.config['output_files'][key]
+            if os.path.exists(output_file):
+                record_written(output_file)
+            with self._lock:
+                self.files[key] = output_file
+                self.collected += 1
+
+    def save(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            # Only a run that carried nothing forward is a new full baseline; a run
+            # that fell back to full collection partway keeps the previous one
+            full = self.full and not self.reused
+            state = {
+                # The next run looks for changes from the moment this run started
+                'last_run': self.started.isoformat(),
+                'files': dict(self.state.get('files', {}), **self.files),
+            }
+        last_full = self.started.isoformat() if full else self.state.get('last_full')
+        if last_full is not None:
+            state['last_full'] = last_full
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump(state, f, indent=4)
+        os.replace(self.path + '.tmp', self.path)
+        mode = 'full refresh' if full else f"changes since {self.state['last_run']}"
+        print(f"Delta collection for {self.name} in {self.config['region']} ({mode}): "
+              f"{self.collected} files collected, {self.reused} carried forward")
@@ -0,0 +1,339 @@
+import os
+import json
+import base64
+import datetime
+import subprocess
+import threading
+
+from _config.cache import is_cacheable
+from _config.replay import replay_harness
+from _config.session import AWSSession
+
+try:
+    import botocore.session
+    import jmespath
+    from botocore import xform_name
+    from botocore.config import Config
+    from botocore.exceptions import BotoCoreError, ClientError
+except ImportError:  # boto3/botocore not installed, only the CLI path is available
+    botocore = None
+
+# Set AUDITBUDDY_AWS_ENGINE=cli to run every command through the aws CLI again
+ENGINE_ENV_VAR = 'AUDITBUDDY_AWS_ENGINE'
+
+# aws CLI service names that differ from the botocore service names
+CLI_SERVICE_ALIASES = {
+    's3api': 's3',
+    'configservice': 'config',
+    'ddb': 'dynamodb',
+}
+
+# Global CLI options that take a value and never reach the API call
+GLOBAL_OPTIONS = {'region', 'output', 'query', 'profile', 'endpoint-url', 'color', 'cli-read-timeout', 'cli-connect-timeout'}
+GLOBAL_FLAGS = {'no-paginate', 'no-cli-pager', 'debug', 'no-verify-ssl', 'no-sign-request', 'cli-auto-prompt'}
+PAGINATION_OPTIONS = {'max-items': 'MaxItems', 'page-size': 'PageSize', 'starting-token': 'StartingToken'}
+# Items per page when the aws CLI fallback streams a paginated command
+CLI_PAGE_ITEMS = 1000
+
+
+class AWSCommandError(Exception):
+    pass
+
+
+class AWSExecutionEngine:
+    """
+    Runs `aws <service> <operation> ...` command lists in-process through cached
+    botocore clients and returns the same parsed dict the CLI would print with
+    `--output json`. Falls back to the aws CLI when botocore is unavailable or
+    AUDITBUDDY_AWS_ENGINE=cli is set.
+    """
+
+    def __init__(self, env_name=None, region=None, use_cli=None, max_pool_connections=50, cache=None, session=None,
+                 rate_limiter=None):
+        self.env_name = env_name
+        self.session = session or AWSSession(region=region)
+        self.region = region or self.session.region
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        if use_cli is None:
+            use_cli = os.getenv(ENGINE_ENV_VAR, 'boto3').lower() == 'cli'
+        # Recording and replaying happen in botocore, the aws CLI cannot take part
+        self.harness = replay_harness()
+        self.use_cli = (use_cli and self.harness is None) or botocore is None
+        self.max_pool_connections = max_pool_connections
+        self._clients = {}
+        self._operations = {}
+        self._lock = threading.Lock()
+
+    def for_region(self, region):
+        # Same session, cache, rate limiter and client pool, different default region
+        engine = AWSExecutionEngine(self.env_name, region, self.use_cli, self.max_pool_connections, self.cache, self.session,
+                                    self.rate_limiter)
+        engine._clients = self._clients
+        engine._operations = self._operations
+        engine._lock = self._lock
+        return engine
+
+    def run_command(self, command):
+        service, operation, args, options = parse_command(command)
+        if self.use_cli:
+            operation_name = ''.join(part.capitalize() for part in operation.split('-'))
+            return self._cached(service, operation_name, {'args': args, 'options': options},
+                                options.get('region') or self.region,
+                                lambda: self._run_cli(command))
+        client = self.client(service, options.get('region') or self.region)
+        operation_name = self._operation_name(client, service, operation)
+        params = build_params(client.meta.service_model.operation_model(operation_name), args)
+        return self.call(service, operation_name, params,
+                         region=options.get('region'),
+                         query=options.get('query'),
+                         paginate='no-paginate' not in options,
+                         pagination_config=pagination_config(options) or None)
+
+    def paginate(self, command):
+        """
+        Yields the pages of a paginated command one at a time, following
+        NextToken/Marker, so large populations never sit in memory as a whole.
+        `--query` is applied to each page. Pages bypass the request cache.
+        """
+        service, operation, args, options = parse_command(command)
+        query = options.get('query')
+        if self.use_cli:
+            yield from self._paginate_cli(command, query)
+            return
+        client = self.client(service, options.get('region') or self.region)
+        operation_name = self._operation_name(client, service, operation)
+        params = build_params(client.meta.service_model.operation_model(operation_name), args)
+        method = xform_name(operation_name)
+        try:
+            if not client.can_paginate(method) or 'no-paginate' in options:
+                pages = [getattr(client, method)(**params)]
+            else:
+                pages = client.get_paginator(method).paginate(PaginationConfig=pagination_config(options), **params)
+            for page in pages:
+                page.pop('ResponseMetadata', None)
+                page = normalize_response(page)
+                yield jmespath.search(query, page) if query else page
+        except (BotoCoreError, ClientError) as e:
+            raise AWSCommandError(f"{service} {operation} failed: {e}") from e
+
+    def _paginate_cli(self, command, query):
+        if '--no-paginate' in command or (query and botocore is None):
+            # No local jmespath to apply --query per page, let the CLI run it whole
+            yield self._run_cli(command)
+            return
+        if query:
+            index = command.index('--query')
+            command = command[:index] + command[index + 2:]
+        # The CLI returns a NextToken when --max-items cuts a result short
+        capped = '--max-items' in command
+        if not capped:
+            command = command + ['--max-items', str(CLI_PAGE_ITEMS)]
+        token = None
+        while True:
+            page = self._run_cli(command + (['--starting-token', token] if token else []))
+            token = page.pop('NextToken', None)
+            yield jmespath.search(query, page) if query else page
+            # The caller's own --max-items is a cap on the whole result, like MaxItems in process
+            if capped or not token:
+                return
+
+    def get_object(self, bucket, key):
+        """
+        Returns the raw bytes of an S3 object. Object bodies bypass the
+        request cache; the rate limiter still applies.
+        """
+        if self.use_cli:
+            command = ['aws', 's3', 'cp', f"s3://{bucket}/{key}", '-']
+            if self.rate_limiter is not None:
+                return self.rate_limiter.call((self.env_name, self.region, 's3'), lambda: self._exec_cli_bytes(command))
+            return self._exec_cli_bytes(command)
+        try:
+            return self.client('s3', self.region).get_object(Bucket=bucket, Key=key)['Body'].read()
+        except (BotoCoreError, ClientError) as e:
+            raise AWSCommandError(f"s3 GetObject s3://{bucket}/{key} failed: {e}") from e
+
+    def call(self, service, operation, params=None, region=None, query=None, paginate=True, pagination_config=None):
+        region = region or self.region
+        params = params or {}
+        # The raw response is cached so calls differing only in --query share it
+        response = self._cached(service, operation,
+                                {'params': params, 'paginate': paginate, 'pagination': pagination_config},
+                                region,
+                                lambda: self._send(service, operation, params, region, paginate, pagination_config))
+        if query:
+            response = jmespath.search(query, response)
+        return response
+
+    def _cached(self, service, operation, request, region, fetch):
+        if self.cache is None or not is_cacheable(operation):
+            return fetch()
+        key = self.cache.make_key(self.env_name, region, service, operation, request)
+        return self.cache.get_or_fetch(key, fetch)
+
+    def _send(self, service, operation, params, region, paginate, pagination_config):
+        client = self.client(service, region)
+        method = xform_name(operation)
+        try:
+            if paginate and client.can_paginate(method):
+                paginator = client.get_paginator(method)
+                response = paginator.paginate(PaginationConfig=pagination_config or {}, **params).build_full_result()
+            else:
+                response = getattr(client, method)(**params)
+        except (BotoCoreError, ClientError) as e:
+            raise AWSCommandError(f"{service} {operation} failed: {e}") from e
+        response.pop('ResponseMetadata', None)
+        return normalize_response(response)
+
+    def client(self, service, region=None):
+        key = (service, region)
+        with self._lock:
+            if key not in self._clients:
+                config = Config(max_pool_connections=self.max_pool_connections)
+                if self.rate_limiter is not None:
+                    # The rate limiter decides on retries, botocore makes a single attempt
+                    config = config.merge(Config(retries={'mode': 'standard', 'total_max_attempts': 1}))
+                client = self.session.botocore_session().create_client(service, region_name=region, config=config)
+                if self.rate_limiter is not None:
+                    self.rate_limiter.attach(client, (self.env_name, region, service))
+                if self.harness is not None:
+                    self.harness.attach(client, self.rate_limiter, (self.env_name, region, service))
+                self._clients[key] = client
+            return self._clients[key]
+
+    def _operation_name(self, client, service, operation):
+        if service not in self._operations:
+            self._operations[service] = {
+                xform_name(name, '-'): name for name in client.meta.service_model.operation_names
+            }
+        try:
+            return self._operations[service][operation]
+        except KeyError:
+            raise AWSCommandError(f"Unknown operation: aws {service} {operation}")
+
+    def _run_cli(self, command):
+        if self.rate_limiter is not None:
+            service, _, _, options = parse_command(command)
+            key = (self.env_name, options.get('region') or self.region, service)
+            return self.rate_limiter.call(key, lambda: self._exec_cli(command))
+        return self._exec_cli(command)
+
+    def _exec_cli(self, command):
+        result = subprocess.run(command, capture_output=True, text=True, env=self.session.cli_environment())
+        if result.returncode != 0:
+            raise AWSCommandError(f"Command failed: {' '.join(command)}\nError: {result.stderr}")
+        return json.loads(result.stdout) if result.stdout.strip() else {}
+
+    def _exec_cli_bytes(self, command):
+        result = subprocess.run(command, capture_output=True, env=self.session.cli_environment())
+        if result.returncode != 0:
+            raise AWSCommandError(f"Command failed: {' '.join(command)}\nError: {result.stderr.decode('utf-8', 'replace')}")
+        return result.stdout
+
+
+def parse_command(command):
+    """
+    Splits an aws CLI command list into (service, operation, args, options).
+    `args` is a list of (parameter, [values]) pairs for the API call and
+    `options` holds the global CLI options such as --region and --query.
+    """
+    if len(command) < 3 or command[0] != 'aws':
+        raise AWSCommandError(f"Not an aws CLI command: {command}")
+    service = CLI_SERVICE_ALIASES.get(command[1], command[1])
+    operation = command[2]
+    args, options = [], {}
+    name, values = None, []
+    for token in list(command[3:]) + ['--']:
+        if token.startswith('--'):
+            if name in GLOBAL_OPTIONS or name in PAGINATION_OPTIONS:
+                options[name] = values[0] if values else None
+            elif name in GLOBAL_FLAGS:
+                options[name] = True
+            elif name is not None:
+                args.append((name, values))
+            name, values = token[2:], []
+        else:
+            values.append(token)
+    return service, operation, args, options
+
+
+def pagination_config(options):
+    pagination = {PAGINATION_OPTIONS[key]: value for key, value in options.items() if key in PAGINATION_OPTIONS}
+    for key in ('MaxItems', 'PageSize'):
+        if key in pagination:
+            pagination[key] = int(pagination[key])
+    return pagination
+
+
+def build_params(operation_model, args):
+    shape = operation_model.input_shape
+    members = shape.members if shape is not None else {}
+    by_cli_name = {xform_name(member, '-'): member for member in members}
+    params = {}
+    for name, values in args:
+        if name not in by_cli_name and name.startswith('no-') and name[3:] in by_cli_name:
+            params[by_cli_name[name[3:]]] = False
+            continue
+        if name not in by_cli_name:
+            raise AWSCommandError(f"Unknown parameter --{name} for {operation_model.name}")
+        member = by_cli_name[name]
+        params[member] = convert_value(members[member], values)
+    return params
+
+
+def convert_value(shape, values):
+    type_name = shape.type_name
+    if type_name == 'boolean':
+        return not values or values[0].lower() == 'true'
+    if not values:
+        raise AWSCommandError(f"Missing value for {shape.name}")
+    if type_name == 'list':
+        if len(values) == 1 and values[0].lstrip().startswith('['):
+            return json.loads(values[0])
+        return [convert_value(shape.member, [value]) for value in values]
+    value = values[0]
+    if type_name in ('structure', 'map'):
+        if value.lstrip().startswith('{'):
+            return json.loads(value)
+        return parse_shorthand(shape, value)
+    if type_name in ('integer', 'long'):
+        return int(value)
+    if type_name in ('float', 'double'):
+        return float(value)
+    return value
+
+
+def parse_shorthand(shape, text):
+    # Covers the `Key=Name,Values=a,b` subset of the CLI shorthand syntax
+    pairs, key = {}, None
+    for token in text.split(','):
+        if '=' in token:
+            key, value = token.split('=', 1)
+            pairs[key] = [value]
+        elif key is not None:
+            pairs[key].append(token)
+    if shape.type_name == 'map':
+        return {key: ','.join(values) for key, values in pairs.items()}
+    result = {}
+    for key, values in pairs.items():
+        member = shape.members.get(key)
+        if member is None:
+            raise AWSCommandError(f"Unknown shorthand key {key} for {shape.name}")
+        if member.type_name == 'list':
+            result[key] = [convert_value(member.member, [value]) for value in values]
+        else:
+            result[key] = convert_value(member, [','.join(values)])
+    return result
+
+
+def normalize_response(value):
+    # Match the JSON the aws CLI prints: ISO timestamps and base64 blobs
+    if isinstance(value, dict):
+        return {key: normalize_response(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [normalize_response(item) for item in value]
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode('utf-8')
+    return value
@@ -0,0 +1,162 @@
+import os
+import re
+import json
+import stat
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+from _config.cloudtrail_archive import lookup_event, to_datetime
+from _config.formats import open_evidence_file
+from _config.streaming import iter_items
+
+EVENT_CACHE_ENV_VAR = 'AUDITBUDDY_EVENT_CACHE_DIR'
+DEFAULT_EVENT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'auditbuddy', 'events')
+PARTITION_SUFFIX = '.jsonl.gz'
+# A day is final once CloudTrail can no longer deliver events into it
+SETTLE_TIME = timedelta(hours=1)
+# How far back cloudtrail lookup-events can see
+LOOKUP_EVENTS_RETENTION = timedelta(days=90)
+# Most days one fetch covers, bounds the partition files open at once
+FETCH_WINDOW_DAYS = 31
+
+
+def event_time(event):
+    # lookup-events items carry EventTime, archived records eventTime
+    return to_datetime(event.get('EventTime') or event.get('eventTime'))
+
+
+def filter_slug(event_filter):
+    # Readable directory name for a filter, with a hash so distinct filters never collide
+    slug = re.sub(r'[^A-Za-z0-9_.-]+', '-', event_filter).strip('-')[:60]
+    return f"{slug}-{hashlib.sha256(event_filter.encode('utf-8')).hexdigest()[:12]}"
+
+
+class EventPartitionCache:
+    """
+    On-disk cache of a CloudTrail event population, one compressed JSON
+    Lines partition per (account, region, event filter, UTC day). Past days
+    cannot gain events once CloudTrail has delivered them, so their
+    partitions are written once, made read-only and reused by every later
+    run. Each run fetches only the days missing from the cache plus today.
+    """
+
+    def __init__(self, account, region, event_filter, root=None):
+        root = root or os.getenv(EVENT_CACHE_ENV_VAR) or DEFAULT_EVENT_CACHE_DIR
+        self.directory = os.path.join(root, account, region, filter_slug(event_filter))
+        self.cached_days = 0
+        self.fetched_days = 0
+        self.skipped_days = 0
+        # Days stored by this run's window fetches, read back from their new partitions
+        self._fetched = set()
+
+    def partition_path(self, day):
+        return os.path.join(self.directory, day.strftime('%Y-%m-%d') + PARTITION_SUFFIX)
+
+    def events(self, start, end, fetch, earliest=None):
+        """
+        Yields the events between `start` and `end`, day by day. Cached days
+        are read back; other days come from fetch(window_start, window_end),
+        which must return every event of the window. Consecutive missing days
+        that are final are fetched together, up to FETCH_WINDOW_DAYS at a
+        time, and split into their day partitions. Missing days before
+        `earliest` (e.g. lookup-events' 90-day reach) are skipped rather than
+        cached empty.
+        """
+        start, end = to_datetime(start), to_datetime(end)
+        earliest = to_datetime(earliest) if earliest is not None else None
+        now = datetime.now(timezone.utc)
+        day = datetime(start.year, start.month, start.day, tzinfo=timezone.utc)
+        while day < end:
+            day_end = day + timedelta(days=1)
+            if self._missing_final(day, now, earliest):
+                window_end = day_end
+                while (window_end < end and window_end - day < timedelta(days=FETCH_WINDOW_DAYS)
+                       and self._missing_final(window_end, now, earliest)):
+                    window_end += timedelta(days=1)
+                self._store(day, window_end, fetch)
+            reachable = earliest is None or day_end > earliest
+            for event in self._day_events(day, day_end, fetch, reachable):
+                if start <= event_time(event) < end:
+                    yield event
+            day = day_end
+
+    def _missing_final(self, day, now, earliest):
+        # Only a day that is over and entirely within reach is stored
+        final = day + timedelta(days=1) + SETTLE_TIME <= now and (earliest is None or day >= earliest)
+        return final and not os.path.exists(self.partition_path(day))
+
+    def _store(self, window_start, window_end, fetch):
+        # One fetch for the window, each event written to the partition of its day
+        os.makedirs(self.directory, exist_ok=True)
+        days = [window_start + timedelta(days=offset) for offset in range((window_end - window_start).days)]
+        files = {}
+        complete = False
+        try:
+            for day in days:
+                files[day] = open_evidence_file(self.partition_path(day) + '.partial', 'w')
+            for event in self._within(fetch(window_start, window_end), window_start, window_end):
+                time = event_time(event).astimezone(timezone.utc)
+                files[datetime(time.year, time.month, time.day, tzinfo=timezone.utc)].write(
+                    json.dumps(event, separators=(',', ':')) + '\n')
+            complete = True
+        finally:
+            for f in files.values():
+                f.close()
+            # A fetch that failed midway never becomes a partition
+            for day in days:
+                path = self.partition_path(day)
+                if complete:
+                    os.replace(path + '.partial', path)
+                    os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+                elif os.path.exists(path + '.partial'):
+                    os.remove(path + '.partial')
+        self.fetched_days += len(days)
+        self._fetched.update(days)
+
+    def _day_events(self, day, day_end, fetch, reachable):
+        path = self.partition_path(day)
+        if os.path.exists(path):
+            if day not in self._fetched:
+                self.cached_days += 1
+            with open_evidence_file(path) as f:
+                for line in f:
+                    yield json.loads(line)
+            return
+        if not reachable:
+            self.skipped_days += 1
+            return
+        # Today can still gain events, fetch it fresh every run
+        self.fetched_days += 1
+        yield from self._within(fetch(day, day_end), day, day_end)
+
+    @staticmethod
+    def _within(events, day, day_end):
+        # Fetch windows include their end, an event at midnight belongs to the next day only
+        return (event for event in events if day <= event_time(event) < day_end)
+
+    def report(self):
+        return (f"Event cache {self.directory}: {self.cached_days} days cached, {self.fetched_days} fetched, "
+                f"{self.skipped_days} out of reach")
+
+
+def lookup_events_fetcher(engine, region, lookup_attributes=None):
+    # fetch for EventPartitionCache.events reading the lookup-events API
+    def fetch(window_start, window_end):
+        command = [
+            'aws', 'cloudtrail', 'lookup-events', '--region', region,
+            '--start-time', window_start.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            '--end-time', window_end.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            '--output', 'json'
+        ]
+        if lookup_attributes:
+            command += ['--lookup-attributes', lookup_attributes]
+        return iter_items(engine.paginate(command), 'Events')
+    return fetch
+
+
+def archive_fetcher(archive, **filters):
+    # fetch reading a CloudTrailArchive, with events in lookup-events shape. A window's
+    # last day folders are listed once per window, not once per day partition
+    def fetch(window_start, window_end):
+        return (lookup_event(record) for record in archive.events(window_start, window_end, **filters))
+    return fetch
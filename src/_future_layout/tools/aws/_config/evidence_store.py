@@ -0,0 +1,158 @@
+import os
+import json
+import stat
+import hashlib
+import threading
+
+# AUDITBUDDY_EVIDENCE_STORE=pointer|hardlink moves evidence written by a run
+# into the content-addressed store. Unset keeps plain files.
+STORE_ENV_VAR = 'AUDITBUDDY_EVIDENCE_STORE'
+EVIDENCE_ROOT_ENV_VAR = 'AUDITBUDDY_EVIDENCE_ROOT'
+DEFAULT_EVIDENCE_ROOT = '/evidence-artifacts'
+BLOB_DIR = '.blobs'
+POINTER_KEY = 'evidence_blob'
+
+# Evidence files written by this process, ingested at the end of the run
+_written = set()
+_written_lock = threading.Lock()
+
+
+def record_written(path):
+    with _written_lock:
+        _written.add(os.path.abspath(path))
+
+
+def written_evidence():
+    with _written_lock:
+        return sorted(_written)
+
+
+def canonical_json(data):
+    # Sorted keys and fixed formatting; list order is evidence content and is kept
+    return (json.dumps(data, indent=4, sort_keys=True) + '\n').encode('utf-8')
+
+
+def is_pointer(data):
+    return isinstance(data, dict) and set(data) == {POINTER_KEY, 'size'}
+
+
+class EvidenceStore:
+    """
+    Content-addressed storage for evidence files. Each file is canonicalized,
+    stored once under `<root>/.blobs` by SHA-256, and its dated path becomes a
+    small pointer file or a hardlink to the blob. Evidence that did not change
+    since yesterday costs a pointer, or nothing at all with hardlinks.
+
+    Hardlinked blobs are read-only, and evidence writers replace a dated
+    path with a new file instead of rewriting it in place, so a same-day
+    re-run never changes the blob other days are linked to.
+    """
+
+    def __init__(self, root=None, mode='pointer'):
+        if mode not in ('pointer', 'hardlink'):
+            raise ValueError(f"Unknown evidence store mode: {mode}")
+        self.root = root or os.getenv(EVIDENCE_ROOT_ENV_VAR) or DEFAULT_EVIDENCE_ROOT
+        self.mode = mode
+        self.blob_root = os.path.join(self.root, BLOB_DIR)
+        self.files = 0
+        self.new_blobs = 0
+        self.stored_bytes = 0
+        self.deduplicated_bytes = 0
+
+    @classmethod
+    def from_env(cls):
+        mode = os.getenv(STORE_ENV_VAR)
+        return cls(mode=mode.lower()) if mode else None
+
+    def blob_path(self, digest, extension):
+        return os.path.join(self.blob_root, digest[:2], digest + extension)
+
+    def ingest(self, path):
+        """
+        Stores one evidence file and replaces it with a pointer or hardlink.
+        Returns the blob digest, or None when the file was left alone.
+        """
+        extension = os.path.splitext(path)[1]
+        if extension != '.json' and self.mode == 'pointer':
+            # Pointers only stand in for JSON files, other formats stay plain files
+            return None
+        with open(path, 'rb') as f:
+            content = f.read()
+        if extension == '.json':
+            try:
+                data = json.loads(content)
+            except ValueError:
+                # Not JSON, left as a plain file
+                return None
+            if is_pointer(data):
+                return None
+            content = canonical_json(data)
+
+        digest = hashlib.sha256(content).hexdigest()
+        blob = self.blob_path(digest, extension)
+        if os.path.exists(blob):
+            self.deduplicated_bytes += len(content)
+        else:
+            self._write_blob(blob, content)
+            self.new_blobs += 1
+            self.stored_bytes += len(content)
+        self.files += 1
+
+        if self.mode == 'hardlink' and self._link(blob, path):
+            return digest
+        if extension == '.json':
+            self._replace(path, json.dumps({POINTER_KEY: f"sha256:{digest}", 'size': len(content)}).encode('utf-8'))
+        return digest
+
+    def _write_blob(self, blob, content):
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        self._replace(blob, content)
+        os.chmod(blob, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+
+    def _link(self, blob, path):
+        if os.path.exists(path) and os.path.samefile(blob, path):
+            return True
+        try:
+            os.link(blob, path + '.tmp')
+        except OSError:
+            # Different filesystem or no hardlink support, fall back to a pointer
+            return False
+        os.replace(path + '.tmp', path)
+        return True
+
+    def _replace(self, path, content):
+        with open(path + '.tmp', 'wb') as f:
+            f.write(content)
+        os.replace(path + '.tmp', path)
+
+    def ingest_written(self):
+        # The evidence files this process wrote under the root, nothing else
+        root = os.path.join(os.path.abspath(self.root), '')
+        for path in written_evidence():
+            if not path.startswith(root) or not os.path.isfile(path):
+                continue
+            try:
+                self.ingest(path)
+            except OSError as e:
+                print(f"Could not store evidence {path}: {e}")
+        return self.report()
+
+    def read(self, path):
+        """
+        Loads an evidence file, following a pointer to its blob.
+        """
+        with open(path) as f:
+            data = json.load(f)
+        if is_pointer(data):
+            digest = data[POINTER_KEY].split(':', 1)[1]
+            with open(self.blob_path(digest, os.path.splitext(path)[1])) as f:
+                data = json.load(f)
+        return data
+
+    def report(self):
+        return (f"Evidence store: {self.files} files, {self.new_blobs} new blobs ({self.stored_bytes} bytes), "
+                f"{self.deduplicated_bytes} bytes already stored")
+
+
+def read_evidence(path, root=None):
+    return EvidenceStore(root).read(path)
@@ -0,0 +1,33 @@
+import sys
+import os
+import json
+import argparse
+
+# Adjust the Python path to include the parent directory of _config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from _config.formats import load_evidence
+
+
+def main():
+    """
+    Prints an evidence file in any output format (JSON, JSON Lines, gzip or
+    zstd compressed, evidence store pointer) as pretty JSON.
+    """
+    parser = argparse.ArgumentParser(description="Export an evidence file as pretty JSON")
+    parser.add_argument('path', help="Evidence file to export")
+    parser.add_argument('-o', '--output', help="File to write instead of standard output")
+    args = parser.parse_args()
+
+    data = load_evidence(args.path)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(data, f, indent=4)
+        print(f"Exported {args.path} to {args.output}")
+    else:
+        json.dump(data, sys.stdout, indent=4)
+        sys.stdout.write('\n')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_CONCURRENCY = 10
+
+# Concurrent detail calls allowed per service, across every fan-out in the run.
+# Services that throttle aggressively get the smaller limits.
+SERVICE_CONCURRENCY = {
+    'backup': 5,
+    'cloudtrail': 2,
+    'elbv2': 8,
+    'guardduty': 5,
+    'iam': 5,
+    'rds': 5,
+    'ssm': 5,
+    'wafv2': 4,
+    # Member accounts collected at once in organization mode
+    'accounts': 10,
+}
+
+
+class FanOut:
+    """
+    Runs per-item detail calls on a bounded worker pool. Results come back in
+    the order of the input items, so evidence files stay diffable between runs.
+
+    Do not nest fan-outs for the same service: an outer task holding a slot
+    while waiting on inner tasks for the same service can exhaust the limit.
+    """
+
+    def __init__(self, limits=None, default_limit=DEFAULT_CONCURRENCY):
+        self.limits = dict(SERVICE_CONCURRENCY, **(limits or {}))
+        self.default_limit = default_limit
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def limit_for(self, service):
+        return self.limits.get(service, self.default_limit)
+
+    def _semaphore(self, service):
+        with self._lock:
+            if service not in self._semaphores:
+                self._semaphores[service] = threading.BoundedSemaphore(self.limit_for(service))
+            return self._semaphores[service]
+
+    def map(self, func, items, service=None):
+        items = list(items)
+        if not items:
+            return []
+        semaphore = self._semaphore(service)
+
+        def run(item):
+            with semaphore:
+                return func(item)
+
+        workers = min(self.limit_for(service), len(items))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(run, items))
+
+    def flat_map(self, func, items, service=None):
+        return [result for results in self.map(func, items, service) for result in results]
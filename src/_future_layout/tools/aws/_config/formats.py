@@ -0,0 +1,130 @@
+import io
+import os
+import gzip
+import json
+
+try:
+    import zstandard
+except ImportError:  # zstd output is optional, gzip is always available
+    zstandard = None
+
+from _config.evidence_store import read_evidence, record_written
+
+# AUDITBUDDY_OUTPUT_FORMAT=json|jsonl|jsonl.gz|jsonl.zst overrides the format of every evidence file
+OUTPUT_FORMAT_ENV_VAR = 'AUDITBUDDY_OUTPUT_FORMAT'
+OUTPUT_FORMATS = {
+    'json': '.json',
+    'jsonl': '.jsonl',
+    'jsonl.gz': '.jsonl.gz',
+    'jsonl.zst': '.jsonl.zst',
+}
+# Default for collectors whose evidence runs to millions of items
+LARGE_OUTPUT_FORMAT = 'jsonl.gz'
+# Suffix of an evidence file while it is still being written. Evidence is
+# moved into place when complete, never rewritten in place, since the dated
+# path may be a hardlink shared with other days in the evidence store.
+PARTIAL_SUFFIX = '.partial'
+# JSON Lines evidence holding one document rather than a list of items is a
+# single line wrapping it under this key, so it reads back with its own shape
+DOCUMENT_KEY = 'evidence_document'
+
+
+def output_format(default='json'):
+    fmt = os.getenv(OUTPUT_FORMAT_ENV_VAR, default).lower()
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format {fmt}, expected one of {', '.join(OUTPUT_FORMATS)}")
+    return fmt
+
+
+def path_format(path):
+    for fmt, extension in sorted(OUTPUT_FORMATS.items(), key=lambda item: -len(item[1])):
+        if path.endswith(extension):
+            return fmt
+    return 'json'
+
+
+def evidence_path(path, default='json'):
+    """
+    Returns the evidence path for the configured format, e.g.
+    `...-cloudwatch_metrics.json` becomes `...-cloudwatch_metrics.jsonl.gz`.
+    """
+    return with_format(path, output_format(default))
+
+
+def with_format(path, fmt):
+    extension = OUTPUT_FORMATS[path_format(path)]
+    base = path[:-len(extension)] if path.endswith(extension) else path
+    return base + OUTPUT_FORMATS[fmt]
+
+
+def written_path(path):
+    # The variant of an evidence path that exists on disk, whatever format it was written in
+    for candidate in [path] + [with_format(path, fmt) for fmt in OUTPUT_FORMATS]:
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+class _GzipWriter(gzip.GzipFile):
+    """
+    gzip file written with an empty file name and a zero timestamp in its
+    header, so the same content always compresses to the same bytes and
+    content-addressed storage can deduplicate it.
+    """
+
+    def __init__(self, path):
+        self._raw = open(path, 'wb')
+        super().__init__(filename='', mode='wb', fileobj=self._raw, mtime=0)
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._raw.close()
+
+
+def open_evidence_file(path, mode='r'):
+    # Text mode file object, compressed according to the file extension
+    if path.endswith('.gz') or path.endswith('.gz.partial'):
+        if mode == 'w':
+            return io.TextIOWrapper(_GzipWriter(path), encoding='utf-8')
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    if path.endswith('.zst') or path.endswith('.zst.partial'):
+        if zstandard is None:
+            raise RuntimeError("zstd evidence needs the zstandard package (pip install zstandard)")
+        return zstandard.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode)
+
+
+def write_evidence(path, data, default='json'):
+    """
+    Writes one evidence document in the configured format and returns the
+    path written. JSON Lines formats write one line per item of a list, and
+    any other document as one line under DOCUMENT_KEY.
+    """
+    path = evidence_path(path, default)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open_evidence_file(path + PARTIAL_SUFFIX, 'w') as f:
+        if path_format(path) == 'json':
+            json.dump(data, f, indent=4)
+        else:
+            for item in data if isinstance(data, list) else [{DOCUMENT_KEY: data}]:
+                f.write(json.dumps(item, separators=(',', ':')) + '\n')
+    os.replace(path + PARTIAL_SUFFIX, path)
+    record_written(path)
+    return path
+
+
+def load_evidence(path):
+    """
+    Reads an evidence file in any format. JSON Lines come back as a list,
+    or as the document written under DOCUMENT_KEY; content-addressed
+    pointers are followed to their blob.
+    """
+    if path_format(path) == 'json':
+        return read_evidence(path)
+    with open_evidence_file(path) as f:
+        items = [json.loads(line) for line in f if line.strip()]
+    if len(items) == 1 and isinstance(items[0], dict) and list(items[0]) == [DOCUMENT_KEY]:
+        return items[0][DOCUMENT_KEY]
+    return items
@@ -0,0 +1,71 @@
+import sys
+import os
+import time
+import runpy
+import argparse
+
+# Adjust the Python path to include the parent directory of _config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from _config.replay import FIXTURES_ENV_VAR, LATENCY_ENV_VAR, MODE_ENV_VAR, THROTTLE_ENV_VAR, replay_harness, scale_fixture
+
+
+def run(args):
+    os.environ[MODE_ENV_VAR] = args.mode
+    if args.fixtures:
+        os.environ[FIXTURES_ENV_VAR] = args.fixtures
+    if args.latency_ms is not None:
+        os.environ[LATENCY_ENV_VAR] = str(args.latency_ms)
+    if args.throttle_rate is not None:
+        os.environ[THROTTLE_ENV_VAR] = str(args.throttle_rate)
+    harness = replay_harness()
+    try:
+        harness.install_requests()
+    except ImportError:  # AWS collectors do not need requests
+        pass
+
+    sys.argv = [args.script] + args.script_args
+    started = time.monotonic()
+    try:
+        runpy.run_path(args.script, run_name='__main__')
+    finally:
+        print(f"{args.script} ran for {time.monotonic() - started:.1f}s")
+        print(harness.report())
+
+
+def scale(args):
+    synthetic = scale_fixture(args.fixture, args.count, args.page_size, args.result_key)
+    print(f"{args.fixture} now serves {synthetic['count']} items in pages of {synthetic['page_size']}")
+
+
+def main():
+    """
+    Runs a collector against recorded fixtures instead of live APIs, or
+    records the fixtures it needs, and scales recorded fixtures into
+    synthetic populations for offline benchmarks.
+    """
+    parser = argparse.ArgumentParser(description="Record, replay and scale API fixtures for collectors")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="Run a collector script with the harness")
+    run_parser.add_argument('--mode', choices=['record', 'replay'], default='replay')
+    run_parser.add_argument('--fixtures', help="Fixture directory, ~/.cache/auditbuddy/fixtures by default")
+    run_parser.add_argument('--latency-ms', type=float, help="Simulated latency of each replayed call")
+    run_parser.add_argument('--throttle-rate', type=float, help="Replayed calls per second per service before throttling")
+    run_parser.add_argument('script', help="Collector script to run")
+    run_parser.add_argument('script_args', nargs=argparse.REMAINDER, help="Arguments for the script")
+    run_parser.set_defaults(func=run)
+
+    scale_parser = commands.add_parser('scale', help="Scale a recorded first-page fixture into a synthetic population")
+    scale_parser.add_argument('fixture', help="Recorded fixture file")
+    scale_parser.add_argument('--count', type=int, required=True, help="Items the synthetic fixture serves")
+    scale_parser.add_argument('--page-size', type=int, help="Items per page, the recorded page size by default")
+    scale_parser.add_argument('--result-key', help="List to scale when the operation has no paginator")
+    scale_parser.set_defaults(func=scale)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import os
+import json
+from datetime import datetime, timedelta, timezone
+
+from _config.streaming import iter_items
+
+# Severities whose finding details are pulled for the auditor, comma separated
+DETAIL_SEVERITIES_ENV_VAR = 'AUDITBUDDY_INSPECTOR_DETAIL_SEVERITIES'
+DEFAULT_DETAIL_SEVERITIES = ('CRITICAL', 'HIGH')
+FINDING_TYPES = ('PACKAGE_VULNERABILITY', 'CODE_VULNERABILITY', 'NETWORK_REACHABILITY')
+# aggregationType -> request/response member of the per-resource aggregations
+RESOURCE_AGGREGATIONS = {
+    'AWS_EC2_INSTANCE': 'ec2InstanceAggregation',
+    'AWS_ECR_CONTAINER': 'awsEcrContainerAggregation',
+    'AWS_LAMBDA_FUNCTION': 'lambdaFunctionAggregation',
+}
+SEVERITY_COUNTS = ('all', 'critical', 'high', 'medium')
+
+
+def detail_severities():
+    value = os.getenv(DETAIL_SEVERITIES_ENV_VAR)
+    if not value:
+        return list(DEFAULT_DETAIL_SEVERITIES)
+    return [severity.strip().upper() for severity in value.split(',') if severity.strip()]
+
+
+def aggregations(engine, aggregation_type, request):
+    # Items of one list-finding-aggregations population, unwrapped from their response member
+    member = next(iter(request))
+    command = [
+        'aws', 'inspector2', 'list-finding-aggregations',
+        '--aggregation-type', aggregation_type,
+        '--aggregation-request', json.dumps(request),
+        '--output', 'json'
+    ]
+    for response in iter_items(engine.paginate(command), 'responses'):
+        yield response.get(member, {})
+
+
+def severity_counts(item):
+    counts = item.get('severityCounts') or {}
+    return {name: counts.get(name, 0) for name in SEVERITY_COUNTS}
+
+
+def finding_summary(finding):
+    """
+    The fields of a finding an auditor reviews: what is vulnerable, how
+    badly, since when, and whether a fix exists. The raw finding carries
+    the full package and network path detail on top of this.
+    """
+    vulnerability = finding.get('packageVulnerabilityDetails') or {}
+    return {
+        'findingArn': finding.get('findingArn'),
+        'title': finding.get('title'),
+        'type': finding.get('type'),
+        'severity': finding.get('severity'),
+        'inspectorScore': finding.get('inspectorScore'),
+        'status': finding.get('status'),
+        'firstObservedAt': finding.get('firstObservedAt'),
+        'lastObservedAt': finding.get('lastObservedAt'),
+        'updatedAt': finding.get('updatedAt'),
+        'fixAvailable': finding.get('fixAvailable'),
+        'exploitAvailable': finding.get('exploitAvailable'),
+        'vulnerabilityId': vulnerability.get('vulnerabilityId'),
+        'vulnerablePackages': [f"{package.get('name')} {package.get('version')}"
+                               for package in vulnerability.get('vulnerablePackages') or []],
+        'resources': [{'type': resource.get('type'), 'id': resource.get('id'), 'region': resource.get('region')}
+                      for resource in finding.get('resources') or []],
+    }
+
+
+class VulnerabilityTrends:
+    """
+    Builds vulnerability trend evidence from Inspector v2. Severity counts per
+    account, finding type, resource and package come from list-finding-aggregations,
+    which Inspector computes server-side. Aggregations have no time dimension,
+    so monthly counts come from the one population that is listed: the
+    findings of the reviewed severities first observed in the window, pulled
+    with a filtered list-findings and reduced to their summaries.
+    """
+
+    def __init__(self, engine, days=365, severities=None):
+        self.engine = engine
+        self.end = datetime.now(timezone.utc)
+        self.start = self.end - timedelta(days=days)
+        self.severities = severities or detail_severities()
+        self.months = {}
+        self.findings = 0
+
+    def account_counts(self):
+        return [{'accountId': item.get('accountId'), **severity_counts(item)}
+                for item in aggregations(self.engine, 'ACCOUNT', {'accountAggregation': {}})]
+
+    def finding_type_counts(self):
+        counts = {}
+        for finding_type in FINDING_TYPES:
+            request = {'findingTypeAggregation': {'findingType': finding_type}}
+            total = dict.fromkeys(SEVERITY_COUNTS + ('exploitAvailable', 'fixAvailable'), 0)
+            # One item per account when the caller is the delegated administrator
+            for item in aggregations(self.engine, 'FINDING_TYPE', request):
+                item_counts = dict(severity_counts(item), exploitAvailable=item.get('exploitAvailableCount', 0),
+                                   fixAvailable=item.get('fixAvailableCount', 0))
+                for name, count in item_counts.items():
+                    total[name] += count
+            counts[finding_type] = total
+        return counts
+
+    def resource_counts(self):
+        # Resources with findings, most critical first, per resource type
+        counts = {}
+        for aggregation_type, member in RESOURCE_AGGREGATIONS.items():
+            request = {member: {'sortBy': 'CRITICAL', 'sortOrder': 'DESC'}}
+            counts[aggregation_type] = [
+                {**{key: value for key, value in item.items() if key != 'severityCounts'}, **severity_counts(item)}
+                for item in aggregations(self.engine, aggregation_type, request)
+                if (item.get('severityCounts') or {}).get('all')
+            ]
+        return counts
+
+    def package_counts(self):
+        # Vulnerable packages, most critical first
+        request = {'packageAggregation': {'sortBy': 'CRITICAL', 'sortOrder': 'DESC'}}
+        return [{'packageName': item.get('packageName'), 'accountId': item.get('accountId'), **severity_counts(item)}
+                for item in aggregations(self.engine, 'PACKAGE', request)
+                if (item.get('severityCounts') or {}).get('all')]
+
+    def details(self):
+        """
+        Yields the summaries of the reviewed findings first observed in the
+        window, oldest first, counting them per month as they pass.
+        """
+        window = [{'startInclusive': self.start.isoformat(), 'endInclusive': self.end.isoformat()}]
+        for summary in self._findings({'firstObservedAt': window}, 'FIRST_OBSERVED_AT'):
+            self._count(summary)
+            yield summary
+
+    def closed(self):
+        """
+        Yields the summaries of the reviewed findings closed in the window,
+        whenever they were first observed, so findings listed by an earlier
+        run's details() get their closure.
+        """
+        window = [{'startInclusive': self.start.isoformat(), 'endInclusive': self.end.isoformat()}]
+        criteria = {'findingStatus': [{'comparison': 'EQUALS', 'value': 'CLOSED'}], 'updatedAt': window}
+        yield from self._findings(criteria, 'LAST_OBSERVED_AT')
+
+    def _findings(self, criteria, sort_field):
+        criteria = {'severity': [{'comparison': 'EQUALS', 'value': severity} for severity in self.severities], **criteria}
+        command = [
+            'aws', 'inspector2', 'list-findings',
+            '--filter-criteria', json.dumps(criteria),
+            '--sort-criteria', json.dumps({'field': sort_field, 'sortOrder': 'ASC'}),
+            '--output', 'json'
+        ]
+        for finding in iter_items(self.engine.paginate(command), 'findings'):
+            yield finding_summary(finding)
+
+    def _count(self, summary):
+        month = str(summary['firstObservedAt'])[:7]
+        counts = self.months.setdefault(month, {'opened': {}, 'closed': {}})
+        severity = summary['severity']
+        counts['opened'][severity] = counts['opened'].get(severity, 0) + 1
+        if summary['status'] == 'CLOSED':
+            closed = self.months.setdefault(str(summary['updatedAt'])[:7], {'opened': {}, 'closed': {}})['closed']
+            closed[severity] = closed.get(severity, 0) + 1
+        self.findings += 1
+
+    def trend(self):
+        # Call after details() has been read to the end
+        return {
+            'window': {'start': self.start.isoformat(), 'end': self.end.isoformat()},
+            'accounts': self.account_counts(),
+            'findingTypes': self.finding_type_counts(),
+            'resources': self.resource_counts(),
+            'packages': self.package_counts(),
+            'monthly': {
+                'severities': self.severities,
+                'findings': self.findings,
+                'months': dict(sorted(self.months.items())),
+            },
+        }
@@ -0,0 +1,133 @@
+import os
+import json
+import threading
+
+from _config.engine import AWSCommandError
+from _config.streaming import iter_items
+
+# Set AUDITBUDDY_INVENTORY_BACKEND=direct to skip AWS Config and always describe
+INVENTORY_BACKEND_ENV_VAR = 'AUDITBUDDY_INVENTORY_BACKEND'
+# Config aggregator to query instead of the environment's own account and region
+CONFIG_AGGREGATOR_ENV_VAR = 'AUDITBUDDY_CONFIG_AGGREGATOR'
+
+# Config resource type served in place of each aws CLI inventory command
+INVENTORY_RESOURCE_TYPES = {
+    ('ec2', 'describe-instances'): 'AWS::EC2::Instance',
+    ('ec2', 'describe-volumes'): 'AWS::EC2::Volume',
+    ('ec2', 'describe-security-groups'): 'AWS::EC2::SecurityGroup',
+    ('ec2', 'describe-vpcs'): 'AWS::EC2::VPC',
+    ('s3api', 'list-buckets'): 'AWS::S3::Bucket',
+    ('rds', 'describe-db-instances'): 'AWS::RDS::DBInstance',
+    ('rds', 'describe-db-clusters'): 'AWS::RDS::DBCluster',
+    ('iam', 'list-users'): 'AWS::IAM::User',
+    ('iam', 'list-roles'): 'AWS::IAM::Role',
+    ('iam', 'list-policies'): 'AWS::IAM::Policy',
+    ('lambda', 'list-functions'): 'AWS::Lambda::Function',
+    ('kms', 'list-keys'): 'AWS::KMS::Key',
+}
+
+SELECT_FIELDS = [
+    'accountId', 'awsRegion', 'resourceType', 'resourceId', 'resourceName', 'arn',
+    'availabilityZone', 'resourceCreationTime', 'configurationItemCaptureTime',
+    'configurationItemStatus', 'configuration', 'supplementaryConfiguration', 'tags',
+]
+# Largest page select-resource-config returns
+QUERY_PAGE_SIZE = 100
+
+
+class ConfigInventory:
+    """
+    Serves resource inventories from AWS Config advanced queries. All
+    requested resource types come back from one paginated SQL query, across
+    every account and region of an aggregator when one is set. Types Config
+    does not record are left to the caller's direct describe.
+    """
+
+    def __init__(self, engine, aggregator=None):
+        self.engine = engine
+        self.aggregator = aggregator if aggregator is not None else os.getenv(CONFIG_AGGREGATOR_ENV_VAR)
+        self._recorded = None
+        self._items = {}
+        self._lock = threading.Lock()
+        self._prefetch_lock = threading.Lock()
+
+    def recorded_types(self):
+        # Types with discovered resources; a stopped recorder serves nothing
+        with self._lock:
+            if self._recorded is None:
+                self._recorded = self._discover_types()
+            return self._recorded
+
+    def _discover_types(self):
+        try:
+            if self.aggregator:
+                pages = self._pages([
+                    'aws', 'configservice', 'get-aggregate-discovered-resource-counts',
+                    '--configuration-aggregator-name', self.aggregator,
+                    '--group-by-key', 'RESOURCE_TYPE', '--output', 'json'
+                ], 'NextToken')
+                return {group['GroupName'] for page in pages for group in page.get('GroupedResourceCounts', [])
+                        if group['ResourceCount']}
+            status = self.engine.run_command(['aws', 'configservice', 'describe-configuration-recorder-status', '--output', 'json'])
+            if not any(recorder.get('recording') for recorder in status.get('ConfigurationRecordersStatus', [])):
+                return set()
+            pages = self._pages(['aws', 'configservice', 'get-discovered-resource-counts', '--output', 'json'], 'nextToken')
+            return {count['resourceType'] for page in pages for count in page.get('resourceCounts', []) if count['count']}
+        except AWSCommandError as e:
+            print(f"AWS Config inventory unavailable for {self.engine.env_name}, describing directly: {e}")
+            return set()
+
+    def _pages(self, command, token_key):
+        # The resource count operations have no botocore paginator, follow the token here
+        token = None
+        while True:
+            page = self.engine.run_command(command + (['--next-token', token] if token else []))
+            yield page
+            token = page.get(token_key)
+            if not token:
+                return
+
+    def records(self, resource_type):
+        return resource_type in self.recorded_types()
+
+    def prefetch(self, resource_types):
+        """
+        Loads the configuration items of every recorded type in `resource_types`
+        with a single query and returns the types that Config could not serve.
+        """
+        # Held through the query, so concurrent collectors wait for it instead of repeating it
+        with self._prefetch_lock:
+            wanted = [resource_type for resource_type in dict.fromkeys(resource_types) if resource_type not in self._items]
+            recorded = [resource_type for resource_type in wanted if self.records(resource_type)]
+            if recorded:
+                items = {resource_type: [] for resource_type in recorded}
+                type_list = ', '.join(f"'{resource_type}'" for resource_type in recorded)
+                for item in self.select(f"SELECT {', '.join(SELECT_FIELDS)} WHERE resourceType IN ({type_list})"):
+                    items[item['resourceType']].append(item)
+                self._items.update(items)
+            return [resource_type for resource_type in resource_types if resource_type not in self._items]
+
+    def select(self, expression):
+        if self.aggregator:
+            command = ['aws', 'configservice', 'select-aggregate-resource-config',
+                       '--configuration-aggregator-name', self.aggregator]
+        else:
+            command = ['aws', 'configservice', 'select-resource-config']
+        command += ['--expression', expression, '--page-size', str(QUERY_PAGE_SIZE), '--output', 'json']
+        # Each result is a configuration item serialized as a JSON string
+        for result in iter_items(self.engine.paginate(command), 'Results'):
+            yield json.loads(result)
+
+    def resources(self, resource_type):
+        # Configuration items of a type, or None when Config does not record it
+        if resource_type not in self._items and self.prefetch([resource_type]):
+            return None
+        return self._items[resource_type]
+
+
+def inventory_resource_type(command):
+    return INVENTORY_RESOURCE_TYPES.get((command[1], command[2]))
+
+
+def inventory_enabled():
+    return os.getenv(INVENTORY_BACKEND_ENV_VAR, 'config').lower() != 'direct'
@@ -0,0 +1,148 @@
+import os
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from _config.engine import AWSCommandError
+
+# Logs Insights queries kept running at once; the account quota is 30 per region,
+# shared with anyone else querying
+CONCURRENCY_ENV_VAR = 'AUDITBUDDY_INSIGHTS_CONCURRENCY'
+DEFAULT_CONCURRENCY = 10
+# Most rows a query returns; a slice that hits it is split and queried again
+RESULT_LIMIT = 10000
+DEFAULT_SLICE = timedelta(hours=6)
+DEFAULT_QUERY = 'fields @timestamp, @message, @logStream, @log | sort @timestamp asc'
+POLL_INTERVAL = 1.0
+MAX_POLL_INTERVAL = 10.0
+MAX_ATTEMPTS = 3
+RUNNING_STATUSES = ('Scheduled', 'Running')
+
+
+def to_seconds(value):
+    return int(value.timestamp()) if isinstance(value, datetime) else int(value)
+
+
+def split_window(start, end, slice_seconds):
+    # Inclusive [start, end] second ranges; Insights includes both ends of a query window
+    slices = []
+    while start <= end:
+        slices.append((start, min(start + slice_seconds - 1, end)))
+        start += slice_seconds
+    return slices
+
+
+class InsightsExtractor:
+    """
+    Extracts log events with CloudWatch Logs Insights instead of paging
+    through filter-log-events. The window is cut into slices that run as
+    concurrent queries within the concurrent-query quota. Finished queries
+    are found with one describe-queries call per poll. A slice that returns
+    the 10,000-row maximum is split in half and queried again, so no event
+    is lost to the cap. Rows are yielded as each slice completes, not in
+    time order.
+    """
+
+    def __init__(self, engine, query=DEFAULT_QUERY, concurrency=None, slice_length=DEFAULT_SLICE):
+        self.engine = engine
+        self.query = query
+        self.concurrency = concurrency or int(os.getenv(CONCURRENCY_ENV_VAR, DEFAULT_CONCURRENCY))
+        self.slice_seconds = max(1, int(slice_length.total_seconds()))
+        self.queries = 0
+        self.splits = 0
+        self.rows_returned = 0
+        self.bytes_scanned = 0
+
+    def rows(self, log_groups, start, end):
+        """
+        Yields every row the query returns for `log_groups` between `start`
+        and `end` (datetimes or epoch seconds), as dicts of field to value.
+        """
+        pending = deque(split_window(to_seconds(start), to_seconds(end), self.slice_seconds))
+        running = {}
+        attempts = {}
+        interval = POLL_INTERVAL
+        while pending or running:
+            while pending and len(running) < self.concurrency:
+                window = pending.popleft()
+                try:
+                    query_id = self._start(log_groups, window)
+                except AWSCommandError as e:
+                    if 'LimitExceededException' not in str(e):
+                        raise
+                    # The account's concurrent query quota is in use, wait for a slot
+                    pending.appendleft(window)
+                    break
+                running[query_id] = window
+
+            time.sleep(interval)
+            still_running = self._running_query_ids()
+            finished = [query_id for query_id in running if query_id not in still_running]
+            interval = POLL_INTERVAL if finished else min(interval * 1.5, MAX_POLL_INTERVAL)
+            for query_id in finished:
+                window = running.pop(query_id)
+                response = self.engine.run_command(['aws', 'logs', 'get-query-results', '--query-id', query_id, '--output', 'json'])
+                status = response.get('status')
+                if status in RUNNING_STATUSES:
+                    running[query_id] = window
+                    continue
+                if status == 'Complete':
+                    yield from self._complete(window, response, pending)
+                    continue
+                if status == 'Timeout' and window[0] < window[1]:
+                    self._split(window, pending)
+                    continue
+                attempts[window] = attempts.get(window, 0) + 1
+                if attempts[window] >= MAX_ATTEMPTS:
+                    raise AWSCommandError(f"Logs Insights query for {window[0]}-{window[1]} ended {status} {attempts[window]} times")
+                pending.append(window)
+
+    def _start(self, log_groups, window):
+        response = self.engine.run_command([
+            'aws', 'logs', 'start-query', '--log-group-names', *log_groups,
+            '--start-time', str(window[0]), '--end-time', str(window[1]),
+            '--query-string', self.query, '--limit', str(RESULT_LIMIT), '--output', 'json'
+        ])
+        self.queries += 1
+        return response['queryId']
+
+    def _running_query_ids(self):
+        # One call tells which of our queries are still running, instead of one get-query-results each
+        response = self.engine.run_command(['aws', 'logs', 'describe-queries', '--status', 'Running', '--output', 'json'])
+        return {query['queryId'] for query in response.get('queries', [])}
+
+    def _complete(self, window, response, pending):
+        results = response.get('results', [])
+        self.bytes_scanned += int((response.get('statistics') or {}).get('bytesScanned', 0))
+        if len(results) >= RESULT_LIMIT:
+            if window[0] < window[1]:
+                self._split(window, pending)
+                return
+            print(f"Logs Insights returned the {RESULT_LIMIT} row maximum for the single second {window[0]}, "
+                  f"later rows of that second are missing")
+        for row in results:
+            self.rows_returned += 1
+            yield {field['field']: field['value'] for field in row if field['field'] != '@ptr'}
+
+    def _split(self, window, pending):
+        middle = (window[0] + window[1]) // 2
+        # Run the halves next, they cover a window the earlier slices already passed
+        pending.appendleft((middle + 1, window[1]))
+        pending.appendleft((window[0], middle))
+        self.splits += 1
+
+    def report(self):
+        return (f"Logs Insights: {self.queries} queries, {self.splits} slices split at the row limit, "
+                f"{self.rows_returned} rows, {self.bytes_scanned} bytes scanned")
+
+
+def trail_log_groups(engine, region):
+    # Names of the CloudWatch Logs groups CloudTrail delivers to in `region`
+    trails = engine.run_command(['aws', 'cloudtrail', 'describe-trails', '--region', region, '--output', 'json']).get('trailList', [])
+    groups = []
+    for trail in trails:
+        arn = trail.get('CloudWatchLogsLogGroupArn')
+        if arn and arn.split(':')[3] == region:
+            name = arn.split(':log-group:', 1)[1]
+            groups.append(name[:-2] if name.endswith(':*') else name)
+    return list(dict.fromkeys(groups))
@@ -0,0 +1,136 @@
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime, timedelta, timezone
+
+from _config.engine import AWSExecutionEngine
+from _config.session import AWSSession
+
+# Role to assume in every member account. Unset keeps single-account collection.
+ORG_ROLE_ENV_VAR = 'AUDITBUDDY_ORG_ROLE'
+STS_CACHE_ENV_VAR = 'AUDITBUDDY_STS_CACHE_DIR'
+DEFAULT_STS_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'auditbuddy', 'sts')
+ROLE_SESSION_NAME = 'auditbuddy-evidence'
+SESSION_DURATION = 3600
+# Cached credentials closer than this to expiry are refreshed, botocore's
+# advisory refresh window, so a refresh never gets back the same credentials
+EXPIRY_MARGIN = timedelta(minutes=15)
+# FanOut pool that caps how many member accounts collect at once, across all environments
+ACCOUNT_POOL = 'accounts'
+
+
+class StsCredentialCache:
+    """
+    On-disk cache of assumed-role credentials, one file per role, reused
+    until shortly before they expire.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.getenv(STS_CACHE_ENV_VAR) or DEFAULT_STS_CACHE_DIR
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, key):
+        try:
+            with open(self._path(key)) as f:
+                credentials = json.load(f)
+        except (OSError, ValueError):
+            return None
+        expiration = datetime.fromisoformat(credentials['Expiration'].replace('Z', '+00:00'))
+        if expiration - EXPIRY_MARGIN <= datetime.now(timezone.utc):
+            return None
+        return credentials
+
+    def put(self, key, credentials):
+        with self._lock:
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            path = self._path(key)
+            # Credentials are secrets, keep the file private to the current user
+            fd = os.open(path + '.tmp', os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(credentials, f)
+            os.replace(path + '.tmp', path)
+
+
+def list_accounts(engine):
+    data = engine.run_command(['aws', 'organizations', 'list-accounts', '--output', 'json'])
+    return [account for account in data.get('Accounts', []) if account.get('Status') == 'ACTIVE']
+
+
+def assume_role_session(engine, account_id, role_name, region, credential_cache):
+    """
+    Returns an AWSSession for the role in the member account. Its credentials
+    are assumed again through the cache before they expire, so collections
+    running past the session duration keep working.
+    """
+    role_arn = f"arn:{partition_for(region)}:iam::{account_id}:role/{role_name}"
+    key = f"{engine.env_name}|{role_arn}"
+
+    def refresh():
+        credentials = credential_cache.get(key)
+        if credentials is None:
+            response = engine.run_command([
+                'aws', 'sts', 'assume-role',
+                '--role-arn', role_arn,
+                '--role-session-name', ROLE_SESSION_NAME,
+                '--duration-seconds', str(SESSION_DURATION),
+                '--output', 'json'
+            ])
+            credentials = response['Credentials']
+            credential_cache.put(key, credentials)
+        return credentials
+
+    # Assumed once up front so an account whose role cannot be assumed fails here
+    refresh()
+    return AWSSession(region=region, refresh=refresh)
+
+
+def partition_for(region):
+    if region and region.startswith('us-gov-'):
+        return 'aws-us-gov'
+    if region and region.startswith('cn-'):
+        return 'aws-cn'
+    return 'aws'
+
+
+def account_config(config, account_id, session):
+    engine = config['engine']
+    scoped = dict(config)
+    scoped['account_id'] = account_id
+    scoped['engine'] = AWSExecutionEngine(f"{engine.env_name}/{account_id}", config['region'],
+                                          engine.use_cli, engine.max_pool_connections, engine.cache, session,
+                                          engine.rate_limiter)
+    scoped['output_files'] = {
+        key: os.path.join(os.path.dirname(path), account_id, os.path.basename(path))
+        for key, path in config['output_files'].items()
+    }
+    return scoped
+
+
+def sweep_accounts(config, collect_account, role_name=None, credential_cache=None):
+    """
+    Runs collect_account(config) for every active account in the organization,
+    assuming `role_name` in each one. The environment's own credentials must be
+    allowed to list the organization's accounts and assume that role. Without a
+    role name this is a plain call with the environment's own config.
+    """
+    role_name = role_name or config.get('organization_role') or os.getenv(ORG_ROLE_ENV_VAR)
+    if not role_name:
+        collect_account(config)
+        return
+
+    credential_cache = credential_cache or StsCredentialCache()
+    accounts = list_accounts(config['engine'])
+
+    def run_account(account):
+        account_id = account['Id']
+        try:
+            session = assume_role_session(config['engine'], account_id, role_name, config['region'], credential_cache)
+            collect_account(account_config(config, account_id, session))
+        except Exception as e:
+            print(f"Evidence collection failed for account {account_id}: {e}")
+
+    config['fanout'].map(run_account, accounts, service=ACCOUNT_POOL)
@@ -0,0 +1,60 @@
+import threading
+
+
+class ProjectionLayer:
+    """
+    Derives several evidence views from each raw API response instead of
+    making one call per view. Sources name a raw response of an item and
+    how to fetch it; views name the source they read and project their
+    record out of it. Per item, every source a view needs is fetched once
+    and shared by all of its views, and a source no view reads is never
+    fetched. A source without a fetch function is the item itself, e.g. a
+    list-functions entry that already carries a function's configuration.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.sources = {}
+        self.views = {}
+        self.fetches = {}
+        self.derived = 0
+        self._lock = threading.Lock()
+
+    def source(self, name, fetch=None):
+        # fetch(config, item) returns the raw response
+        self.sources[name] = fetch
+
+    def view(self, key, source, project):
+        # project(item, raw) returns the view's record for the item
+        if source not in self.sources:
+            raise ValueError(f"View {key} reads unregistered source {source}")
+        self.views[key] = (source, project)
+
+    def project(self, item):
+        raw = {}
+        records = {}
+        for key, (source, project) in self.views.items():
+            if source not in raw:
+                fetch = self.sources[source]
+                raw[source] = item if fetch is None else fetch(self.config, item)
+                if fetch is not None:
+                    with self._lock:
+                        self.fetches[source] = self.fetches.get(source, 0) + 1
+            records[key] = project(item, raw[source])
+        with self._lock:
+            self.derived += len(records)
+        return records
+
+    def collect(self, items, service=None):
+        """
+        Returns {view key: [record per item]}, in item order. Items are
+        projected concurrently on the config's fan-out when it has one.
+        """
+        fanout = self.config.get('fanout')
+        projected = fanout.map(self.project, items, service=service) if fanout is not None else [self.project(item) for item in items]
+        return {key: [records[key] for records in projected] for key in self.views}
+
+    def report(self):
+        fetches = sum(self.fetches.values())
+        detail = ', '.join(f"{count} {source}" for source, count in sorted(self.fetches.items()))
+        return f"{self.derived} evidence records from {fetches} per-item fetches" + (f" ({detail})" if detail else '')
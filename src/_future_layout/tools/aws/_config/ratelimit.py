@@ -0,0 +1,184 @@
+import os
+import json
+import time
+import random
+import threading
+
+# Error codes AWS services use to signal throttling
+THROTTLING_ERROR_CODES = {
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'RequestThrottledException',
+    'TooManyRequestsException',
+    'ProvisionedThroughputExceededException',
+    'TransactionInProgressException',
+    'RequestLimitExceeded',
+    'BandwidthLimitExceeded',
+    'RequestThrottled',
+    'SlowDown',
+    'PriorRequestNotComplete',
+    'EC2ThrottledException',
+}
+
+# Starting requests per second per (account, region, service); the limiter
+# adapts from there. CloudTrail lookup-events is documented at 2 TPS.
+DEFAULT_RATE = 20.0
+SERVICE_RATES = {
+    'backup': 10.0,
+    'cloudtrail': 2.0,
+    'elbv2': 10.0,
+    'guardduty': 10.0,
+    'inspector2': 10.0,
+    # CloudTrail archive downloads, S3 serves thousands of GETs per second per prefix
+    's3': 100.0,
+}
+MIN_RATE = 0.5
+ADDITIVE_INCREASE = 0.1
+MULTIPLICATIVE_DECREASE = 0.5
+
+# Write the throttling statistics as JSON to this path when the run reports
+STATS_ENV_VAR = 'AUDITBUDDY_THROTTLE_STATS'
+
+
+def is_throttling_message(message):
+    return any(code in message for code in THROTTLING_ERROR_CODES)
+
+
+class TokenBucket:
+    def __init__(self, rate):
+        self.rate = rate
+        self.max_rate = rate * 2
+        self.tokens = max(1.0, rate)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Tokens may go negative: each waiting caller reserves its own slot
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def increase(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + ADDITIVE_INCREASE)
+
+    def decrease(self):
+        with self.lock:
+            self.rate = max(MIN_RATE, self.rate * MULTIPLICATIVE_DECREASE)
+
+
+class AdaptiveRateLimiter:
+    """
+    Token-bucket rate limiting per (account, region, service) that backs off
+    multiplicatively on throttling errors and recovers additively on success
+    (AIMD). Throttled requests are retried with full-jitter exponential
+    backoff. Time spent waiting for tokens and backing off is recorded per key.
+    """
+
+    def __init__(self, rates=None, max_attempts=8, base_delay=0.5, max_delay=30.0):
+        self.rates = dict(SERVICE_RATES, **(rates or {}))
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._buckets = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, key):
+        with self._lock:
+            if key not in self._buckets:
+                self._buckets[key] = TokenBucket(self.rates.get(key[2], DEFAULT_RATE))
+                self._stats[key] = {'requests': 0, 'throttles': 0, 'retries': 0, 'token_wait': 0.0, 'backoff_wait': 0.0}
+            return self._buckets[key]
+
+    def _record(self, key, **values):
+        with self._lock:
+            stats = self._stats[key]
+            for name, value in values.items():
+                stats[name] += value
+
+    def acquire(self, key):
+        waited = self._bucket(key).acquire()
+        self._record(key, requests=1, token_wait=waited)
+
+    def on_success(self, key):
+        self._bucket(key).increase()
+
+    def on_throttle(self, key):
+        self._bucket(key).decrease()
+        self._record(key, throttles=1)
+
+    def backoff(self, key, attempt):
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        self._record(key, retries=1, backoff_wait=delay)
+        return delay
+
+    def attach(self, client, key):
+        """
+        Hooks the limiter into a botocore client so every HTTP attempt, including
+        each page of a paginated call, waits for a token. The client must be
+        created with botocore's own retries disabled; this limiter retries instead.
+        """
+        def before_send(**kwargs):
+            self.acquire(key)
+
+        def needs_retry(response=None, attempts=1, caught_exception=None, **kwargs):
+            if response is not None:
+                http_response, parsed = response
+                if parsed.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES:
+                    self.on_throttle(key)
+                elif http_response.status_code < 500:
+                    self.on_success(key)
+                    return None
+            if attempts >= self.max_attempts:
+                return None
+            # Throttling, 5xx responses and connection errors are retried
+            return self.backoff(key, attempts)
+
+        client.meta.events.register('before-send', before_send)
+        client.meta.events.register('needs-retry', needs_retry)
+
+    def call(self, key, func):
+        # Same policy for callers outside botocore, such as the aws CLI fallback
+        for attempt in range(1, self.max_attempts + 1):
+            self.acquire(key)
+            try:
+                result = func()
+            except Exception as e:
+                if attempt >= self.max_attempts or not is_throttling_message(str(e)):
+                    raise
+                self.on_throttle(key)
+                time.sleep(self.backoff(key, attempt))
+            else:
+                self.on_success(key)
+                return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                '/'.join(str(part) for part in key): dict(stats, rate=round(self._buckets[key].rate, 2))
+                for key, stats in self._stats.items()
+            }
+
+    def report(self):
+        stats = self.stats()
+        path = os.getenv(STATS_ENV_VAR)
+        if path:
+            with open(path, 'w') as f:
+                json.dump(stats, f, indent=4, sort_keys=True)
+        throttles = sum(item['throttles'] for item in stats.values())
+        token_wait = sum(item['token_wait'] for item in stats.values())
+        backoff_wait = sum(item['backoff_wait'] for item in stats.values())
+        lines = [f"Rate limiter: {throttles} throttled responses, {token_wait:.1f}s waiting for tokens, {backoff_wait:.1f}s backing off"]
+        for name, item in sorted(stats.items(), key=lambda entry: -(entry[1]['token_wait'] + entry[1]['backoff_wait']))[:10]:
+            if item['throttles'] or item['token_wait'] or item['backoff_wait']:
+                lines.append(f"  {name}: {item['requests']} requests, {item['throttles']} throttled, "
+                             f"{item['token_wait'] + item['backoff_wait']:.1f}s waiting, settled at {item['rate']} req/s")
+        return '\n'.join(lines)
@@ -0,0 +1,70 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Comma separated region list, or `all` for every region enabled in the account.
+# Unset keeps the single region configured for the environment.
+REGIONS_ENV_VAR = 'AUDITBUDDY_AWS_REGIONS'
+MAX_REGION_WORKERS = 8
+
+
+def enabled_regions(engine):
+    data = engine.run_command([
+        'aws', 'ec2', 'describe-regions',
+        '--filters', 'Name=opt-in-status,Values=opt-in-not-required,opted-in',
+        '--output', 'json'
+    ])
+    return sorted(region['RegionName'] for region in data.get('Regions', []))
+
+
+def resolve_regions(config):
+    """
+    Returns the regions to sweep for an environment, or None when region
+    fan-out is off. `config['regions']` takes precedence over AUDITBUDDY_AWS_REGIONS.
+    """
+    regions = config.get('regions') or os.getenv(REGIONS_ENV_VAR)
+    if not regions:
+        return None
+    if regions == 'all':
+        return enabled_regions(config['engine'])
+    if isinstance(regions, str):
+        regions = regions.split(',')
+    return [region.strip() for region in regions if region.strip()]
+
+
+def partition_output_files(output_files, region):
+    return {
+        key: os.path.join(os.path.dirname(path), region, os.path.basename(path))
+        for key, path in output_files.items()
+    }
+
+
+def region_config(config, region):
+    scoped = dict(config)
+    scoped['region'] = region
+    scoped['engine'] = config['engine'].for_region(region)
+    scoped['output_files'] = partition_output_files(config['output_files'], region)
+    return scoped
+
+
+def sweep_regions(config, collect_region, regions=None):
+    """
+    Runs collect_region(config) once per region, concurrently. Each call gets
+    a copy of the environment config scoped to its region, with output files
+    partitioned into a per-region directory. Without a region list this is a
+    plain call with the environment's own config.
+    """
+    regions = regions or resolve_regions(config)
+    if not regions:
+        collect_region(config)
+        return
+
+    scoped_configs = [region_config(config, region) for region in regions]
+    for scoped in scoped_configs:
+        for file_path in scoped['output_files'].values():
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+    with ThreadPoolExecutor(max_workers=min(len(scoped_configs), MAX_REGION_WORKERS)) as executor:
+        futures = {scoped['region']: executor.submit(collect_region, scoped) for scoped in scoped_configs}
+    for region, future in futures.items():
+        if future.exception() is not None:
+            print(f"Evidence collection failed for {region}: {future.exception()}")
@@ -0,0 +1,433 @@
+import io
+import os
+import re
+import copy
+import json
+import time
+import base64
+import random
+import hashlib
+import threading
+from datetime import datetime
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+try:
+    import botocore.session
+    from botocore.awsrequest import AWSResponse
+    from botocore.exceptions import ClientError
+    from botocore.response import StreamingBody
+except ImportError:  # only the requests harness is available without botocore
+    botocore = None
+
+# `record` saves every AWS and HTTP response as a fixture, `replay` answers from
+# the fixtures without touching the network. Unset leaves the harness off.
+MODE_ENV_VAR = 'AUDITBUDDY_REPLAY'
+FIXTURES_ENV_VAR = 'AUDITBUDDY_FIXTURES_DIR'
+DEFAULT_FIXTURES_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'auditbuddy', 'fixtures')
+# Simulated service behaviour while replaying
+LATENCY_ENV_VAR = 'AUDITBUDDY_REPLAY_LATENCY_MS'
+THROTTLE_ENV_VAR = 'AUDITBUDDY_REPLAY_THROTTLE_RATE'
+# Request values that change from run to run and must not change the fixture key
+TIME_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}([T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?(Z|[+-]\d{2}:?\d{2})?$')
+TIME_KEY_PATTERN = re.compile(r'(time|date|since|until)$', re.IGNORECASE)
+SYNTHETIC_TOKEN = 'synthetic:'
+# Query parameter holding the offset of a synthetic HTTP page, like Okta's `after` cursor
+HTTP_PAGE_PARAM = 'after'
+# Fields whose values identify an item and are made unique in synthetic copies
+IDENTIFIER_SUFFIXES = ('Id', 'ID', 'Name', 'Arn', 'ARN', 'Key', 'id', 'name', 'login', 'email')
+
+
+def replay_mode():
+    return os.getenv(MODE_ENV_VAR, 'off').lower()
+
+
+def normalize_request(value, key=''):
+    # Request with run-dependent times masked, keys sorted
+    if isinstance(value, dict):
+        return {name: normalize_request(item, name) for name, item in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [normalize_request(item, key) for item in value]
+    if isinstance(value, datetime) or (key and TIME_KEY_PATTERN.search(key)) or \
+            (isinstance(value, str) and TIME_PATTERN.match(value)):
+        return '<time>'
+    if isinstance(value, bytes):
+        return hashlib.sha256(value).hexdigest()
+    return value
+
+
+def request_hash(request):
+    return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:24]
+
+
+def encode(value):
+    # JSON-safe copy of a parsed botocore response; bodies are read into bytes
+    if isinstance(value, dict):
+        return {key: encode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [encode(item) for item in value]
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    if botocore is not None and isinstance(value, StreamingBody):
+        value = value.read()
+    if isinstance(value, bytes):
+        return {'__bytes__': base64.b64encode(value).decode('ascii')}
+    return value
+
+
+def decode(value):
+    if isinstance(value, dict):
+        if '__datetime__' in value:
+            return datetime.fromisoformat(value['__datetime__'])
+        if '__bytes__' in value:
+            return base64.b64decode(value['__bytes__'])
+        return {key: decode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [decode(item) for item in value]
+    return value
+
+
+def decode_response(value):
+    # Parsed response as botocore returns it; S3 object bodies are streams
+    response = decode(value)
+    if isinstance(response.get('Body'), bytes):
+        response['Body'] = StreamingBody(io.BytesIO(response['Body']), len(response['Body']))
+    return response
+
+
+def as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+_paginator_configs = {}
+
+
+def paginator_config(service, operation):
+    # input_token, output_token and result_key of a paginated operation, {} otherwise
+    if service not in _paginator_configs:
+        try:
+            _paginator_configs[service] = botocore.session.get_session().get_paginator_model(service)
+        except Exception:
+            _paginator_configs[service] = None
+    try:
+        return _paginator_configs[service].get_paginator(operation)
+    except (AttributeError, ValueError):
+        return {}
+
+
+def synthetic_item(template, index):
+    """
+    Copy `index` of a template item, its identifying values suffixed with
+    the index everywhere they appear, e.g. inside ARNs and embedded JSON.
+    """
+    identifiers = sorted({str(value) for key, value in template.items()
+                          if isinstance(value, str) and value and key.endswith(IDENTIFIER_SUFFIXES)}, key=len, reverse=True)
+    if not identifiers:
+        return copy.deepcopy(template)
+    pattern = re.compile('|'.join(re.escape(identifier) for identifier in identifiers))
+    text = json.dumps(template)
+    return json.loads(pattern.sub(lambda match: f"{match.group(0)}-{index}", text))
+
+
+class FixtureStore:
+    """
+    Fixture files of recorded responses, one JSON file per request under
+    `aws/<service>/<operation>/` or `http/<host>/`, named by the hash of
+    the normalized request.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or os.getenv(FIXTURES_ENV_VAR) or DEFAULT_FIXTURES_DIR
+
+    def path(self, kind, group, request):
+        return os.path.join(self.root, kind, *group, request_hash(request) + '.json')
+
+    def load(self, kind, group, request):
+        try:
+            with open(self.path(kind, group, request)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, kind, group, request, fixture):
+        path = self.path(kind, group, request)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(dict(fixture, request=request), f, indent=4)
+        os.replace(path + '.tmp', path)
+        return path
+
+
+class SimulatedQuota:
+    # Requests per second a simulated service accepts per key before throttling
+    def __init__(self, rate):
+        self.rate = rate
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def admit(self, key):
+        if not self.rate:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            window = [stamp for stamp in self._windows.get(key, []) if now - stamp < 1.0]
+            admitted = len(window) < self.rate
+            if admitted:
+                window.append(now)
+            self._windows[key] = window
+            return admitted
+
+
+class ReplayHarness:
+    """
+    Records API responses to fixture files or replays them offline, for
+    the AWS execution engine (botocore clients) and for scripts calling
+    SaaS APIs with requests. Replayed calls can be slowed by a simulated
+    latency and throttled above a simulated request rate; AWS throttles go
+    through the run's AdaptiveRateLimiter like real ones. Fixtures scaled
+    with scale_fixture() serve a synthetic population page by page.
+    """
+
+    def __init__(self, mode, store=None, latency_ms=None, throttle_rate=None):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Unknown replay mode {mode}, expected record or replay")
+        self.mode = mode
+        self.store = store or FixtureStore()
+        self.latency = float(latency_ms if latency_ms is not None else os.getenv(LATENCY_ENV_VAR, 0)) / 1000.0
+        self.quota = SimulatedQuota(float(throttle_rate if throttle_rate is not None else os.getenv(THROTTLE_ENV_VAR, 0)))
+        self.stats = {'recorded': 0, 'replayed': 0, 'synthetic_pages': 0, 'missing': 0, 'throttled': 0}
+        self._lock = threading.Lock()
+        self._requests_send = None
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _simulate(self, key):
+        # Latency with 20% jitter, then the simulated quota; False when throttled
+        if self.latency:
+            time.sleep(self.latency * random.uniform(0.8, 1.2))
+        if not self.quota.admit(key):
+            self._count('throttled')
+            return False
+        return True
+
+    # botocore
+
+    def attach(self, client, rate_limiter=None, limiter_key=None):
+        """
+        Hooks the harness into a botocore client. Replayed calls never reach
+        the network, so no credentials are needed.
+        """
+        service = client.meta.service_model.service_name
+
+        def capture_params(params, context, **kwargs):
+            context['replay_params'] = copy.deepcopy(params)
+
+        def replay(model, context, **kwargs):
+            params = context.get('replay_params', {})
+            fetch = lambda: self._replay_aws(service, model.name, params, limiter_key)
+            if rate_limiter is not None and limiter_key is not None:
+                return rate_limiter.call(limiter_key, fetch)
+            return fetch()
+
+        def record(http_response, parsed, model, context, **kwargs):
+            if http_response.status_code >= 300:
+                return
+            request = normalize_request(context.get('replay_params', {}))
+            response = {key: value for key, value in parsed.items() if key != 'ResponseMetadata'}
+            encoded = encode(response)
+            if 'Body' in response:
+                # The collector still has to read the body it was handed
+                parsed['Body'] = decode_response(encoded)['Body']
+            self.store.save('aws', (service, model.name), request, {'response': encoded})
+            self._count('recorded')
+
+        client.meta.events.register('provide-client-params', capture_params)
+        if self.mode == 'replay':
+            client.meta.events.register('before-call', replay)
+        else:
+            client.meta.events.register('after-call', record)
+
+    def _replay_aws(self, service, operation, params, limiter_key):
+        if not self._simulate(limiter_key or (service,)):
+            # Raised like a real throttle so the rate limiter backs off and retries
+            raise ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded (simulated)'}}, operation)
+        tokens = as_list(paginator_config(service, operation).get('input_token'))
+        first_page = {key: value for key, value in params.items() if key not in tokens}
+        fixture = self.store.load('aws', (service, operation), normalize_request(first_page))
+        if fixture is not None and 'synthetic' in fixture:
+            self._count('synthetic_pages')
+            offset = next((int(str(params[token])[len(SYNTHETIC_TOKEN):]) for token in tokens
+                           if str(params.get(token, '')).startswith(SYNTHETIC_TOKEN)), 0)
+            return AWSResponse(None, 200, {}, None), decode_response(self._synthetic_page(fixture, offset))
+        if first_page != params:
+            fixture = self.store.load('aws', (service, operation), normalize_request(params))
+        if fixture is None:
+            self._count('missing')
+            message = f"No fixture for {json.dumps(normalize_request(params), default=str)}"
+            raise ClientError({'Error': {'Code': 'ReplayFixtureMissing', 'Message': message}}, operation)
+        self._count('replayed')
+        return AWSResponse(None, 200, {}, None), decode_response(fixture['response'])
+
+    @staticmethod
+    def _synthetic_page(fixture, offset):
+        synthetic = fixture['synthetic']
+        templates = synthetic['items']
+        end = min(offset + synthetic['page_size'], synthetic['count'])
+        page = dict(fixture['response'])
+        page[synthetic['result_key']] = [synthetic_item(templates[index % len(templates)], index)
+                                         for index in range(offset, end)]
+        if end < synthetic['count']:
+            page[synthetic['output_token']] = f"{SYNTHETIC_TOKEN}{end}"
+        if synthetic.get('more_results'):
+            # e.g. IsTruncated, which botocore pages on instead of the token
+            page[synthetic['more_results']] = end < synthetic['count']
+        return page
+
+    # requests
+
+    def install_requests(self):
+        """
+        Routes every requests call in the process through the harness, at the
+        transport adapter, so scripts calling requests.get work unchanged.
+        """
+        import requests.adapters
+        if self._requests_send is not None:
+            return
+        self._requests_send = requests.adapters.HTTPAdapter.send
+        harness = self
+
+        def send(adapter, request, **kwargs):
+            if harness.mode == 'replay':
+                return harness._replay_http(request)
+            response = harness._requests_send(adapter, request, **kwargs)
+            harness._record_http(request, response)
+            return response
+
+        requests.adapters.HTTPAdapter.send = send
+
+    @staticmethod
+    def _http_request(request, drop=()):
+        parts = urlsplit(request.url)
+        query = sorted((name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True) if name not in drop)
+        body = request.body.encode('utf-8') if isinstance(request.body, str) else request.body
+        return (parts.netloc, normalize_request({'method': request.method, 'path': parts.path,
+                                                 'query': [list(pair) for pair in query], 'body': body or ''}))
+
+    def _record_http(self, request, response):
+        if response.status_code >= 300:
+            return
+        host, key = self._http_request(request)
+        fixture = {'response': {'status': response.status_code, 'url': response.url,
+                                'headers': {name: value for name, value in response.headers.items()
+                                            if name.lower() in ('content-type', 'link')},
+                                'body': base64.b64encode(response.content).decode('ascii')}}
+        self.store.save('http', (host,), key, fixture)
+        self._count('recorded')
+
+    def _replay_http(self, request):
+        import requests
+        from requests.structures import CaseInsensitiveDict
+        host, key = self._http_request(request)
+        response = requests.Response()
+        response.request = request
+        response.url = request.url
+        if not self._simulate((host,)):
+            response.status_code = 429
+            response.headers = CaseInsensitiveDict({'Retry-After': '1'})
+            response._content = b'{"error": "rate limited (simulated)"}'
+            return response
+
+        first_page = self._http_request(request, drop=(HTTP_PAGE_PARAM,))[1]
+        fixture = self.store.load('http', (host,), first_page)
+        if fixture is not None and 'synthetic' in fixture:
+            self._count('synthetic_pages')
+            offset = int(dict(parse_qsl(urlsplit(request.url).query)).get(HTTP_PAGE_PARAM, '0') or 0)
+            synthetic = fixture['synthetic']
+            end = min(offset + synthetic['page_size'], synthetic['count'])
+            items = [synthetic_item(synthetic['items'][index % len(synthetic['items'])], index) for index in range(offset, end)]
+            headers = {'Content-Type': 'application/json'}
+            if end < synthetic['count']:
+                parts = urlsplit(request.url)
+                query = [(name, value) for name, value in parse_qsl(parts.query) if name != HTTP_PAGE_PARAM]
+                next_url = urlunsplit(parts._replace(query=urlencode(query + [(HTTP_PAGE_PARAM, str(end))])))
+                headers['Link'] = f'<{next_url}>; rel="next"'
+            response.status_code = 200
+            response.headers = CaseInsensitiveDict(headers)
+            response._content = json.dumps(items).encode('utf-8')
+            return response
+
+        fixture = self.store.load('http', (host,), key)
+        if fixture is None:
+            self._count('missing')
+            raise requests.ConnectionError(f"No fixture for {request.method} {request.url}")
+        self._count('replayed')
+        response.status_code = fixture['response']['status']
+        response.headers = CaseInsensitiveDict(fixture['response']['headers'])
+        response._content = base64.b64decode(fixture['response']['body'])
+        response.encoding = 'utf-8'
+        return response
+
+    def report(self):
+        stats = self.stats
+        return (f"Replay harness ({self.mode}, {self.store.root}): {stats['recorded']} recorded, {stats['replayed']} replayed, "
+                f"{stats['synthetic_pages']} synthetic pages, {stats['missing']} missing, {stats['throttled']} throttled")
+
+
+def scale_fixture(path, count, page_size=None, result_key=None):
+    """
+    Turns a recorded first-page fixture into a synthetic one serving `count`
+    items, copies of the recorded items made unique, in pages of the
+    recorded page size. Items are generated page by page when replayed, so
+    a million CloudTrail events never sit on disk or in memory.
+    """
+    with open(path) as f:
+        recorded = json.load(f)
+    response = recorded['response']
+    if 'body' in response:
+        items = json.loads(base64.b64decode(response['body']))
+        if not isinstance(items, list) or not items:
+            raise ValueError(f"{path} holds no JSON list to scale")
+        fixture = {'response': {}, 'synthetic': {'items': items}}
+    else:
+        parts = os.path.normpath(path).split(os.sep)
+        service, operation = parts[-3], parts[-2]
+        paginator = paginator_config(service, operation)
+        result_key = result_key or next(iter(as_list(paginator.get('result_key'))), None)
+        output_token = next(iter(as_list(paginator.get('output_token'))), None)
+        if not result_key or not response.get(result_key):
+            raise ValueError(f"{path} has no list to scale, name it with result_key")
+        items = response[result_key]
+        template = {key: value for key, value in response.items() if key not in (result_key, output_token)}
+        fixture = {'response': template, 'synthetic': {'items': items, 'result_key': result_key, 'output_token': output_token,
+                                                       'more_results': paginator.get('more_results')}}
+        if output_token is None:
+            # An operation without pagination answers in one response
+            page_size = count
+    fixture['synthetic'].update(count=count, page_size=page_size or len(items))
+    fixture['request'] = recorded['request']
+    with open(path + '.tmp', 'w') as f:
+        json.dump(fixture, f, indent=4)
+    os.replace(path + '.tmp', path)
+    return fixture['synthetic']
+
+
+_harness = None
+_harness_lock = threading.Lock()
+
+
+def replay_harness():
+    """
+    The process's ReplayHarness when AUDITBUDDY_REPLAY is record or replay,
+    otherwise None.
+    """
+    global _harness
+    mode = replay_mode()
+    if mode not in ('record', 'replay'):
+        return None
+    with _harness_lock:
+        if _harness is None:
+            _harness = ReplayHarness(mode)
+        return _harness
@@ -0,0 +1,218 @@
+import os
+import re
+import json
+import shlex
+import itertools
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+try:
+    import jmespath
+except ImportError:  # installed with botocore, only needed for rules that reference other operations
+    jmespath = None
+
+# Directory of the rule files, defaults to framework/rules/service-provider/aws
+RULES_DIR_ENV_VAR = 'AUDITBUDDY_RULES_DIR'
+DEFAULT_RULES_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))),
+    'framework', 'rules', 'service-provider', 'aws')
+PLACEHOLDER = '<Placeholder>'
+# A parameter value of the form `aws <service> <operation> | <JMESPath>` takes its
+# values from the response of another operation
+REFERENCE_SEPARATOR = ' | '
+READ_ONLY_PREFIXES = ('describe-', 'list-', 'get-', 'batch-get-', 'lookup-', 'select-')
+PARAMETER_PATTERN = re.compile(r'<([\w-]+)>')
+# Operations waiting on their dependencies hold no fan-out slot, so this only bounds idle threads
+MAX_PLAN_WORKERS = 32
+
+
+def is_read_only(command):
+    parts = command.split()
+    return len(parts) >= 3 and parts[0] == 'aws' and parts[2].startswith(READ_ONLY_PREFIXES)
+
+
+def load_rules(rules_dir=None):
+    """
+    Loads the rules of every rule file. Templates, rules still holding
+    placeholders and files that are not valid JSON are skipped with a message.
+    """
+    rules_dir = rules_dir or os.getenv(RULES_DIR_ENV_VAR) or DEFAULT_RULES_DIR
+    rules = []
+    for name in sorted(os.listdir(rules_dir)):
+        path = os.path.join(rules_dir, name)
+        if not name.endswith('.json') or name.startswith('_'):
+            continue
+        try:
+            with open(path) as f:
+                document = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Skipping rule file {path}: {e}")
+            continue
+        for rule in document.get('domain', []):
+            if PLACEHOLDER in json.dumps(rule):
+                continue
+            rules.append(dict(rule, source=name))
+    return rules
+
+
+class RuleOperation:
+    """
+    One aws CLI operation of a rule: `command`, its `sub-command` arguments
+    and the value of each `<parameter>` in them, either a literal or a
+    reference to another operation's response.
+    """
+
+    def __init__(self, command, sub_command='', parameters=None):
+        self.template = shlex.split(command) + shlex.split(sub_command or '')
+        if len(self.template) < 3 or self.template[0] != 'aws':
+            raise ValueError(f"Not an aws CLI command: {command}")
+        if not is_read_only(command):
+            raise ValueError(f"{' '.join(self.template[:3])} is not a read-only operation")
+        self.service = self.template[1]
+        self.parameters = dict(parameters or {})
+        self.references = {}
+        for name, value in self.parameters.items():
+            if value.startswith('aws ') and REFERENCE_SEPARATOR in value:
+                reference, expression = value.split(REFERENCE_SEPARATOR, 1)
+                self.references[name] = (RuleOperation(reference), expression.strip())
+            elif value == f"<{name}>":
+                raise ValueError(f"Parameter {name} of {command} has no value")
+        missing = {name for token in self.template for name in PARAMETER_PATTERN.findall(token)} - set(self.parameters)
+        if missing:
+            raise ValueError(f"{command} {sub_command} has no value for {', '.join(sorted(missing))}")
+        # Identical operations of different rules share this key, and so one node of the plan
+        self.key = tuple(self.template) + tuple(sorted(self.parameters.items()))
+
+    @classmethod
+    def from_rule(cls, operation):
+        return cls(operation['command'], operation.get('sub-command', ''), operation.get('parameters'))
+
+    def expand(self, results):
+        """
+        Returns the command lists to run, one per combination of parameter
+        values. `results` holds the (command, response) pairs of the
+        operations this one references.
+        """
+        values = []
+        for name, value in self.parameters.items():
+            if name in self.references:
+                reference, expression = self.references[name]
+                values.append([(name, item) for item in reference_values(results[reference.key], expression)])
+            else:
+                values.append([(name, value)])
+        commands = []
+        for combination in itertools.product(*values):
+            bound = dict(combination)
+            commands.append([PARAMETER_PATTERN.sub(lambda match: str(bound[match.group(1)]), token)
+                             for token in self.template])
+        return commands
+
+
+def reference_values(results, expression):
+    if jmespath is None:
+        raise RuntimeError("Rule parameter references need jmespath (installed with botocore)")
+    values = []
+    for _, response in results:
+        value = jmespath.search(expression, response)
+        if value is None:
+            continue
+        values.extend(value if isinstance(value, list) else [value])
+    return list(dict.fromkeys(values))
+
+
+def rule_operations(rule):
+    # The rule's `evidence` operations, or the rule's own command when it is read-only
+    if rule.get('evidence'):
+        return [RuleOperation.from_rule(operation) for operation in rule['evidence']]
+    if is_read_only(rule.get('command', '')):
+        return [RuleOperation.from_rule(rule)]
+    raise ValueError("no evidence operations and the command is not read-only")
+
+
+class RulePlan:
+    """
+    The evidence operations of every rule compiled into one DAG. Identical
+    operations across rules become a single node, and an operation whose
+    parameters reference another operation's response depends on that node.
+    Each node runs once, as soon as its dependencies finished.
+    """
+
+    def __init__(self, rules):
+        self.rules = []
+        self.nodes = {}
+        self.dependencies = {}
+        self.operation_count = 0
+        for rule in rules:
+            try:
+                operations = rule_operations(rule)
+            except ValueError as e:
+                print(f"Skipping rule {rule.get('rule')} in {rule.get('source')}: {e}")
+                continue
+            self.rules.append((rule, [self._add(operation) for operation in operations]))
+            self.operation_count += len(operations)
+
+    def _add(self, operation):
+        if operation.key not in self.nodes:
+            self.nodes[operation.key] = operation
+            self.dependencies[operation.key] = {self._add(reference) for reference, _ in operation.references.values()}
+        return operation.key
+
+    def summary(self):
+        return (f"Rule plan: {len(self.rules)} rules, {self.operation_count} operations, "
+                f"{len(self.nodes)} distinct API operations")
+
+    def execute(self, engine, fanout):
+        """
+        Runs the plan and returns (results, errors) by node key. A result is
+        the list of (command, response) pairs of the node's expanded commands;
+        nodes that failed, or depend on one that did, get an error message.
+        """
+        results = {}
+        errors = {}
+        waiting = dict(self.dependencies)
+        running = {}
+        with ThreadPoolExecutor(max_workers=min(MAX_PLAN_WORKERS, len(self.nodes) or 1)) as executor:
+            while waiting or running:
+                finished = results.keys() | errors.keys()
+                ready = [key for key, dependencies in waiting.items() if dependencies <= finished]
+                for key in ready:
+                    del waiting[key]
+                    failed = [dependency for dependency in self.dependencies[key] if dependency in errors]
+                    if failed:
+                        errors[key] = f"{' '.join(failed[0][:3])} failed: {errors[failed[0]]}"
+                    else:
+                        running[executor.submit(self._run, key, results, engine, fanout)] = key
+                if not running:
+                    if not ready:
+                        raise ValueError("Rule plan has a dependency cycle")
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = running.pop(future)
+                    try:
+                        results[key] = future.result()
+                    except Exception as e:
+                        errors[key] = str(e)
+        return results, errors
+
+    def _run(self, key, results, engine, fanout):
+        operation = self.nodes[key]
+        references = {reference.key: results[reference.key] for reference, _ in operation.references.values()}
+        commands = operation.expand(references)
+        return fanout.map(lambda command: (command, engine.run_command(command)), commands, service=operation.service)
+
+    def evidence(self, results, errors):
+        # One evidence document per rule, with the responses of its operations
+        for rule, keys in self.rules:
+            operations = []
+            for key in keys:
+                if key in errors:
+                    operations.append({'command': shlex.join(self.nodes[key].template), 'error': errors[key]})
+                    continue
+                operations.extend({'command': shlex.join(command), 'response': response} for command, response in results[key])
+            yield rule, {
+                'rule': rule['rule'],
+                'source': rule['source'],
+                'explanation': rule.get('explanation'),
+                'controls': rule.get('controls', []),
+                'evidence': operations,
+            }
@@ -0,0 +1,270 @@
+import io
+import os
+import re
+import csv
+import gzip
+import json
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from urllib.parse import unquote
+
+try:
+    import pyarrow.orc
+    import pyarrow.parquet
+except ImportError:  # ORC and Parquet inventories are optional, CSV needs nothing extra
+    pyarrow = None
+
+from _config.cloudtrail_archive import bounded_map, to_datetime
+from _config.engine import AWSCommandError
+
+# `inventory` reads the bucket's S3 Inventory report, `parallel` lists the bucket
+# by prefix; `auto` (the default) uses a recent inventory report when one exists
+LISTING_ENV_VAR = 'AUDITBUDDY_S3_LISTING'
+DEPTH_ENV_VAR = 'AUDITBUDDY_S3_PARTITION_DEPTH'
+DEFAULT_DEPTH = 2
+LISTING_WORKERS = 16
+# Pages listed ahead of the writer, bounds memory use
+QUEUE_PAGES = 64
+# An older inventory report misses too much of the bucket to stand in for a listing
+INVENTORY_MAX_AGE = timedelta(days=8)
+# Inventory fields renamed to the list-objects-v2 names the populations use
+INVENTORY_FIELD_NAMES = {'LastModifiedDate': 'LastModified'}
+
+
+def listing_mode():
+    return os.getenv(LISTING_ENV_VAR, 'auto').lower()
+
+
+class S3PrefixLister:
+    """
+    Lists a bucket as many concurrent listings instead of one. The folders
+    `depth` levels down the delimiter tree are discovered first, level by
+    level in parallel, then each folder is listed recursively on its own
+    worker and the keys stream out as pages arrive, in no particular order.
+    Keys that sit directly in a folder above that depth come from the
+    discovery listings. A flat bucket without folders is still listed in
+    one go; its S3 Inventory report is the fast path.
+    """
+
+    def __init__(self, engine, bucket, depth=None, workers=LISTING_WORKERS, delimiter='/'):
+        self.engine = engine
+        self.bucket = bucket
+        self.depth = depth if depth is not None else int(os.getenv(DEPTH_ENV_VAR, DEFAULT_DEPTH))
+        self.workers = workers
+        self.delimiter = delimiter
+        self.partitions = 0
+        self.pages = 0
+        self._lock = threading.Lock()
+
+    def _pages(self, prefix, delimited=False):
+        command = ['aws', 's3api', 'list-objects-v2', '--bucket', self.bucket, '--prefix', prefix, '--output', 'json']
+        if delimited:
+            command += ['--delimiter', self.delimiter]
+        for page in self.engine.paginate(command):
+            with self._lock:
+                self.pages += 1
+            yield page
+
+    def objects(self):
+        level = ['']
+        for _ in range(self.depth):
+            folders = []
+            yield from self._list_parallel(level, folders)
+            level = folders
+            if not level:
+                return
+        self.partitions = len(level)
+        yield from self._list_parallel(level)
+
+    def _list_parallel(self, prefixes, folders=None):
+        """
+        Yields the keys of every prefix, listed concurrently. With `folders`,
+        prefixes are listed one level deep and their sub-folders are
+        appended to it.
+        """
+        pages = queue.Queue(maxsize=QUEUE_PAGES)
+        stop = threading.Event()
+        finished = object()
+
+        def put(item):
+            # Gives up once the consumer stopped reading, so no worker blocks forever
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def list_prefix(prefix):
+            try:
+                for page in self._pages(prefix, delimited=folders is not None):
+                    if not put(page):
+                        return
+            finally:
+                put(finished)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(list_prefix, prefix) for prefix in prefixes]
+            try:
+                remaining = len(futures)
+                while remaining:
+                    page = pages.get()
+                    if page is finished:
+                        remaining -= 1
+                        continue
+                    if folders is not None:
+                        folders.extend(item['Prefix'] for item in page.get('CommonPrefixes') or [])
+                    yield from page.get('Contents') or []
+            finally:
+                stop.set()
+            for future in futures:
+                future.result()
+
+    def report(self):
+        return f"Parallel listing of s3://{self.bucket}: {self.partitions} prefixes, {self.pages} pages"
+
+
+class S3InventoryReport:
+    """
+    Reads the latest S3 Inventory report of a bucket instead of listing it.
+    The manifest names the report's data files (CSV, ORC or Parquet), which
+    are downloaded in parallel and streamed row by row as list-objects-v2
+    style objects. A report is at most a day or a week old, depending on
+    the inventory's schedule; ORC and Parquet reports need pyarrow.
+    """
+
+    def __init__(self, engine, bucket, manifest_bucket, manifest_key, manifest, workers=LISTING_WORKERS):
+        self.engine = engine
+        self.bucket = bucket
+        self.manifest_bucket = manifest_bucket
+        self.manifest_key = manifest_key
+        self.manifest = manifest
+        self.workers = workers
+        self.files = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def created(self):
+        # Report folders are named YYYY-MM-DDTHH-MMZ
+        folder = self.manifest_key.rsplit('/', 2)[-2]
+        return datetime.strptime(folder, '%Y-%m-%dT%H-%MZ').replace(tzinfo=timezone.utc)
+
+    def schema(self):
+        # Column names of CSV reports, which have no header row
+        return [field.strip() for field in self.manifest.get('fileSchema', '').split(',')]
+
+    def has_field(self, field):
+        # CSV schemas name fields like LastModifiedDate, ORC and Parquet ones like last_modified_date
+        if self.manifest.get('fileFormat', 'CSV') == 'CSV':
+            return field in self.schema()
+        snake_case = re.sub(r'(?<!^)(?=[A-Z])', '_', field).lower()
+        return re.search(rf'\b{snake_case}\b', self.manifest.get('fileSchema', '')) is not None
+
+    def _read(self, key):
+        content = self.engine.get_object(self.manifest_bucket, key)
+        with self._lock:
+            self.files += 1
+            self.bytes += len(content)
+        file_format = self.manifest.get('fileFormat', 'CSV')
+        if file_format == 'CSV':
+            schema = self.schema()
+            rows = [dict(zip(schema, row)) for row in csv.reader(io.StringIO(gzip.decompress(content).decode('utf-8')))]
+            # CSV reports URL encode the keys
+            for row in rows:
+                row['Key'] = unquote(row.get('Key', ''))
+            return rows
+        if pyarrow is None:
+            raise RuntimeError(f"{file_format} S3 Inventory reports need the pyarrow package (pip install pyarrow)")
+        if file_format == 'ORC':
+            return pyarrow.orc.ORCFile(io.BytesIO(content)).read().to_pylist()
+        return pyarrow.parquet.read_table(io.BytesIO(content)).to_pylist()
+
+    def objects(self):
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            keys = [item['key'] for item in self.manifest.get('files', [])]
+            for rows in bounded_map(executor, self._read, keys, window=self.workers * 2):
+                for row in rows:
+                    yield inventory_object(row)
+
+    def report(self):
+        return (f"S3 Inventory report s3://{self.manifest_bucket}/{self.manifest_key} "
+                f"({self.created:%Y-%m-%d}): {self.files} files, {self.bytes} bytes read")
+
+
+def inventory_object(row):
+    # One inventory row in list-objects-v2 shape; ORC and Parquet name fields in snake case
+    item = {}
+    for field, value in row.items():
+        field = ''.join(part[:1].upper() + part[1:] for part in field.split('_'))
+        if field == 'Bucket':
+            continue
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        item[INVENTORY_FIELD_NAMES.get(field, field)] = value
+    if isinstance(item.get('Size'), str) and item['Size'].isdigit():
+        item['Size'] = int(item['Size'])
+    return item
+
+
+def latest_inventory(engine, bucket):
+    """
+    Returns an S3InventoryReport for the bucket's newest enabled inventory
+    report, or None when the bucket has no report. Raises ValueError when
+    the report leaves out LastModifiedDate.
+    """
+    response = engine.run_command(['aws', 's3api', 'list-bucket-inventory-configurations', '--bucket', bucket, '--output', 'json'])
+    candidates = []
+    for configuration in response.get('InventoryConfigurationList') or []:
+        if not configuration.get('IsEnabled'):
+            continue
+        destination = configuration['Destination']['S3BucketDestination']
+        destination_bucket = destination['Bucket'].split(':::', 1)[-1]
+        prefix = destination.get('Prefix', '').strip('/')
+        folder = '/'.join(part for part in (prefix, bucket, configuration['Id']) if part) + '/'
+        command = ['aws', 's3api', 'list-objects-v2', '--bucket', destination_bucket, '--prefix', folder,
+                   '--delimiter', '/', '--output', 'json']
+        reports = [item['Prefix'] for page in engine.paginate(command) for item in page.get('CommonPrefixes') or []
+                   if item['Prefix'][len(folder):][:1].isdigit()]
+        if reports:
+            candidates.append((max(reports), destination_bucket))
+    if not candidates:
+        return None
+    report_folder, destination_bucket = max(candidates)
+    manifest_key = report_folder + 'manifest.json'
+    manifest = json.loads(engine.get_object(destination_bucket, manifest_key))
+    report = S3InventoryReport(engine, bucket, destination_bucket, manifest_key, manifest)
+    if not report.has_field('LastModifiedDate'):
+        # An optional inventory field the populations filter and date objects on
+        raise ValueError(f"s3://{destination_bucket}/{manifest_key} has no LastModifiedDate field")
+    return report
+
+
+def bucket_objects(engine, bucket, modified_since=None, mode=None):
+    """
+    Returns (source, objects) for a bucket population: the objects of its
+    recent S3 Inventory report or of a parallel listing, depending on
+    AUDITBUDDY_S3_LISTING, optionally only those modified since
+    `modified_since`. `source` has a report() describing what was read.
+    """
+    mode = mode or listing_mode()
+    source = None
+    if mode in ('auto', 'inventory'):
+        try:
+            source = latest_inventory(engine, bucket)
+        except (AWSCommandError, ValueError, KeyError) as e:
+            print(f"S3 Inventory report of {bucket} is unreadable, listing the bucket: {e}")
+        if source is not None and mode == 'auto' and source.created + INVENTORY_MAX_AGE < datetime.now(timezone.utc):
+            print(f"S3 Inventory report of {bucket} is from {source.created:%Y-%m-%d}, listing the bucket instead")
+            source = None
+        elif source is None and mode == 'inventory':
+            print(f"No S3 Inventory report for {bucket}, listing the bucket")
+    source = source or S3PrefixLister(engine, bucket)
+    objects = source.objects()
+    if modified_since is not None:
+        since = to_datetime(modified_since)
+        objects = (item for item in objects if to_datetime(item['LastModified']) >= since)
+    return source, objects
@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# Collectors run at once per region-scoped config
+WORKERS_ENV_VAR = 'AUDITBUDDY_COLLECTOR_WORKERS'
+DEFAULT_WORKERS = 4
+HISTORY_ENV_VAR = 'AUDITBUDDY_SCHEDULE_HISTORY'
+DEFAULT_HISTORY_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'auditbuddy', 'durations.json')
+# Weight of the latest run in a collector's recorded duration
+HISTORY_WEIGHT = 0.5
+# Collectors of one service share its rate limiter bucket and fan-out slots, so running
+# more of them at once only queues them; services that throttle hard get fewer
+DEFAULT_SERVICE_COLLECTORS = 3
+SERVICE_COLLECTOR_LIMITS = {
+    'cloudtrail': 1,
+    'guardduty': 2,
+    'wafv2': 2,
+}
+
+
+class DurationHistory:
+    """
+    Per-collector durations of previous runs, kept on disk as a moving
+    average. Schedulers of every region and environment share one file.
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv(HISTORY_ENV_VAR) or DEFAULT_HISTORY_PATH
+        self.durations = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, key):
+        return self.durations.get(key)
+
+    def record(self, durations):
+        with self._lock:
+            # Merge with what other schedulers saved since this one loaded the file
+            merged = self._load()
+            for key, seconds in durations.items():
+                previous = merged.get(key)
+                merged[key] = seconds if previous is None else HISTORY_WEIGHT * seconds + (1 - HISTORY_WEIGHT) * previous
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path + '.tmp', 'w') as f:
+                json.dump(merged, f, indent=4, sort_keys=True)
+            os.replace(self.path + '.tmp', self.path)
+            self.durations = merged
+
+
+class CollectorScheduler:
+    """
+    Runs the collectors of one region-scoped config on a worker pool instead
+    of in source order. Each collector's priority is its recorded duration
+    plus the longest chain of collectors waiting on it, so the slowest chains
+    start first and shorter collectors fill the remaining workers. At most
+    SERVICE_COLLECTOR_LIMITS collectors of one service run at once. A failed
+    collector is reported and skips the collectors that run after it.
+    """
+
+    def __init__(self, config, name, workers=None, history=None):
+        self.config = config
+        self.name = name
+        self.workers = workers or int(os.getenv(WORKERS_ENV_VAR, DEFAULT_WORKERS))
+        self.history = history or DurationHistory()
+        self.tasks = {}
+
+    def add(self, task, func, *args, service=None, after=()):
+        """
+        Schedules func(*args) as `task`. `after` names tasks that must finish
+        first, e.g. two collectors writing the same file.
+        """
+        if task in self.tasks:
+            raise ValueError(f"Collector {task} is already scheduled")
+        self.tasks[task] = {'func': func, 'args': args, 'service': service, 'after': set(after)}
+
+    def _key(self, task):
+        engine = self.config['engine']
+        return '|'.join([self.name, engine.env_name or '', self.config.get('account_id') or '', self.config['region'] or '', task])
+
+    def priorities(self):
+        # Recorded duration plus the longest chain after it; unknown collectors get the mean
+        known = [seconds for seconds in (self.history.get(self._key(task)) for task in self.tasks) if seconds is not None]
+        default = sum(known) / len(known) if known else 1.0
+        durations = {task: self.history.get(self._key(task)) or default for task in self.tasks}
+        followers = {task: [other for other, spec in self.tasks.items() if task in spec['after']] for task in self.tasks}
+        priorities = {}
+
+        def priority(task):
+            if task not in priorities:
+                priorities[task] = durations[task] + max((priority(follower) for follower in followers[task]), default=0)
+            return priorities[task]
+
+        for task in self.tasks:
+            priority(task)
+        return priorities
+
+    def run(self):
+        for task, spec in self.tasks.items():
+            unknown = spec['after'] - set(self.tasks)
+            if unknown:
+                raise ValueError(f"Collector {task} runs after unscheduled {', '.join(sorted(unknown))}")
+        priorities = self.priorities()
+        waiting = set(self.tasks)
+        done, failed, durations, running = set(), set(), {}, {}
+        active = {}
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while waiting or running:
+                skipped = [task for task in waiting if self.tasks[task]['after'] & failed]
+                while skipped:
+                    for task in skipped:
+                        waiting.discard(task)
+                        failed.add(task)
+                        print(f"Skipping {task} in {self.config['region']}: a collector it runs after failed")
+                    skipped = [task for task in waiting if self.tasks[task]['after'] & failed]
+                ready = sorted((task for task in waiting if self.tasks[task]['after'] <= done),
+                               key=lambda task: -priorities[task])
+                for task in ready:
+                    if len(running) >= self.workers:
+                        break
+                    service = self.tasks[task]['service']
+                    if service is not None and active.get(service, 0) >= SERVICE_COLLECTOR_LIMITS.get(service, DEFAULT_SERVICE_COLLECTORS):
+                        continue
+                    waiting.discard(task)
+                    active[service] = active.get(service, 0) + 1
+                    running[executor.submit(self._run, task)] = task
+                if not running:
+                    if waiting:
+                        raise ValueError(f"Collectors {', '.join(sorted(waiting))} wait on each other")
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    task = running.pop(future)
+                    active[self.tasks[task]['service']] -= 1
+                    try:
+                        durations[self._key(task)] = future.result()
+                        done.add(task)
+                    except Exception as e:
+                        failed.add(task)
+                        print(f"Collector {task} failed in {self.config['region']}: {e}")
+
+        self.history.record(durations)
+        return done, failed
+
+    def _run(self, task):
+        spec = self.tasks[task]
+        started = time.monotonic()
+        spec['func'](*spec['args'])
+        return time.monotonic() - started
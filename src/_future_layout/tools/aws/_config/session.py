@@ -0,0 +1,79 @@
+import os
+import threading
+
+try:
+    import botocore.session
+    from botocore.credentials import RefreshableCredentials
+except ImportError:  # boto3/botocore not installed, only the CLI path is available
+    botocore = None
+
+CREDENTIAL_ENV_VARS = ('AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY', 'AWS_SESSION_TOKEN', 'AWS_PROFILE')
+
+
+class AWSSession:
+    """
+    Credentials and region for one environment. The execution engine creates
+    its clients from this object (or hands it to the aws CLI subprocess)
+    instead of reading process-wide os.environ, so several environments can
+    collect concurrently in one process. With `refresh`, a function returning
+    temporary credentials (AccessKeyId, SecretAccessKey, SessionToken,
+    Expiration) such as an assumed role's, credentials are renewed before
+    they expire instead of being fixed for the session's lifetime.
+    """
+
+    def __init__(self, access_key=None, secret_key=None, region=None, session_token=None, profile=None, refresh=None):
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.session_token = session_token
+        self.region = region
+        self.profile = profile
+        self.refresh = refresh
+        self._botocore_session = None
+        self._lock = threading.Lock()
+
+    @property
+    def has_static_credentials(self):
+        return bool(self.access_key and self.secret_key)
+
+    def botocore_session(self):
+        with self._lock:
+            if self._botocore_session is None:
+                session = botocore.session.Session(profile=self.profile)
+                if self.refresh is not None:
+                    # botocore calls refresh again shortly before the credentials expire
+                    session._credentials = RefreshableCredentials.create_from_metadata(
+                        self._refresh_metadata(), self._refresh_metadata, 'assume-role')
+                elif self.has_static_credentials:
+                    session.set_credentials(self.access_key, self.secret_key, self.session_token)
+                if self.region:
+                    session.set_config_variable('region', self.region)
+                self._botocore_session = session
+            return self._botocore_session
+
+    def _refresh_metadata(self):
+        credentials = self.refresh()
+        return {'access_key': credentials['AccessKeyId'], 'secret_key': credentials['SecretAccessKey'],
+                'token': credentials['SessionToken'], 'expiry_time': credentials['Expiration']}
+
+    def cli_environment(self):
+        # Environment for an aws CLI subprocess, leaving os.environ untouched
+        env = dict(os.environ)
+        if self.refresh is not None:
+            credentials = self.refresh()
+            for name in CREDENTIAL_ENV_VARS:
+                env.pop(name, None)
+            env['AWS_ACCESS_KEY_ID'] = credentials['AccessKeyId']
+            env['AWS_SECRET_ACCESS_KEY'] = credentials['SecretAccessKey']
+            env['AWS_SESSION_TOKEN'] = credentials['SessionToken']
+        elif self.has_static_credentials:
+            for name in CREDENTIAL_ENV_VARS:
+                env.pop(name, None)
+            env['AWS_ACCESS_KEY_ID'] = self.access_key
+            env['AWS_SECRET_ACCESS_KEY'] = self.secret_key
+            if self.session_token:
+                env['AWS_SESSION_TOKEN'] = self.session_token
+        elif self.profile:
+            env['AWS_PROFILE'] = self.profile
+        if self.region:
+            env['AWS_DEFAULT_REGION'] = self.region
+        return env
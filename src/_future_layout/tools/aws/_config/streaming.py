@@ -0,0 +1,114 @@
+import os
+import json
+
+from _config.evidence_store import record_written
+from _config.formats import PARTIAL_SUFFIX, evidence_path, open_evidence_file, path_format
+
+
+class JsonArrayWriter:
+    """
+    Writes a JSON array to disk one item at a time, formatted like
+    json.dump(items, f, indent=4). Used as a context manager; the file is
+    moved into place only when the block completes without an error. A
+    failed run leaves the items written so far in `<file>.partial`.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._file = open_evidence_file(self.path + PARTIAL_SUFFIX, 'w')
+        self._start()
+        return self
+
+    def _start(self):
+        self._file.write('[')
+
+    def _finish(self):
+        self._file.write('\n]' if self.count else ']')
+
+    def write(self, item):
+        text = json.dumps(item, indent=4).replace('\n', '\n    ')
+        self._file.write((',\n    ' if self.count else '\n    ') + text)
+        self.count += 1
+
+    def write_all(self, items):
+        for item in items:
+            self.write(item)
+        return self.count
+
+    def __exit__(self, exc_type, exc, traceback):
+        self._finish()
+        self._file.close()
+        if exc_type is None:
+            os.replace(self.path + PARTIAL_SUFFIX, self.path)
+            record_written(self.path)
+        else:
+            print(f"Collection stopped after {self.count} items, partial evidence kept in {self.path + PARTIAL_SUFFIX}")
+        return False
+
+
+class JsonLinesWriter(JsonArrayWriter):
+    """
+    Writes one compact JSON document per line (JSON Lines).
+    """
+
+    def _start(self):
+        pass
+
+    def _finish(self):
+        pass
+
+    def write(self, item):
+        self._file.write(json.dumps(item, separators=(',', ':')) + '\n')
+        self.count += 1
+
+
+def open_writer(path, default=None):
+    """
+    Returns a writer for the configured output format, a JsonLinesWriter for
+    the JSON Lines formats (optionally gzip or zstd compressed) and a
+    JsonArrayWriter otherwise. `default` is the format used when
+    AUDITBUDDY_OUTPUT_FORMAT is unset, the path's own extension if omitted;
+    `writer.path` is the path actually written.
+    """
+    path = evidence_path(path, default or path_format(path))
+    if path_format(path) == 'json':
+        return JsonArrayWriter(path)
+    return JsonLinesWriter(path)
+
+
+def page_items(page, result_key=None):
+    """
+    Returns the items of one page: the page itself when `--query` already
+    reduced it to a list, `page[result_key]`, or the page's only list.
+    """
+    if page is None:
+        return []
+    if isinstance(page, list):
+        return page
+    if result_key is not None:
+        return page.get(result_key, [])
+    lists = [value for value in page.values() if isinstance(value, list)]
+    if len(lists) > 1:
+        raise ValueError(f"Page has several lists ({', '.join(key for key, value in page.items() if isinstance(value, list))}), pass a result_key")
+    return lists[0] if lists else []
+
+
+def iter_items(pages, result_key=None):
+    for page in pages:
+        yield from page_items(page, result_key)
+
+
+def stream_to_file(pages, output_file, result_key=None, default=None):
+    """
+    Streams the items of every page into `output_file` and returns the
+    writer, with the path written and the item count. Memory use stays at
+    one page regardless of the population.
+    """
+    with open_writer(output_file, default) as writer:
+        writer.write_all(iter_items(pages, result_key))
+    return writer
@@ -0,0 +1,84 @@
+import threading
+
+from _config.engine import AWSCommandError
+from _config.streaming import iter_items
+
+# Resource types whose tags the collectors report. One paginated
+# `tagging get-resources` sweep per region covers all of them.
+TAGGED_RESOURCE_TYPES = [
+    'acm',
+    'backup',
+    'cloudtrail',
+    'ecs',
+    'elasticloadbalancing',
+    'kms',
+    'lambda',
+    'logs',
+    'wafv2',
+]
+# Largest page get-resources returns
+RESOURCES_PER_PAGE = 100
+
+_tag_lock = threading.Lock()
+
+
+class TagIndex:
+    """
+    ARN -> tags index for one account and region. Resources without tags
+    are not returned by the tagging API and read back as having no tags.
+    """
+
+    def __init__(self, tags_by_arn=None, engine=None):
+        self.tags_by_arn = tags_by_arn or {}
+        # Engine the index was harvested with, so a copied config does not reuse it
+        self.engine = engine
+
+    def __len__(self):
+        return len(self.tags_by_arn)
+
+    def tags(self, arn, key_name='Key', value_name='Value'):
+        # Log group ARNs from describe-log-groups carry a trailing `:*`
+        tags = self.tags_by_arn.get(arn) or self.tags_by_arn.get(arn.rstrip('*').rstrip(':'), [])
+        return [{key_name: tag['Key'], value_name: tag['Value']} for tag in tags]
+
+    def tag_map(self, arn):
+        return {tag['Key']: tag['Value'] for tag in self.tags(arn)}
+
+
+def harvest_tags(engine, resource_types=None):
+    """
+    Builds a TagIndex for the engine's account and region from the Resource
+    Groups Tagging API, a few paginated calls instead of one call per resource.
+    """
+    command = [
+        'aws', 'resourcegroupstaggingapi', 'get-resources',
+        '--resource-type-filters', *(resource_types or TAGGED_RESOURCE_TYPES),
+        '--resources-per-page', str(RESOURCES_PER_PAGE),
+        '--region', engine.region,
+        '--output', 'json'
+    ]
+    tags_by_arn = {}
+    for resource in iter_items(engine.paginate(command), 'ResourceTagMappingList'):
+        tags_by_arn[resource['ResourceARN']] = resource.get('Tags', [])
+    return TagIndex(tags_by_arn, engine)
+
+
+def tag_index(config):
+    """
+    Returns the TagIndex for a region-scoped config, harvesting it on first use
+    so every tag evidence file of the region shares the same sweep. An index or
+    lock inherited from the config of another account or region is replaced.
+    """
+    with _tag_lock:
+        if config.get('tag_lock') is None or config['tag_lock'][0] is not config['engine']:
+            config['tag_lock'] = (config['engine'], threading.Lock())
+        lock = config['tag_lock'][1]
+    # Collectors of a region can run concurrently, only the first one harvests
+    with lock:
+        if config.get('tag_index') is None or config['tag_index'].engine is not config['engine']:
+            try:
+                config['tag_index'] = harvest_tags(config['engine'])
+            except AWSCommandError as e:
+                print(f"Tag harvest failed for {config['engine'].env_name} in {config['region']}: {e}")
+                config['tag_index'] = TagIndex(engine=config['engine'])
+        return config['tag_index']
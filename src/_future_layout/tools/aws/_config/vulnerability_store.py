@@ -0,0 +1,214 @@
+import os
+import csv
+import stat
+from datetime import date, datetime, timedelta
+
+try:
+    import pandas
+except ImportError:  # snapshots are written without pandas, the trend report needs it
+    pandas = None
+
+from _config.formats import open_evidence_file
+
+STORE_ENV_VAR = 'AUDITBUDDY_VULNERABILITY_STORE_DIR'
+DEFAULT_STORE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'auditbuddy', 'vulnerabilities')
+SNAPSHOT_SUFFIX = '.csv.gz'
+COUNT_COLUMNS = ['all', 'critical', 'high', 'medium']
+COLUMNS = ['date', 'dimension', 'type', 'key'] + COUNT_COLUMNS
+# Resources and packages listed in the report, by latest critical and high counts
+TOP_ITEMS = 25
+# Identifying field of each aggregation item, first present wins
+RESOURCE_KEYS = ('resourceId', 'instanceId', 'functionName', 'imageSha')
+# Days the trend covers
+WINDOW_DAYS = 365
+# Reviewed findings seen by every run, the source of the monthly opened and closed counts
+LEDGER_FILE = 'findings' + SNAPSHOT_SUFFIX
+LEDGER_COLUMNS = ['findingArn', 'severity', 'status', 'firstObservedAt', 'updatedAt']
+
+
+def snapshot_rows(trend):
+    """
+    Flattens the aggregated counts of VulnerabilityTrends.trend() into
+    snapshot rows of dimension, type, key and severity counts.
+    """
+    rows = [{'dimension': 'severity', 'type': 'ACCOUNT', 'key': item.get('accountId') or '', **item}
+            for item in trend.get('accounts', [])]
+    rows += [{'dimension': 'finding_type', 'type': finding_type, 'key': finding_type, **counts}
+             for finding_type, counts in trend.get('findingTypes', {}).items()]
+    for resource_type, items in trend.get('resources', {}).items():
+        rows += [{'dimension': 'resource', 'type': resource_type,
+                  'key': next((item[key] for key in RESOURCE_KEYS if item.get(key)), ''), **item}
+                 for item in items]
+    rows += [{'dimension': 'package', 'type': 'PACKAGE', 'key': item.get('packageName') or '', **item}
+             for item in trend.get('packages', [])]
+    return rows
+
+
+def ledger_row(summary):
+    # The fields of a finding summary the monthly counts need
+    return {column: str(summary.get(column) or '') for column in LEDGER_COLUMNS}
+
+
+class VulnerabilityStore:
+    """
+    Append-only local time series of Inspector aggregate counts, one
+    compressed CSV snapshot per (account, region, UTC day) holding the counts
+    per severity, finding type, resource and package. A run appends today's
+    snapshot, so the year-long trend is read from disk and each run only
+    collects one day. Past snapshots are read-only; today's is replaced
+    until the day is over. A ledger of the reviewed findings seen by every
+    run keeps the monthly opened and closed counts of the whole window.
+    """
+
+    def __init__(self, account, region, root=None):
+        root = root or os.getenv(STORE_ENV_VAR) or DEFAULT_STORE_DIR
+        self.directory = os.path.join(root, account, region)
+
+    def snapshot_path(self, day):
+        return os.path.join(self.directory, day.isoformat() + SNAPSHOT_SUFFIX)
+
+    def days(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(date.fromisoformat(name[:-len(SNAPSHOT_SUFFIX)])
+                      for name in os.listdir(self.directory) if name.endswith(SNAPSHOT_SUFFIX) and name != LEDGER_FILE)
+
+    def days_to_collect(self, window=WINDOW_DAYS, today=None):
+        # Days of findings since the latest earlier snapshot, the whole window without one
+        today = today or datetime.utcnow().date()
+        earlier = [day for day in self.days() if day < today]
+        if not earlier:
+            return window
+        return min(window, (today - earlier[-1]).days + 1)
+
+    def append(self, rows, day=None):
+        day = day or datetime.utcnow().date()
+        path = self.snapshot_path(day)
+        if os.path.exists(path) and day < datetime.utcnow().date():
+            raise ValueError(f"Vulnerability snapshot {path} is final and cannot be replaced")
+        os.makedirs(self.directory, exist_ok=True)
+        partial = path + '.partial'
+        with open_evidence_file(partial, 'w') as f:
+            writer = csv.DictWriter(f, COLUMNS, extrasaction='ignore')
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({**{column: row.get(column, 0) for column in COUNT_COLUMNS}, **row, 'date': day.isoformat()})
+        if os.path.exists(path):
+            os.chmod(path, stat.S_IRUSR | stat.S_IWUSR)
+        os.replace(partial, path)
+        os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        return path
+
+    def ledger(self):
+        # findingArn -> ledger row
+        path = os.path.join(self.directory, LEDGER_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open_evidence_file(path) as f:
+            return {row['findingArn']: row for row in csv.DictReader(f)}
+
+    def record_findings(self, rows, window=WINDOW_DAYS, today=None):
+        """
+        Merges ledger rows into the finding ledger, a finding seen again
+        replacing its earlier status. Findings first observed before the
+        window are dropped.
+        """
+        today = today or datetime.utcnow().date()
+        start = (today - timedelta(days=window)).isoformat()
+        ledger = self.ledger()
+        ledger.update((row['findingArn'], row) for row in rows)
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, LEDGER_FILE)
+        with open_evidence_file(path + '.partial', 'w') as f:
+            writer = csv.DictWriter(f, LEDGER_COLUMNS, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(row for row in ledger.values() if row['firstObservedAt'][:10] >= start)
+        os.replace(path + '.partial', path)
+        return path
+
+    def monthly(self, severities, days=WINDOW_DAYS, today=None):
+        """
+        Opened and closed counts per month and severity of the reviewed
+        findings first observed in the window, from the ledger. Needs no
+        pandas.
+        """
+        today = today or datetime.utcnow().date()
+        start = (today - timedelta(days=days)).isoformat()
+        months = {}
+        findings = 0
+        for row in self.ledger().values():
+            if row['severity'] not in severities or row['firstObservedAt'][:10] < start:
+                continue
+            severity = row['severity']
+            opened = months.setdefault(row['firstObservedAt'][:7], {'opened': {}, 'closed': {}})['opened']
+            opened[severity] = opened.get(severity, 0) + 1
+            if row['status'] == 'CLOSED':
+                closed = months.setdefault(row['updatedAt'][:7], {'opened': {}, 'closed': {}})['closed']
+                closed[severity] = closed.get(severity, 0) + 1
+            findings += 1
+        return {'severities': list(severities), 'findings': findings, 'months': dict(sorted(months.items()))}
+
+    def frame(self, days=WINDOW_DAYS, today=None):
+        # All snapshot rows of the last `days` days as one DataFrame
+        if pandas is None:
+            raise RuntimeError("The vulnerability trend report needs the pandas package (pip install pandas)")
+        today = today or datetime.utcnow().date()
+        paths = [self.snapshot_path(day) for day in self.days() if today - timedelta(days=days) < day <= today]
+        if not paths:
+            return pandas.DataFrame(columns=COLUMNS)
+        frame = pandas.concat((pandas.read_csv(path, dtype={'key': str, 'type': str}, keep_default_na=False)
+                               for path in paths), ignore_index=True)
+        frame['date'] = pandas.to_datetime(frame['date'])
+        frame[COUNT_COLUMNS] = frame[COUNT_COLUMNS].astype('int64')
+        return frame
+
+    def report(self, days=WINDOW_DAYS, today=None):
+        """
+        Computes the trend over the stored snapshots: daily and monthly
+        severity totals, and per resource and package the latest counts,
+        the change over the window and the days with critical findings.
+        """
+        frame = self.frame(days, today)
+        if frame.empty:
+            return {'snapshots': 0}
+        daily = frame[frame['dimension'] == 'severity'].groupby('date')[COUNT_COLUMNS].sum()
+        monthly = daily.groupby(daily.index.to_period('M')).agg(['last', 'max'])
+        return {
+            'snapshots': int(frame['date'].nunique()),
+            'first': frame['date'].min().date().isoformat(),
+            'latest': frame['date'].max().date().isoformat(),
+            'daily': [{'date': day.date().isoformat(), **counts} for day, counts in daily.to_dict('index').items()],
+            'monthly': [{'month': str(month),
+                         'latest': {column: int(row[(column, 'last')]) for column in COUNT_COLUMNS},
+                         'peak': {column: int(row[(column, 'max')]) for column in COUNT_COLUMNS}}
+                        for month, row in monthly.iterrows()],
+            'resources': self._changes(frame[frame['dimension'] == 'resource']),
+            'packages': self._changes(frame[frame['dimension'] == 'package']),
+        }
+
+    @staticmethod
+    def _changes(frame):
+        if frame.empty:
+            return {'top': [], 'new': [], 'resolved': []}
+        first, latest = frame['date'].min(), frame['date'].max()
+        # One row per item and day, summed over accounts
+        counts = frame.groupby(['type', 'key', 'date'])[COUNT_COLUMNS].sum()
+        by_item = counts.groupby(level=['type', 'key'])
+        summary = by_item.last()
+        summary['change'] = summary['all'] - by_item.first()['all']
+        summary['criticalDays'] = (counts['critical'] > 0).groupby(level=['type', 'key']).sum()
+        present = counts.reset_index().groupby(['type', 'key'])['date'].agg(['min', 'max'])
+        summary['present'] = present['max'] == latest
+        top = summary[summary['present']].sort_values(['critical', 'high', 'all'], ascending=False).head(TOP_ITEMS)
+
+        def items(index):
+            return [{'type': item_type, 'key': key} for item_type, key in index]
+
+        return {
+            'top': [{'type': item_type, 'key': key, **{column: int(row[column]) for column in COUNT_COLUMNS},
+                     'change': int(row['change']), 'criticalDays': int(row['criticalDays'])}
+                    for (item_type, key), row in top.iterrows()],
+            # Items that appeared after the first snapshot, and those gone from the latest
+            'new': items(present[(present['min'] > first) & (present['max'] == latest)].index),
+            'resolved': items(present[present['max'] < latest].index),
+        }
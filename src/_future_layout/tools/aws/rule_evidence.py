@@ -0,0 +1,40 @@
+import sys
+import os
+
+# Adjust the Python path to include the aws tools directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from _config.config import environments, current_year, current_date, run_environments
+from _config.command_runner import CommandRunner
+from _config.fanout import FanOut
+from _config.formats import write_evidence
+from _config.rules import RulePlan, load_rules
+
+def main():
+    """
+    Evidence Description:
+    This script collects the evidence of every rule in framework/rules/service-provider/aws.
+    Each rule's evidence operations are compiled into one plan: an operation shared by
+    several rules (e.g. describe-trails) runs once, and operations that need another
+    operation's output (e.g. get-trail-status per trail) run as soon as it is available.
+    Supporting a new control means adding its rule JSON, not a new script.
+    The evidence of each rule is saved with its control mappings in a JSON file named
+    with the current date, environment name and rule name.
+    """
+    command_runner = CommandRunner()
+    fanout = FanOut()
+    plan = RulePlan(load_rules())
+    print(plan.summary())
+
+    def collect(env_name, config):
+        results, errors = plan.execute(command_runner.engine_for(env_name, config), fanout)
+        for rule, evidence in plan.evidence(results, errors):
+            output_file = f"/evidence-artifacts/{current_year}/{env_name}/{current_date}.rules.{rule['rule']}.json"
+            write_evidence(output_file, evidence)
+        print(f"Evidence for {len(plan.rules)} rules in {env_name} environment saved "
+              f"({len(errors)} of {len(plan.nodes)} operations failed)")
+
+    run_environments(environments, collect)
+
+if __name__ == "__main__":
+    main()
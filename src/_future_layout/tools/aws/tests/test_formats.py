@@ -0,0 +1,43 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# Adjust the Python path to include the parent directory of _config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from _config.formats import OUTPUT_FORMAT_ENV_VAR, load_evidence, write_evidence
+
+DOCUMENT = {'Functions': [{'FunctionName': 'audit', 'Runtime': 'python3.12'}], 'NextMarker': None}
+ITEMS = [{'FunctionName': 'audit'}, {'FunctionName': 'export'}]
+
+
+class EvidenceRoundTripTest(unittest.TestCase):
+
+    def round_trip(self, data, fmt):
+        # json -> fmt -> json, each step written from what the previous one loaded back
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'evidence.json')
+            with mock.patch.dict(os.environ, {OUTPUT_FORMAT_ENV_VAR: 'json'}):
+                loaded = load_evidence(write_evidence(path, data))
+            with mock.patch.dict(os.environ, {OUTPUT_FORMAT_ENV_VAR: fmt}):
+                converted = write_evidence(path, loaded)
+                loaded = load_evidence(converted)
+            with mock.patch.dict(os.environ, {OUTPUT_FORMAT_ENV_VAR: 'json'}):
+                loaded = load_evidence(write_evidence(path, loaded))
+            return converted, loaded
+
+    def test_document_keeps_its_shape(self):
+        for fmt in ('jsonl', 'jsonl.gz'):
+            converted, loaded = self.round_trip(DOCUMENT, fmt)
+            self.assertTrue(converted.endswith('.' + fmt))
+            self.assertEqual(loaded, DOCUMENT)
+
+    def test_list_keeps_its_shape(self):
+        for data in (ITEMS, ITEMS[:1], []):
+            self.assertEqual(self.round_trip(data, 'jsonl.gz')[1], data)
+
+
+if __name__ == '__main__':
+    unittest.main()
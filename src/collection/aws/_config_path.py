@@ -0,0 +1,5 @@
+# Puts the shared aws _config package on the Python path for the collectors in this directory
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '_future_layout', 'tools', 'aws'))
@@ -1,7 +1,9 @@
 import os
-import subprocess
 import datetime
-import json
+
+import _config_path
+from _config.collection import run_collection
+from _config.formats import write_evidence
 
 # Define current year and month for directory paths
 YEAR = datetime.datetime.now().year
@@ -39,75 +41,60 @@ environments = {
 }
 
 # Helper function to run AWS CLI commands
-def run_command(command):
-    result = subprocess.run(command, capture_output=True, text=True)
-    return json.loads(result.stdout)
+def run_command(config, command):
+    return config['engine'].run_command(command)
 
 # Placeholder functions for each evidence collection task with item iteration
 def fetch_function1(config, output_file):
-    data = run_command(['aws', '<service>', '<list_command>', '--region', config['region'], '--output', 'json'])
-    items = []
-    for item in data.get('<ItemsKey>', []):
-        item_details = run_command(['aws', '<service>', '<get_command>', '--item-id', item['<IDKey>'], '--region', config['region'], '--output', 'json'])
-        items.append(item_details)
+    data = run_command(config, ['aws', '<service>', '<list_command>', '--region', config['region'], '--output', 'json'])
+    items = config['fanout'].map(
+        lambda item: run_command(config, ['aws', '<service>', '<get_command>', '--item-id', item['<IDKey>'], '--region', config['region'], '--output', 'json']),
+        data.get('<ItemsKey>', []), service='<service>')
     save_to_file(items, output_file)
 
 def fetch_function2(config, output_file):
-    data = run_command(['aws', '<service>', '<list_command>', '--region', config['region'], '--output', 'json'])
-    items = []
-    for item in data.get('<ItemsKey>', []):
-        item_details = run_command(['aws', '<service>', '<get_command>', '--item-id', item['<IDKey>'], '--region', config['region'], '--output', 'json'])
-        items.append(item_details)
+    data = run_command(config, ['aws', '<service>', '<list_command>', '--region', config['region'], '--output', 'json'])
+    items = config['fanout'].map(
+        lambda item: run_command(config, ['aws', '<service>', '<get_command>', '--item-id', item['<IDKey>'], '--region', config['region'], '--output', 'json']),
+        data.get('<ItemsKey>', []), service='<service>')
     save_to_file(items, output_file)
 
 def fetch_function3(config, output_file):
-    data = run_command(['aws', '<service>', '<list_command>', '--region', config['region'], '--output', 'json'])
-    items = []
-    for item in data.get('<ItemsKey>', []):
-        item_details = run_command(['aws', '<service>', '<get_command>', '--item-id', item['<IDKey>'], '--region', config['region'], '--output', 'json'])
-        items.append(item_details)
+    data = run_command(config, ['aws', '<service>', '<list_command>', '--region', config['region'], '--output', 'json'])
+    items = config['fanout'].map(
+        lambda item: run_command(config, ['aws', '<service>', '<get_command>', '--item-id', item['<IDKey>'], '--region', config['region'], '--output', 'json']),
+        data.get('<ItemsKey>', []), service='<service>')
     save_to_file(items, output_file)
 
 def fetch_function4(config, output_file):
-    data = run_command(['aws', '<service>', '<list_command>', '--region', config['region'], '--output', 'json'])
-    items = []
-    for item in data.get('<ItemsKey>', []):
-        item_details = run_command(['aws', '<service>', '<get_command>', '--item-id', item['<IDKey>'], '--region', config['region'], '--output', 'json'])
-        items.append(item_details)
+    data = run_command(config, ['aws', '<service>', '<list_command>', '--region', config['region'], '--output', 'json'])
+    items = config['fanout'].map(
+        lambda item: run_command(config, ['aws', '<service>', '<get_command>', '--item-id', item['<IDKey>'], '--region', config['region'], '--output', 'json']),
+        data.get('<ItemsKey>', []), service='<service>')
     save_to_file(items, output_file)
 
 def fetch_function5(config, output_file):
-    data = run_command(['aws', '<service>', '<list_command>', '--region', config['region'], '--output', 'json'])
-    items = []
-    for item in data.get('<ItemsKey>', []):
-        item_details = run_command(['aws', '<service>', '<get_command>', '--item-id', item['<IDKey>'], '--region', config['region'], '--output', 'json'])
-        items.append(item_details)
+    data = run_command(config, ['aws', '<service>', '<list_command>', '--region', config['region'], '--output', 'json'])
+    items = config['fanout'].map(
+        lambda item: run_command(config, ['aws', '<service>', '<get_command>', '--item-id', item['<IDKey>'], '--region', config['region'], '--output', 'json']),
+        data.get('<ItemsKey>', []), service='<service>')
     save_to_file(items, output_file)
 
 # Utility function to save data to JSON file
 def save_to_file(data, output_file):
-    with open(output_file, 'w') as f:
-        json.dump(data, f, indent=4)
+    write_evidence(output_file, data)
+
+def region_collectors(config, scheduler, delta):
+    # Execute placeholder evidence collection functions
+    scheduler.add('<Function1>', delta.collect, fetch_function1, '<Function1>', '<service>', service='<service>')
+    scheduler.add('<Function2>', delta.collect, fetch_function2, '<Function2>', '<service>', service='<service>')
+    scheduler.add('<Function3>', delta.collect, fetch_function3, '<Function3>', '<service>', service='<service>')
+    scheduler.add('<Function4>', delta.collect, fetch_function4, '<Function4>', '<service>', service='<service>')
+    scheduler.add('<Function5>', delta.collect, fetch_function5, '<Function5>', '<service>', service='<service>')
 
 # Main function to execute each evidence collection task
 def main():
-    for env_name, config in environments.items():
-        # Set AWS environment variables for each environment
-        os.environ['AWS_ACCESS_KEY_ID'] = config['access_key']
-        os.environ['AWS_SECRET_ACCESS_KEY'] = config['secret_key']
-        os.environ['AWS_DEFAULT_REGION'] = config['region']
-        
-        # Ensure directories exist for output files
-        for file_path in config['output_files'].values():
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-
-        # Execute placeholder evidence collection functions
-        fetch_function1(config, config['output_files']['<Function1>'])
-        fetch_function2(config, config['output_files']['<Function2>'])
-        fetch_function3(config, config['output_files']['<Function3>'])
-        fetch_function4(config, config['output_files']['<Function4>'])
-        fetch_function5(config, config['output_files']['<Function5>'])
-
+    run_collection(environments, '<collector>', region_collectors)
     print("AWS configuration evidence collection completed for both commercial and federal environments.")
 
 # Execute main function
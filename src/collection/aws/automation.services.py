@@ -1,9 +1,15 @@
 # Purpose: Provide Evidence for AWS Automation Related Services.#
 #################################################################
 import os
-import subprocess
 import datetime
-import json
+
+import _config_path
+from _config.collection import run_collection
+from _config.engine import AWSCommandError
+from _config.formats import write_evidence
+from _config.projections import ProjectionLayer
+from _config.streaming import iter_items
+from _config.tags import tag_index
 # Define current year and month for directory paths
 YEAR = datetime.datetime.now().year
 MONTH = datetime.datetime.now().strftime('%B')
@@ -40,101 +46,105 @@ environments = {
     }
 }
 
+# Output files written by the per-function pass in main
+LAMBDA_FILES = ['functions', 'environment_variables', 'execution_roles', 'function_policies', 'event_source_mappings', 'tags']
+
 # Helper function to run AWS CLI commands
-def run_command(command):
-    result = subprocess.run(command, capture_output=True, text=True)
-    return json.loads(result.stdout)
+def run_command(config, command):
+    try:
+        return config['engine'].run_command(command)
+    except AWSCommandError as e:
+        print(f"Command failed: {' '.join(command)}\nError: {e}")
+        return {}
 
 # Fetch all Lambda functions
 def fetch_lambda_functions(config, output_file):
     aws_command = ['aws', 'lambda', 'list-functions', '--region', config['region'], '--output', 'json']
-    functions_data = run_command(aws_command)
-    with open(output_file, 'w') as f:
-        json.dump(functions_data, f, indent=4)
-    return functions_data['Functions']
+    functions_data = run_command(config, aws_command)
+    write_evidence(output_file, functions_data)
+    return functions_data.get('Functions', [])
 
-# Fetch environment variables for each Lambda function
-def fetch_environment_variables(config, function_name):
-    aws_command = ['aws', 'lambda', 'get-function-configuration', '--function-name', function_name, '--region', config['region'], '--query', 'Environment.Variables', '--output', 'json']
-    return run_command(aws_command)
+# Environment variables and execution role come with each function's list-functions entry
+def environment_variables_view(function, raw):
+    return {
+        'FunctionName': function['FunctionName'],
+        'EnvironmentVariables': (raw.get('Environment') or {}).get('Variables')
+    }
 
-# Fetch execution role for each Lambda function
-def fetch_execution_role(config, function_name):
-    aws_command = ['aws', 'lambda', 'get-function-configuration', '--function-name', function_name, '--region', config['region'], '--query', 'Role', '--output', 'json']
-    return run_command(aws_command)
+def execution_role_view(function, raw):
+    return {
+        'FunctionName': function['FunctionName'],
+        'ExecutionRole': raw.get('Role')
+    }
 
 # Fetch function policies
 def fetch_function_policies(config, function_name):
     aws_command = ['aws', 'lambda', 'get-policy', '--function-name', function_name, '--region', config['region'], '--output', 'json']
-    return run_command(aws_command)
+    return run_command(config, aws_command)
 
-# Fetch event source mappings for each Lambda function
-def fetch_event_source_mappings(config, function_name):
-    aws_command = ['aws', 'lambda', 'list-event-source-mappings', '--function-name', function_name, '--region', config['region'], '--output', 'json']
-    return run_command(aws_command)
+# Fetch the region's event source mappings once, keyed by function ARN
+def fetch_event_source_mappings(config):
+    aws_command = ['aws', 'lambda', 'list-event-source-mappings', '--region', config['region'], '--output', 'json']
+    mappings = {}
+    try:
+        for mapping in iter_items(config['engine'].paginate(aws_command), 'EventSourceMappings'):
+            mappings.setdefault(mapping.get('FunctionArn'), []).append(mapping)
+    except AWSCommandError as e:
+        # The other Lambda views do not need the mappings, they are still collected
+        print(f"Command failed: {' '.join(aws_command)}\nError: {e}")
+        return {}
+    return mappings
 
-# Fetch tags for a specific Lambda function
+# Fetch tags for a specific Lambda function from the region's tag index
 def fetch_lambda_tags(config, function_arn):
-    aws_command = ['aws', 'lambda', 'list-tags', '--resource', function_arn, '--region', config['region'], '--output', 'json']
-    return run_command(aws_command)
+    return {'Tags': tag_index(config).tag_map(function_arn)}
+
+# Evidence views of the per-function pass, each derived from a response fetched once per function
+def lambda_projections(config):
+    mappings = fetch_event_source_mappings(config)
+    projections = ProjectionLayer(config)
+    projections.source('function')
+    projections.source('policy', lambda config, function: fetch_function_policies(config, function['FunctionName']))
+    projections.source('mappings', lambda config, function: {'EventSourceMappings': mappings.get(function['FunctionArn'], [])})
+    projections.source('tags', lambda config, function: fetch_lambda_tags(config, function['FunctionArn']))
+    projections.view('environment_variables', 'function', environment_variables_view)
+    projections.view('execution_roles', 'function', execution_role_view)
+    projections.view('function_policies', 'policy',
+                     lambda function, raw: {'FunctionName': function['FunctionName'], 'Policy': raw})
+    projections.view('event_source_mappings', 'mappings',
+                     lambda function, raw: {'FunctionName': function['FunctionName'], 'EventSourceMappings': raw})
+    projections.view('tags', 'tags',
+                     lambda function, raw: {'FunctionArn': function['FunctionArn'], 'Tags': raw})
+    return projections
+
+def collect_lambda(config, delta):
+    # All Lambda evidence comes from one pass over the functions, carried forward
+    # as a whole when CloudTrail shows no Lambda or tagging changes
+    if not delta.changed(['lambda', 'tagging']) and delta.reuse(*LAMBDA_FILES):
+        return
+
+    # Collect all Lambda functions and iterate through each
+    functions = fetch_lambda_functions(config, config['output_files']['functions'])
+
+    # One get-policy call per function; every other view comes from responses already fetched
+    projections = lambda_projections(config)
+    views = projections.collect(functions, service='lambda')
+
+    # Write each collected evidence to its respective output file
+    for key, records in views.items():
+        write_evidence(config['output_files'][key], records)
+    print(f"Lambda evidence in {config['region']}: {projections.report()}")
+
+    delta.record(*LAMBDA_FILES)
+
+def region_collectors(config, scheduler, delta):
+    scheduler.add('lambda', collect_lambda, config, delta, service='lambda')
 
 # Main function to execute each evidence collection task
 def main():
-    for env_name, config in environments.items():
-        # Set AWS environment variables for each environment
-        os.environ['AWS_ACCESS_KEY_ID'] = config['access_key']
-        os.environ['AWS_SECRET_ACCESS_KEY'] = config['secret_key']
-        os.environ['AWS_DEFAULT_REGION'] = config['region']
-        
-        # Ensure directories exist for output files
-        for file_path in config['output_files'].values():
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-
-        # Collect all Lambda functions and iterate through each
-        functions = fetch_lambda_functions(config, config['output_files']['functions'])
-
-        # Initialize empty lists to collect data for each function attribute
-        env_vars_data, execution_roles_data, policies_data, event_source_data, tags_data = [], [], [], [], []
-
-        for function in functions:
-            function_name = function['FunctionName']
-            function_arn = function['FunctionArn']
-
-            # Collect and store each piece of evidence for the function
-            env_vars_data.append({
-                'FunctionName': function_name,
-                'EnvironmentVariables': fetch_environment_variables(config, function_name)
-            })
-            execution_roles_data.append({
-                'FunctionName': function_name,
-                'ExecutionRole': fetch_execution_role(config, function_name)
-            })
-            policies_data.append({
-                'FunctionName': function_name,
-                'Policy': fetch_function_policies(config, function_name)
-            })
-            event_source_data.append({
-                'FunctionName': function_name,
-                'EventSourceMappings': fetch_event_source_mappings(config, function_name)
-            })
-            tags_data.append({
-                'FunctionArn': function_arn,
-                'Tags': fetch_lambda_tags(config, function_arn)
-            })
-
-        # Write each collected evidence to its respective output file
-        with open(config['output_files']['environment_variables'], 'w') as f:
-            json.dump(env_vars_data, f, indent=4)
-        with open(config['output_files']['execution_roles'], 'w') as f:
-            json.dump(execution_roles_data, f, indent=4)
-        with open(config['output_files']['function_policies'], 'w') as f:
-            json.dump(policies_data, f, indent=4)
-        with open(config['output_files']['event_source_mappings'], 'w') as f:
-            json.dump(event_source_data, f, indent=4)
-        with open(config['output_files']['tags'], 'w') as f:
-            json.dump(tags_data, f, indent=4)
-
+    run_collection(environments, 'automation', region_collectors)
     print("AWS Lambda configuration evidence collection completed for both environments.")
+
 # Execute main function
 if __name__ == "__main__":
     main()
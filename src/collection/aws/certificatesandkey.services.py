@@ -1,9 +1,13 @@
 # Purpose: Provide Evidence for AWS Certificate & Key Management Related Services.#
 ###################################################################################
 import os
-import subprocess
 import datetime
-import json
+
+import _config_path
+from _config.collection import run_collection
+from _config.engine import AWSCommandError
+from _config.formats import write_evidence
+from _config.tags import tag_index
 
 # Define current year and month for directory paths
 YEAR = datetime.datetime.now().year
@@ -51,114 +55,97 @@ environments = {
 }
 
 # Helper function to run AWS CLI commands
-def run_command(command):
+def run_command(config, command):
     try:
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
-        return json.loads(result.stdout)
-    except subprocess.CalledProcessError as e:
+        return config['engine'].run_command(command)
+    except AWSCommandError as e:
         print(f"Command failed: {' '.join(command)}\nError: {e}")
         return {}
 
 # ACM Evidence Collection Functions
 def fetch_certificates(config, output_file):
-    certificates_data = run_command(['aws', 'acm', 'list-certificates', '--region', config['region'], '--output', 'json'])
-    with open(output_file, 'w') as f:
-        json.dump(certificates_data, f, indent=4)
+    certificates_data = run_command(config, ['aws', 'acm', 'list-certificates', '--region', config['region'], '--output', 'json'])
+    write_evidence(output_file, certificates_data)
 
 def fetch_certificate_details(config, output_file):
-    certificates_data = run_command(['aws', 'acm', 'list-certificates', '--region', config['region'], '--output', 'json'])
+    certificates_data = run_command(config, ['aws', 'acm', 'list-certificates', '--region', config['region'], '--output', 'json'])
     certificate_details_data = []
     for cert in certificates_data.get('CertificateSummaryList', []):
         cert_arn = cert['CertificateArn']
-        cert_details = run_command(['aws', 'acm', 'describe-certificate', '--certificate-arn', cert_arn, '--output', 'json'])
+        cert_details = run_command(config, ['aws', 'acm', 'describe-certificate', '--certificate-arn', cert_arn, '--output', 'json'])
         certificate_details_data.append(cert_details)
-    with open(output_file, 'w') as f:
-        json.dump(certificate_details_data, f, indent=4)
+    write_evidence(output_file, certificate_details_data)
 
 def fetch_acm_tags(config, output_file):
-    certificates_data = run_command(['aws', 'acm', 'list-certificates', '--region', config['region'], '--output', 'json'])
-    tags_data = []
-    for cert in certificates_data.get('CertificateSummaryList', []):
-        cert_arn = cert['CertificateArn']
-        cert_tags = run_command(['aws', 'acm', 'list-tags-for-certificate', '--certificate-arn', cert_arn, '--output', 'json'])
-        tags_data.append({'CertificateArn': cert_arn, 'Tags': cert_tags.get('Tags', [])})
-    with open(output_file, 'w') as f:
-        json.dump(tags_data, f, indent=4)
+    certificates_data = run_command(config, ['aws', 'acm', 'list-certificates', '--region', config['region'], '--output', 'json'])
+    tags = tag_index(config)
+    tags_data = [
+        {'CertificateArn': cert['CertificateArn'], 'Tags': tags.tags(cert['CertificateArn'])}
+        for cert in certificates_data.get('CertificateSummaryList', [])
+    ]
+    write_evidence(output_file, tags_data)
 
 def fetch_renewal_status(config, output_file):
-    certificates_data = run_command(['aws', 'acm', 'list-certificates', '--region', config['region'], '--output', 'json'])
+    certificates_data = run_command(config, ['aws', 'acm', 'list-certificates', '--region', config['region'], '--output', 'json'])
     renewal_status_data = []
     for cert in certificates_data.get('CertificateSummaryList', []):
         cert_arn = cert['CertificateArn']
-        cert_renewal = run_command(['aws', 'acm', 'describe-certificate', '--certificate-arn', cert_arn, '--output', 'json'])
+        cert_renewal = run_command(config, ['aws', 'acm', 'describe-certificate', '--certificate-arn', cert_arn, '--output', 'json'])
         renewal_status_data.append({
             'CertificateArn': cert_arn,
             'RenewalSummary': cert_renewal.get('RenewalSummary', {})
         })
-    with open(output_file, 'w') as f:
-        json.dump(renewal_status_data, f, indent=4)
+    write_evidence(output_file, renewal_status_data)
 
 # KMS Evidence Collection Functions
 def fetch_keys(config, output_file):
-    keys_data = run_command(['aws', 'kms', 'list-keys', '--region', config['region'], '--output', 'json'])
-    with open(output_file, 'w') as f:
-        json.dump(keys_data, f, indent=4)
+    keys_data = run_command(config, ['aws', 'kms', 'list-keys', '--region', config['region'], '--output', 'json'])
+    write_evidence(output_file, keys_data)
 
 def fetch_key_policies(config, output_file):
-    keys_data = run_command(['aws', 'kms', 'list-keys', '--region', config['region'], '--output', 'json'])
+    keys_data = run_command(config, ['aws', 'kms', 'list-keys', '--region', config['region'], '--output', 'json'])
     key_policies_data = []
     for key in keys_data.get('Keys', []):
         key_id = key['KeyId']
-        policy = run_command(['aws', 'kms', 'get-key-policy', '--key-id', key_id, '--policy-name', 'default', '--output', 'json'])
+        policy = run_command(config, ['aws', 'kms', 'get-key-policy', '--key-id', key_id, '--policy-name', 'default', '--output', 'json'])
         key_policies_data.append({'KeyId': key_id, 'Policy': policy})
-    with open(output_file, 'w') as f:
-        json.dump(key_policies_data, f, indent=4)
+    write_evidence(output_file, key_policies_data)
 
 def fetch_grants(config, output_file):
-    keys_data = run_command(['aws', 'kms', 'list-keys', '--region', config['region'], '--output', 'json'])
+    keys_data = run_command(config, ['aws', 'kms', 'list-keys', '--region', config['region'], '--output', 'json'])
     grants_data = []
     for key in keys_data.get('Keys', []):
         key_id = key['KeyId']
-        key_grants = run_command(['aws', 'kms', 'list-grants', '--key-id', key_id, '--output', 'json'])
+        key_grants = run_command(config, ['aws', 'kms', 'list-grants', '--key-id', key_id, '--output', 'json'])
         recent_grants = [grant for grant in key_grants.get('Grants', []) if 'CreationDate' in grant and grant['CreationDate'] >= START_DATE]
         grants_data.extend(recent_grants)
-    with open(output_file, 'w') as f:
-        json.dump(grants_data, f, indent=4)
+    write_evidence(output_file, grants_data)
 
 def fetch_kms_tags(config, output_file):
-    keys_data = run_command(['aws', 'kms', 'list-keys', '--region', config['region'], '--output', 'json'])
-    tags_data = []
-    for key in keys_data.get('Keys', []):
-        key_id = key['KeyId']
-        key_tags = run_command(['aws', 'kms', 'list-resource-tags', '--key-id', key_id, '--output', 'json'])
-        tags_data.append({'KeyId': key_id, 'Tags': key_tags.get('Tags', [])})
-    with open(output_file, 'w') as f:
-        json.dump(tags_data, f, indent=4)
+    keys_data = run_command(config, ['aws', 'kms', 'list-keys', '--region', config['region'], '--output', 'json'])
+    tags = tag_index(config)
+    tags_data = [
+        {'KeyId': key['KeyId'], 'Tags': tags.tags(key['KeyArn'], 'TagKey', 'TagValue')}
+        for key in keys_data.get('Keys', [])
+    ]
+    write_evidence(output_file, tags_data)
+
+def region_collectors(config, scheduler, delta):
+    # Collect evidence for ACM configurations
+    scheduler.add('certificates', delta.collect, fetch_certificates, 'certificates', service='acm')
+    scheduler.add('certificate_details', delta.collect, fetch_certificate_details, 'certificate_details', service='acm')
+    scheduler.add('tags', delta.collect, fetch_acm_tags, 'tags', 'acm', 'tagging', service='acm')
+    scheduler.add('renewal_status', delta.collect, fetch_renewal_status, 'renewal_status', service='acm')
+
+    # Collect evidence for KMS configurations
+    scheduler.add('keys', delta.collect, fetch_keys, 'keys', 'kms', service='kms')
+    scheduler.add('key_policies', delta.collect, fetch_key_policies, 'key_policies', 'kms', service='kms')
+    scheduler.add('grants', delta.collect, fetch_grants, 'grants', service='kms')
+    scheduler.add('kms_tags', delta.collect, fetch_kms_tags, 'kms_tags', 'kms', 'tagging', service='kms')
 
 # Main function to execute each evidence collection task for both environments
 def main():
-    for env_name, config in environments.items():
-        # Set AWS environment variables for each environment
-        os.environ['AWS_ACCESS_KEY_ID'] = config['access_key']
-        os.environ['AWS_SECRET_ACCESS_KEY'] = config['secret_key']
-        os.environ['AWS_DEFAULT_REGION'] = config['region']
-        
-        # Ensure directories exist for output files
-        for file_path in config['output_files'].values():
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-
-        # Collect evidence for ACM configurations
-        fetch_certificates(config, config['output_files']['certificates'])
-        fetch_certificate_details(config, config['output_files']['certificate_details'])
-        fetch_acm_tags(config, config['output_files']['tags'])
-        fetch_renewal_status(config, config['output_files']['renewal_status'])
-
-        # Collect evidence for KMS configurations
-        fetch_keys(config, config['output_files']['keys'])
-        fetch_key_policies(config, config['output_files']['key_policies'])
-        fetch_grants(config, config['output_files']['grants'])
-        fetch_kms_tags(config, config['output_files']['kms_tags'])
-
+    run_collection(environments, 'certificatesandkey', region_collectors)
     print("AWS ACM and KMS configuration evidence collection completed for both environments.")
 
 # Execute main function
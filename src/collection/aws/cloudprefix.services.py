@@ -1,9 +1,14 @@
 # Purpose: Provide Evidence for AWS Cloud**** Related Services.#
 ################################################################
 import os
-import subprocess
 import datetime
-import json
+
+import _config_path
+from _config.collection import run_collection
+from _config.engine import AWSCommandError
+from _config.formats import LARGE_OUTPUT_FORMAT, write_evidence
+from _config.streaming import stream_to_file
+from _config.tags import tag_index
 
 
 YEAR = datetime.datetime.now().year
@@ -53,107 +58,87 @@ environments = {
 }
 
 # Helper function to run AWS CLI commands
-def run_command(command):
+def run_command(config, command):
     try:
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
-        return json.loads(result.stdout)
-    except subprocess.CalledProcessError as e:
+        return config['engine'].run_command(command)
+    except AWSCommandError as e:
         print(f"Command failed: {' '.join(command)}\nError: {e}")
         return {}
 
 # CloudWatch Evidence Collection Functions
 def fetch_alarms(config, output_file):
-    alarms_data = run_command(['aws', 'cloudwatch', 'describe-alarms', '--region', config['region'], '--output', 'json'])
-    with open(output_file, 'w') as f:
-        json.dump(alarms_data, f, indent=4)
+    alarms_data = run_command(config, ['aws', 'cloudwatch', 'describe-alarms', '--region', config['region'], '--output', 'json'])
+    write_evidence(output_file, alarms_data)
 
 def fetch_metrics(config, output_file):
-    metrics_data = run_command(['aws', 'cloudwatch', 'list-metrics', '--region', config['region'], '--output', 'json'])
-    with open(output_file, 'w') as f:
-        json.dump(metrics_data, f, indent=4)
+    # Accounts can have millions of metrics, write them to disk page by page as compressed JSON Lines
+    command = ['aws', 'cloudwatch', 'list-metrics', '--region', config['region'], '--output', 'json']
+    try:
+        stream_to_file(config['engine'].paginate(command), output_file, 'Metrics', LARGE_OUTPUT_FORMAT)
+    except AWSCommandError as e:
+        print(f"Command failed: {' '.join(command)}\nError: {e}")
 
 def fetch_dashboards(config, output_file):
-    dashboards_data = run_command(['aws', 'cloudwatch', 'list-dashboards', '--region', config['region'], '--output', 'json'])
-    with open(output_file, 'w') as f:
-        json.dump(dashboards_data, f, indent=4)
+    dashboards_data = run_command(config, ['aws', 'cloudwatch', 'list-dashboards', '--region', config['region'], '--output', 'json'])
+    write_evidence(output_file, dashboards_data)
 
 def fetch_log_groups(config, output_file):
-    log_groups_data = run_command(['aws', 'logs', 'describe-log-groups', '--region', config['region'], '--output', 'json'])
-    with open(output_file, 'w') as f:
-        json.dump(log_groups_data, f, indent=4)
+    log_groups_data = run_command(config, ['aws', 'logs', 'describe-log-groups', '--region', config['region'], '--output', 'json'])
+    write_evidence(output_file, log_groups_data)
 
 def fetch_cloudwatch_tags(config, output_file):
-    log_groups_data = run_command(['aws', 'logs', 'describe-log-groups', '--region', config['region'], '--output', 'json'])
-    tags_data = []
-    for log_group in log_groups_data.get('logGroups', []):
-        log_group_name = log_group['logGroupName']
-        tags = run_command(['aws', 'logs', 'list-tags-log-group', '--log-group-name', log_group_name, '--output', 'json'])
-        tags_data.append({'LogGroupName': log_group_name, 'Tags': tags.get('tags', {})})
-    with open(output_file, 'w') as f:
-        json.dump(tags_data, f, indent=4)
+    log_groups_data = run_command(config, ['aws', 'logs', 'describe-log-groups', '--region', config['region'], '--output', 'json'])
+    tags = tag_index(config)
+    tags_data = [
+        {'LogGroupName': log_group['logGroupName'], 'Tags': tags.tag_map(log_group['arn'])}
+        for log_group in log_groups_data.get('logGroups', [])
+    ]
+    write_evidence(output_file, tags_data)
 
 # CloudTrail Evidence Collection Functions
 def fetch_trails(config, output_file):
-    trails_data = run_command(['aws', 'cloudtrail', 'list-trails', '--region', config['region'], '--output', 'json'])
-    with open(output_file, 'w') as f:
-        json.dump(trails_data, f, indent=4)
+    trails_data = run_command(config, ['aws', 'cloudtrail', 'list-trails', '--region', config['region'], '--output', 'json'])
+    write_evidence(output_file, trails_data)
 
 def fetch_event_data_stores(config, output_file):
-    event_data_stores_data = run_command(['aws', 'cloudtrail', 'list-event-data-stores', '--region', config['region'], '--output', 'json'])
-    with open(output_file, 'w') as f:
-        json.dump(event_data_stores_data, f, indent=4)
+    event_data_stores_data = run_command(config, ['aws', 'cloudtrail', 'list-event-data-stores', '--region', config['region'], '--output', 'json'])
+    write_evidence(output_file, event_data_stores_data)
 
 def fetch_insights_selectors(config, output_file):
-    trails_data = run_command(['aws', 'cloudtrail', 'list-trails', '--region', config['region'], '--output', 'json'])
+    trails_data = run_command(config, ['aws', 'cloudtrail', 'list-trails', '--region', config['region'], '--output', 'json'])
     insights_data = []
     for trail in trails_data['Trails']:
         trail_name = trail['Name']
-        insights_selectors = run_command(['aws', 'cloudtrail', 'get-insight-selectors', '--trail-name', trail_name, '--output', 'json'])
+        insights_selectors = run_command(config, ['aws', 'cloudtrail', 'get-insight-selectors', '--trail-name', trail_name, '--output', 'json'])
         insights_data.append({
             'TrailName': trail_name,
             'InsightSelectors': insights_selectors.get('InsightSelectors', [])
         })
-    with open(output_file, 'w') as f:
-        json.dump(insights_data, f, indent=4)
+    write_evidence(output_file, insights_data)
 
 def fetch_cloudtrail_tags(config, output_file):
-    trails_data = run_command(['aws', 'cloudtrail', 'list-trails', '--region', config['region'], '--output', 'json'])
-    tags_data = []
-    for trail in trails_data['Trails']:
-        trail_arn = trail['TrailARN']
-        trail_tags = run_command(['aws', 'cloudtrail', 'list-tags', '--resource-id-list', trail_arn, '--output', 'json'])
-        tags_data.append({
-            'TrailARN': trail_arn,
-            'Tags': trail_tags.get('ResourceTagList', [])
-        })
-    with open(output_file, 'w') as f:
-        json.dump(tags_data, f, indent=4)
+    trails_data = run_command(config, ['aws', 'cloudtrail', 'list-trails', '--region', config['region'], '--output', 'json'])
+    tags = tag_index(config)
+    tags_data = [{'TrailARN': trail['TrailARN'], 'Tags': tags.tags(trail['TrailARN'])} for trail in trails_data['Trails']]
+    write_evidence(output_file, tags_data)
+
+def region_collectors(config, scheduler, delta):
+    # Collect evidence for AWS CloudWatch configurations
+    scheduler.add('alarms', delta.collect, fetch_alarms, 'alarms', 'monitoring', service='cloudwatch')
+    scheduler.add('metrics', delta.collect, fetch_metrics, 'metrics', service='cloudwatch')
+    scheduler.add('dashboards', delta.collect, fetch_dashboards, 'dashboards', 'monitoring', service='cloudwatch')
+    scheduler.add('log_groups', delta.collect, fetch_log_groups, 'log_groups', 'logs', service='logs')
+    scheduler.add('cloudwatch_tags', delta.collect, fetch_cloudwatch_tags, 'tags', service='cloudwatch')
+
+    # Collect evidence for AWS CloudTrail configurations
+    scheduler.add('trails', delta.collect, fetch_trails, 'trails', 'cloudtrail', service='cloudtrail')
+    scheduler.add('event_data_stores', delta.collect, fetch_event_data_stores, 'event_data_stores', 'cloudtrail', service='cloudtrail')
+    scheduler.add('insights', delta.collect, fetch_insights_selectors, 'insights', 'cloudtrail', service='cloudtrail')
+    scheduler.add('cloudtrail_tags', delta.collect, fetch_cloudtrail_tags, 'tags', service='cloudtrail', after=['cloudwatch_tags'])
 
 # Main function to execute each evidence collection task for both environments
 def main():
-    for env_name, config in environments.items():
-        # Set AWS environment variables for each environment
-        os.environ['AWS_ACCESS_KEY_ID'] = config['access_key']
-        os.environ['AWS_SECRET_ACCESS_KEY'] = config['secret_key']
-        os.environ['AWS_DEFAULT_REGION'] = config['region']
-        
-        # Ensure directories exist for output files
-        for file_path in config['output_files'].values():
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-
-        # Collect evidence for AWS CloudWatch configurations
-        fetch_alarms(config, config['output_files']['alarms'])
-        fetch_metrics(config, config['output_files']['metrics'])
-        fetch_dashboards(config, config['output_files']['dashboards'])
-        fetch_log_groups(config, config['output_files']['log_groups'])
-        fetch_cloudwatch_tags(config, config['output_files']['tags'])
-
-        # Collect evidence for AWS CloudTrail configurations
-        fetch_trails(config, config['output_files']['trails'])
-        fetch_event_data_stores(config, config['output_files']['event_data_stores'])
-        fetch_insights_selectors(config, config['output_files']['insights'])
-        fetch_cloudtrail_tags(config, config['output_files']['tags'])
-
+    run_collection(environments, 'cloudprefix', region_collectors)
     print("AWS CloudWatch and CloudTrail configuration evidence collection completed for both environments.")
 
 # Execute main function
@@ -1,9 +1,14 @@
 # Purpose: Provide Evidence for AWS Container Related Services.#
 ################################################################
 import os
-import subprocess
 import datetime
-import json
+
+import _config_path
+from _config.batching import coalescer
+from _config.collection import run_collection
+from _config.engine import AWSCommandError
+from _config.formats import write_evidence
+from _config.tags import tag_index
 
 YEAR = datetime.datetime.now().year
 MONTH = datetime.datetime.now().strftime('%B')
@@ -52,113 +57,107 @@ environments = {
 }
 
 # Helper function to run AWS CLI commands
-def run_command(command):
+def run_command(config, command):
     try:
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
-        return json.loads(result.stdout)
-    except subprocess.CalledProcessError as e:
+        return config['engine'].run_command(command)
+    except AWSCommandError as e:
         print(f"Command failed: {' '.join(command)}\nError: {e}")
         return {}
 
 # ECS Evidence Collection Functions
 def fetch_clusters(config, output_file):
-    clusters_data = run_command(['aws', 'ecs', 'list-clusters', '--region', config['region'], '--output', 'json'])
-    with open(output_file, 'w') as f:
-        json.dump(clusters_data, f, indent=4)
+    clusters_data = run_command(config, ['aws', 'ecs', 'list-clusters', '--region', config['region'], '--output', 'json'])
+    write_evidence(output_file, clusters_data)
 
 def fetch_services(config, output_file):
-    clusters_data = run_command(['aws', 'ecs', 'list-clusters', '--region', config['region'], '--output', 'json'])
+    clusters_data = run_command(config, ['aws', 'ecs', 'list-clusters', '--region', config['region'], '--output', 'json'])
     services_data = []
     for cluster_arn in clusters_data.get('clusterArns', []):
-        services = run_command(['aws', 'ecs', 'list-services', '--cluster', cluster_arn, '--output', 'json'])
-        services_data.extend(services.get('serviceArns', []))
-    with open(output_file, 'w') as f:
-        json.dump(services_data, f, indent=4)
+        services = run_command(config, ['aws', 'ecs', 'list-services', '--cluster', cluster_arn, '--output', 'json'])
+        # describe-services takes 10 services per call
+        described = coalescer(config).describe(
+            ['aws', 'ecs', 'describe-services', '--cluster', cluster_arn, '--output', 'json'],
+            services.get('serviceArns', []))
+        services_data.extend(service for service in described if service)
+    write_evidence(output_file, services_data)
 
 def fetch_tasks(config, output_file):
-    clusters_data = run_command(['aws', 'ecs', 'list-clusters', '--region', config['region'], '--output', 'json'])
+    clusters_data = run_command(config, ['aws', 'ecs', 'list-clusters', '--region', config['region'], '--output', 'json'])
     tasks_data = []
     for cluster_arn in clusters_data.get('clusterArns', []):
-        tasks = run_command(['aws', 'ecs', 'list-tasks', '--cluster', cluster_arn, '--output', 'json'])
-        tasks_data.extend(tasks.get('taskArns', []))
-    with open(output_file, 'w') as f:
-        json.dump(tasks_data, f, indent=4)
+        tasks = run_command(config, ['aws', 'ecs', 'list-tasks', '--cluster', cluster_arn, '--output', 'json'])
+        # describe-tasks takes 100 tasks per call
+        described = coalescer(config).describe(
+            ['aws', 'ecs', 'describe-tasks', '--cluster', cluster_arn, '--output', 'json'],
+            tasks.get('taskArns', []))
+        tasks_data.extend(task for task in described if task)
+    write_evidence(output_file, tasks_data)
 
 def fetch_task_definitions(config, output_file):
-    task_definitions_data = run_command(['aws', 'ecs', 'list-task-definitions', '--region', config['region'], '--output', 'json'])
-    with open(output_file, 'w') as f:
-        json.dump(task_definitions_data, f, indent=4)
+    task_definitions_data = run_command(config, ['aws', 'ecs', 'list-task-definitions', '--region', config['region'], '--output', 'json'])
+    write_evidence(output_file, task_definitions_data)
 
 def fetch_ecs_tags(config, output_file):
-    clusters_data = run_command(['aws', 'ecs', 'list-clusters', '--region', config['region'], '--output', 'json'])
-    tags_data = []
-    for cluster_arn in clusters_data.get('clusterArns', []):
-        cluster_tags = run_command(['aws', 'ecs', 'list-tags-for-resource', '--resource-arn', cluster_arn, '--output', 'json'])
-        tags_data.append({'ResourceArn': cluster_arn, 'Tags': cluster_tags.get('tags', [])})
-    with open(output_file, 'w') as f:
-        json.dump(tags_data, f, indent=4)
+    clusters_data = run_command(config, ['aws', 'ecs', 'list-clusters', '--region', config['region'], '--output', 'json'])
+    tags = tag_index(config)
+    tags_data = [
+        {'ResourceArn': cluster_arn, 'Tags': tags.tags(cluster_arn, 'key', 'value')}
+        for cluster_arn in clusters_data.get('clusterArns', [])
+    ]
+    write_evidence(output_file, tags_data)
 
 # ECR Evidence Collection Functions
 def fetch_public_repositories(config, output_file):
-    public_repositories_data = run_command(['aws', 'ecr-public', 'describe-repositories', '--region', config['region'], '--output', 'json'])
-    with open(output_file, 'w') as f:
-        json.dump(public_repositories_data, f, indent=4)
+    public_repositories_data = run_command(config, ['aws', 'ecr-public', 'describe-repositories', '--region', config['region'], '--output', 'json'])
+    write_evidence(output_file, public_repositories_data)
 
 def fetch_public_images(config, output_file):
-    repositories_data = run_command(['aws', 'ecr-public', 'describe-repositories', '--region', config['region'], '--output', 'json'])
+    repositories_data = run_command(config, ['aws', 'ecr-public', 'describe-repositories', '--region', config['region'], '--output', 'json'])
     images_data = []
     for repo in repositories_data.get('repositories', []):
         repo_name = repo['repositoryName']
-        images = run_command(['aws', 'ecr-public', 'describe-images', '--repository-name', repo_name, '--output', 'json'])
+        images = run_command(config, ['aws', 'ecr-public', 'describe-images', '--repository-name', repo_name, '--output', 'json'])
         images_data.extend(images.get('imageDetails', []))
-    with open(output_file, 'w') as f:
-        json.dump(images_data, f, indent=4)
+    write_evidence(output_file, images_data)
 
 def fetch_repository_policies(config, output_file):
-    repositories_data = run_command(['aws', 'ecr-public', 'describe-repositories', '--region', config['region'], '--output', 'json'])
+    repositories_data = run_command(config, ['aws', 'ecr-public', 'describe-repositories', '--region', config['region'], '--output', 'json'])
     repository_policies_data = []
     for repo in repositories_data.get('repositories', []):
         repo_name = repo['repositoryName']
-        repo_policy = run_command(['aws', 'ecr-public', 'get-repository-policy', '--repository-name', repo_name, '--output', 'json'])
+        repo_policy = run_command(config, ['aws', 'ecr-public', 'get-repository-policy', '--repository-name', repo_name, '--output', 'json'])
         repository_policies_data.append({'RepositoryName': repo_name, 'Policy': repo_policy})
-    with open(output_file, 'w') as f:
-        json.dump(repository_policies_data, f, indent=4)
+    write_evidence(output_file, repository_policies_data)
 
 def fetch_ecr_public_tags(config, output_file):
-    repositories_data = run_command(['aws', 'ecr-public', 'describe-repositories', '--region', config['region'], '--output', 'json'])
+    repositories_data = run_command(config, ['aws', 'ecr-public', 'describe-repositories', '--region', config['region'], '--output', 'json'])
     tags_data = []
     for repo in repositories_data.get('repositories', []):
         repo_arn = repo['repositoryArn']
-        repo_tags = run_command(['aws', 'ecr-public', 'list-tags-for-resource', '--resource-arn', repo_arn, '--output', 'json'])
+        repo_tags = run_command(config, ['aws', 'ecr-public', 'list-tags-for-resource', '--resource-arn', repo_arn, '--output', 'json'])
         tags_data.append({'RepositoryArn': repo_arn, 'Tags': repo_tags.get('tags', [])})
-    with open(output_file, 'w') as f:
-        json.dump(tags_data, f, indent=4)
+    write_evidence(output_file, tags_data)
+
+def region_collectors(config, scheduler, delta):
+    # Collect evidence for ECS configurations
+    scheduler.add('clusters', delta.collect, fetch_clusters, 'clusters', 'ecs', service='ecs')
+    scheduler.add('services', delta.collect, fetch_services, 'services', 'ecs', service='ecs')
+    scheduler.add('tasks', delta.collect, fetch_tasks, 'tasks', service='ecs')
+    scheduler.add('task_definitions', delta.collect, fetch_task_definitions, 'task_definitions', 'ecs', service='ecs')
+    scheduler.add('ecs_tags', delta.collect, fetch_ecs_tags, 'ecs_tags', 'ecs', 'tagging', service='ecs')
+
+def account_collectors(config, scheduler):
+    # ECR Public is not regional, collected once per account alongside the region sweep
+    scheduler.add('public_repositories', fetch_public_repositories, config,
+                  config['output_files']['public_repositories'], service='ecr-public')
+    scheduler.add('public_images', fetch_public_images, config, config['output_files']['public_images'], service='ecr-public')
+    scheduler.add('repository_policies', fetch_repository_policies, config,
+                  config['output_files']['repository_policies'], service='ecr-public')
+    scheduler.add('ecr_tags', fetch_ecr_public_tags, config, config['output_files']['ecr_tags'], service='ecr-public')
 
 # Main function to execute each evidence collection task for both environments
 def main():
-    for env_name, config in environments.items():
-        # Set AWS environment variables for each environment
-        os.environ['AWS_ACCESS_KEY_ID'] = config['access_key']
-        os.environ['AWS_SECRET_ACCESS_KEY'] = config['secret_key']
-        os.environ['AWS_DEFAULT_REGION'] = config['region']
-        
-        # Ensure directories exist for output files
-        for file_path in config['output_files'].values():
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-
-        # Collect evidence for ECS configurations
-        fetch_clusters(config, config['output_files']['clusters'])
-        fetch_services(config, config['output_files']['services'])
-        fetch_tasks(config, config['output_files']['tasks'])
-        fetch_task_definitions(config, config['output_files']['task_definitions'])
-        fetch_ecs_tags(config, config['output_files']['ecs_tags'])
-
-        # Collect evidence for ECR configurations
-        fetch_public_repositories(config, config['output_files']['public_repositories'])
-        fetch_public_images(config, config['output_files']['public_images'])
-        fetch_repository_policies(config, config['output_files']['repository_policies'])
-        fetch_ecr_public_tags(config, config['output_files']['ecr_tags'])
-
+    run_collection(environments, 'containers', region_collectors, account_collectors)
     print("AWS ECS and ECR configuration evidence collection completed for both environments.")
 
 # Execute main function
@@ -1,9 +1,13 @@
 # Purpose: Provide Evidence for AWS Network Related Services.#
 ##############################################################
 import os
-import subprocess
 import datetime
-import json
+
+import _config_path
+from _config.collection import run_collection
+from _config.engine import AWSCommandError
+from _config.formats import write_evidence
+from _config.tags import tag_index
 
 YEAR = datetime.datetime.now().year
 MONTH = datetime.datetime.now().strftime('%B')
@@ -29,7 +33,7 @@ environments = {
             'wafv2_rules': f"/evidence-artifacts/systems/aws/{YEAR}/{MONTH}-{DAY}-wafv2_rules.json",
             'wafv2_ip_sets': f"/evidence-artifacts/systems/aws/{YEAR}/{MONTH}-{DAY}-wafv2_ip_sets.json",
             'wafv2_logging_config': f"/evidence-artifacts/systems/aws/{YEAR}/{MONTH}-{DAY}-wafv2_logging_config.json",
-            'wafv2_tags': f"/evidence-artifacts/systems/aws/{YEAR}/{MONTH}-{DAY}-wafv2_tags.json"
+            'wafv2_tags': f"/evidence-artifacts/systems/aws/{YEAR}/{MONTH}-{DAY}-wafv2_tags.json",
             # App Mesh Files
             'meshes': f"/evidence-artifacts/commercial/systems/aws/{YEAR}/{MONTH}-{DAY}-appmesh_meshes.json",
             'virtual_services': f"/evidence-artifacts/commercial/systems/aws/{YEAR}/{MONTH}-{DAY}-appmesh_virtual_services.json",
@@ -55,7 +59,7 @@ environments = {
             'wafv2_rules': f"/evidence-artifacts/federal/systems/aws/{YEAR}/{MONTH}-{DAY}-wafv2_rules.json",
             'wafv2_ip_sets': f"/evidence-artifacts/federal/systems/aws/{YEAR}/{MONTH}-{DAY}-wafv2_ip_sets.json",
             'wafv2_logging_config': f"/evidence-artifacts/federal/systems/aws/{YEAR}/{MONTH}-{DAY}-wafv2_logging_config.json",
-            'wafv2_tags': f"/evidence-artifacts/federal/systems/aws/{YEAR}/{MONTH}-{DAY}-wafv2_tags.json"
+            'wafv2_tags': f"/evidence-artifacts/federal/systems/aws/{YEAR}/{MONTH}-{DAY}-wafv2_tags.json",
             # App Mesh Files
             'meshes': f"/evidence-artifacts/federal/systems/aws/{YEAR}/{MONTH}-{DAY}-appmesh_meshes.json",
             'virtual_services': f"/evidence-artifacts/federal/systems/aws/{YEAR}/{MONTH}-{DAY}-appmesh_virtual_services.json",
@@ -67,222 +71,188 @@ environments = {
     }
 }
 
-def run_command(command):
+def run_command(config, command):
     try:
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
-        return json.loads(result.stdout)
-    except subprocess.CalledProcessError as e:
+        return config['engine'].run_command(command)
+    except AWSCommandError as e:
         print(f"Command failed: {' '.join(command)}\nError: {e}")
         return {}
 
 # ELBv2 evidence collection functions
 def fetch_load_balancers(config, output_file):
-    load_balancers_data = run_command(['aws', 'elbv2', 'describe-load-balancers', '--region', config['region'], '--output', 'json'])
-    with open(output_file, 'w') as f:
-        json.dump(load_balancers_data, f, indent=4)
+    load_balancers_data = run_command(config, ['aws', 'elbv2', 'describe-load-balancers', '--region', config['region'], '--output', 'json'])
+    write_evidence(output_file, load_balancers_data)
+
+def list_listeners(config):
+    load_balancers_data = run_command(config, ['aws', 'elbv2', 'describe-load-balancers', '--region', config['region'], '--output', 'json'])
+    lb_arns = [lb['LoadBalancerArn'] for lb in load_balancers_data.get('LoadBalancers', [])]
+    return config['fanout'].flat_map(
+        lambda lb_arn: run_command(config, ['aws', 'elbv2', 'describe-listeners', '--load-balancer-arn', lb_arn, '--output', 'json']).get('Listeners', []),
+        lb_arns, service='elbv2')
 
 def fetch_listeners(config, output_file):
-    load_balancers_data = run_command(['aws', 'elbv2', 'describe-load-balancers', '--region', config['region'], '--output', 'json'])
-    listeners_data = []
-    for lb in load_balancers_data.get('LoadBalancers', []):
-        lb_arn = lb['LoadBalancerArn']
-        lb_listeners = run_command(['aws', 'elbv2', 'describe-listeners', '--load-balancer-arn', lb_arn, '--output', 'json'])
-        listeners_data.extend(lb_listeners.get('Listeners', []))
-    with open(output_file, 'w') as f:
-        json.dump(listeners_data, f, indent=4)
+    listeners_data = list_listeners(config)
+    write_evidence(output_file, listeners_data)
 
 def fetch_listener_rules(config, output_file):
-    load_balancers_data = run_command(['aws', 'elbv2', 'describe-load-balancers', '--region', config['region'], '--output', 'json'])
-    listener_rules_data = []
-    for lb in load_balancers_data.get('LoadBalancers', []):
-        lb_arn = lb['LoadBalancerArn']
-        listeners = run_command(['aws', 'elbv2', 'describe-listeners', '--load-balancer-arn', lb_arn, '--output', 'json'])
-        for listener in listeners.get('Listeners', []):
-            listener_arn = listener['ListenerArn']
-            rules = run_command(['aws', 'elbv2', 'describe-rules', '--listener-arn', listener_arn, '--output', 'json'])
-            listener_rules_data.extend(rules.get('Rules', []))
-    with open(output_file, 'w') as f:
-        json.dump(listener_rules_data, f, indent=4)
+    listener_arns = [listener['ListenerArn'] for listener in list_listeners(config)]
+    listener_rules_data = config['fanout'].flat_map(
+        lambda listener_arn: run_command(config, ['aws', 'elbv2', 'describe-rules', '--listener-arn', listener_arn, '--output', 'json']).get('Rules', []),
+        listener_arns, service='elbv2')
+    write_evidence(output_file, listener_rules_data)
 
 def fetch_target_groups(config, output_file):
-    target_groups_data = run_command(['aws', 'elbv2', 'describe-target-groups', '--region', config['region'], '--output', 'json'])
-    detailed_target_groups_data = []
-    for tg in target_groups_data.get('TargetGroups', []):
-        tg_arn = tg['TargetGroupArn']
-        tg_details = run_command(['aws', 'elbv2', 'describe-target-health', '--target-group-arn', tg_arn, '--output', 'json'])
-        detailed_target_groups_data.append({
+    target_groups_data = run_command(config, ['aws', 'elbv2', 'describe-target-groups', '--region', config['region'], '--output', 'json'])
+
+    def describe_target_health(tg):
+        tg_details = run_command(config, ['aws', 'elbv2', 'describe-target-health', '--target-group-arn', tg['TargetGroupArn'], '--output', 'json'])
+        return {
             'TargetGroup': tg,
             'TargetHealthDescriptions': tg_details.get('TargetHealthDescriptions', [])
-        })
-    with open(output_file, 'w') as f:
-        json.dump(detailed_target_groups_data, f, indent=4)
+        }
 
-def fetch_elbv2_tags(config, output_file):
-    load_balancers_data = run_command(['aws', 'elbv2', 'describe-load-balancers', '--region', config['region'], '--output', 'json'])
-    target_groups_data = run_command(['aws', 'elbv2', 'describe-target-groups', '--region', config['region'], '--output', 'json'])
-    tags_data = []
+    detailed_target_groups_data = config['fanout'].map(describe_target_health, target_groups_data.get('TargetGroups', []), service='elbv2')
+    write_evidence(output_file, detailed_target_groups_data)
 
-    # Fetch tags for each load balancer
-    for lb in load_balancers_data.get('LoadBalancers', []):
-        lb_arn = lb['LoadBalancerArn']
-        lb_tags = run_command(['aws', 'elbv2', 'describe-tags', '--resource-arns', lb_arn, '--output', 'json'])
-        tags_data.append({'ResourceArn': lb_arn, 'Tags': lb_tags.get('TagDescriptions', [])})
+def fetch_elbv2_tags(config, output_file):
+    load_balancers_data = run_command(config, ['aws', 'elbv2', 'describe-load-balancers', '--region', config['region'], '--output', 'json'])
+    target_groups_data = run_command(config, ['aws', 'elbv2', 'describe-target-groups', '--region', config['region'], '--output', 'json'])
+    resource_arns = [lb['LoadBalancerArn'] for lb in load_balancers_data.get('LoadBalancers', [])]
+    resource_arns += [tg['TargetGroupArn'] for tg in target_groups_data.get('TargetGroups', [])]
 
-    # Fetch tags for each target group
-    for tg in target_groups_data.get('TargetGroups', []):
-        tg_arn = tg['TargetGroupArn']
-        tg_tags = run_command(['aws', 'elbv2', 'describe-tags', '--resource-arns', tg_arn, '--output', 'json'])
-        tags_data.append({'ResourceArn': tg_arn, 'Tags': tg_tags.get('TagDescriptions', [])})
+    # Tags of every load balancer and target group, shaped like elbv2 describe-tags TagDescriptions
+    tags = tag_index(config)
+    tags_data = [
+        {'ResourceArn': arn, 'Tags': [{'ResourceArn': arn, 'Tags': tags.tags(arn)}]}
+        for arn in resource_arns
+    ]
 
-    with open(output_file, 'w') as f:
-        json.dump(tags_data, f, indent=4)
+    write_evidence(output_file, tags_data)
 
 # WAFv2 evidence collection functions
 def fetch_web_acls(config, output_file):
-    web_acls_data = run_command(['aws', 'wafv2', 'list-web-acls', '--scope', 'REGIONAL', '--region', config['region'], '--output', 'json'])
-    with open(output_file, 'w') as f:
-        json.dump(web_acls_data, f, indent=4)
+    web_acls_data = run_command(config, ['aws', 'wafv2', 'list-web-acls', '--scope', 'REGIONAL', '--region', config['region'], '--output', 'json'])
+    write_evidence(output_file, web_acls_data)
 
 def fetch_rules(config, output_file):
-    web_acls_data = run_command(['aws', 'wafv2', 'list-web-acls', '--scope', 'REGIONAL', '--region', config['region'], '--output', 'json'])
+    web_acls_data = run_command(config, ['aws', 'wafv2', 'list-web-acls', '--scope', 'REGIONAL', '--region', config['region'], '--output', 'json'])
     rules_data = []
     for acl in web_acls_data['WebACLs']:
-        acl_rules = run_command(['aws', 'wafv2', 'get-web-acl', '--scope', 'REGIONAL', '--region', config['region'], '--name', acl['Name'], '--id', acl['Id'], '--output', 'json'])
+        acl_rules = run_command(config, ['aws', 'wafv2', 'get-web-acl', '--scope', 'REGIONAL', '--region', config['region'], '--name', acl['Name'], '--id', acl['Id'], '--output', 'json'])
         rules_data.append(acl_rules)
-    with open(output_file, 'w') as f:
-        json.dump(rules_data, f, indent=4)
+    write_evidence(output_file, rules_data)
 
 def fetch_ip_sets(config, output_file):
-    ip_sets_data = run_command(['aws', 'wafv2', 'list-ip-sets', '--scope', 'REGIONAL', '--region', config['region'], '--output', 'json'])
-    with open(output_file, 'w') as f:
-        json.dump(ip_sets_data, f, indent=4)
+    ip_sets_data = run_command(config, ['aws', 'wafv2', 'list-ip-sets', '--scope', 'REGIONAL', '--region', config['region'], '--output', 'json'])
+    write_evidence(output_file, ip_sets_data)
 
 def fetch_logging_config(config, output_file):
-    logging_config_data = run_command(['aws', 'wafv2', 'list-logging-configurations', '--scope', 'REGIONAL', '--region', config['region'], '--output', 'json'])
-    with open(output_file, 'w') as f:
-        json.dump(logging_config_data, f, indent=4)
+    logging_config_data = run_command(config, ['aws', 'wafv2', 'list-logging-configurations', '--scope', 'REGIONAL', '--region', config['region'], '--output', 'json'])
+    write_evidence(output_file, logging_config_data)
 
 def fetch_wafv2_tags(config, output_file):
-    web_acls_data = run_command(['aws', 'wafv2', 'list-web-acls', '--scope', 'REGIONAL', '--region', config['region'], '--output', 'json'])
-    tags_data = []
-    for acl in web_acls_data['WebACLs']:
-        acl_arn = acl['ARN']
-        acl_tags = run_command(['aws', 'wafv2', 'list-tags-for-resource', '--resource-arn', acl_arn, '--region', config['region'], '--output', 'json'])
-        tags_data.append({'ResourceArn': acl_arn, 'Tags': acl_tags.get('TagInfoForResource', {}).get('TagList', [])})
-    with open(output_file, 'w') as f:
-        json.dump(tags_data, f, indent=4)
+    web_acls_data = run_command(config, ['aws', 'wafv2', 'list-web-acls', '--scope', 'REGIONAL', '--region', config['region'], '--output', 'json'])
+    tags = tag_index(config)
+    tags_data = [{'ResourceArn': acl['ARN'], 'Tags': tags.tags(acl['ARN'])} for acl in web_acls_data['WebACLs']]
+    write_evidence(output_file, tags_data)
 
 # App Mesh evidence collection functions
 def fetch_meshes(config, output_file):
-    meshes_data = run_command(['aws', 'appmesh', 'list-meshes', '--region', config['region'], '--output', 'json'])
+    meshes_data = run_command(config, ['aws', 'appmesh', 'list-meshes', '--region', config['region'], '--output', 'json'])
     detailed_meshes_data = []
     for mesh in meshes_data['meshes']:
         mesh_name = mesh['meshName']
-        mesh_details = run_command(['aws', 'appmesh', 'describe-mesh', '--mesh-name', mesh_name, '--output', 'json'])
+        mesh_details = run_command(config, ['aws', 'appmesh', 'describe-mesh', '--mesh-name', mesh_name, '--output', 'json'])
         detailed_meshes_data.append(mesh_details)
-    with open(output_file, 'w') as f:
-        json.dump(detailed_meshes_data, f, indent=4)
+    write_evidence(output_file, detailed_meshes_data)
 
 def fetch_virtual_services(config, output_file):
-    meshes_data = run_command(['aws', 'appmesh', 'list-meshes', '--region', config['region'], '--output', 'json'])
+    meshes_data = run_command(config, ['aws', 'appmesh', 'list-meshes', '--region', config['region'], '--output', 'json'])
     virtual_services_data = []
     for mesh in meshes_data['meshes']:
         mesh_name = mesh['meshName']
-        services = run_command(['aws', 'appmesh', 'list-virtual-services', '--mesh-name', mesh_name, '--output', 'json'])
+        services = run_command(config, ['aws', 'appmesh', 'list-virtual-services', '--mesh-name', mesh_name, '--output', 'json'])
         for service in services['virtualServices']:
             service_name = service['virtualServiceName']
-            service_details = run_command(['aws', 'appmesh', 'describe-virtual-service', '--mesh-name', mesh_name, '--virtual-service-name', service_name, '--output', 'json'])
+            service_details = run_command(config, ['aws', 'appmesh', 'describe-virtual-service', '--mesh-name', mesh_name, '--virtual-service-name', service_name, '--output', 'json'])
             virtual_services_data.append(service_details)
-    with open(output_file, 'w') as f:
-        json.dump(virtual_services_data, f, indent=4)
+    write_evidence(output_file, virtual_services_data)
 
 def fetch_virtual_routers(config, output_file):
-    meshes_data = run_command(['aws', 'appmesh', 'list-meshes', '--region', config['region'], '--output', 'json'])
+    meshes_data = run_command(config, ['aws', 'appmesh', 'list-meshes', '--region', config['region'], '--output', 'json'])
     virtual_routers_data = []
     for mesh in meshes_data['meshes']:
         mesh_name = mesh['meshName']
-        routers = run_command(['aws', 'appmesh', 'list-virtual-routers', '--mesh-name', mesh_name, '--output', 'json'])
+        routers = run_command(config, ['aws', 'appmesh', 'list-virtual-routers', '--mesh-name', mesh_name, '--output', 'json'])
         for router in routers['virtualRouters']:
             router_name = router['virtualRouterName']
-            router_details = run_command(['aws', 'appmesh', 'describe-virtual-router', '--mesh-name', mesh_name, '--virtual-router-name', router_name, '--output', 'json'])
+            router_details = run_command(config, ['aws', 'appmesh', 'describe-virtual-router', '--mesh-name', mesh_name, '--virtual-router-name', router_name, '--output', 'json'])
             virtual_routers_data.append(router_details)
-    with open(output_file, 'w') as f:
-        json.dump(virtual_routers_data, f, indent=4)
+    write_evidence(output_file, virtual_routers_data)
 
 def fetch_virtual_nodes(config, output_file):
-    meshes_data = run_command(['aws', 'appmesh', 'list-meshes', '--region', config['region'], '--output', 'json'])
+    meshes_data = run_command(config, ['aws', 'appmesh', 'list-meshes', '--region', config['region'], '--output', 'json'])
     virtual_nodes_data = []
     for mesh in meshes_data['meshes']:
         mesh_name = mesh['meshName']
-        nodes = run_command(['aws', 'appmesh', 'list-virtual-nodes', '--mesh-name', mesh_name, '--output', 'json'])
+        nodes = run_command(config, ['aws', 'appmesh', 'list-virtual-nodes', '--mesh-name', mesh_name, '--output', 'json'])
         for node in nodes['virtualNodes']:
             node_name = node['virtualNodeName']
-            node_details = run_command(['aws', 'appmesh', 'describe-virtual-node', '--mesh-name', mesh_name, '--virtual-node-name', node_name, '--output', 'json'])
+            node_details = run_command(config, ['aws', 'appmesh', 'describe-virtual-node', '--mesh-name', mesh_name, '--virtual-node-name', node_name, '--output', 'json'])
             virtual_nodes_data.append(node_details)
-    with open(output_file, 'w') as f:
-        json.dump(virtual_nodes_data, f, indent=4)
+    write_evidence(output_file, virtual_nodes_data)
 
 def fetch_virtual_gateways(config, output_file):
-    meshes_data = run_command(['aws', 'appmesh', 'list-meshes', '--region', config['region'], '--output', 'json'])
+    meshes_data = run_command(config, ['aws', 'appmesh', 'list-meshes', '--region', config['region'], '--output', 'json'])
     virtual_gateways_data = []
     for mesh in meshes_data['meshes']:
         mesh_name = mesh['meshName']
-        gateways = run_command(['aws', 'appmesh', 'list-virtual-gateways', '--mesh-name', mesh_name, '--output', 'json'])
+        gateways = run_command(config, ['aws', 'appmesh', 'list-virtual-gateways', '--mesh-name', mesh_name, '--output', 'json'])
         for gateway in gateways['virtualGateways']:
             gateway_name = gateway['virtualGatewayName']
-            gateway_details = run_command(['aws', 'appmesh', 'describe-virtual-gateway', '--mesh-name', mesh_name, '--virtual-gateway-name', gateway_name, '--output', 'json'])
+            gateway_details = run_command(config, ['aws', 'appmesh', 'describe-virtual-gateway', '--mesh-name', mesh_name, '--virtual-gateway-name', gateway_name, '--output', 'json'])
             virtual_gateways_data.append(gateway_details)
-    with open(output_file, 'w') as f:
-        json.dump(virtual_gateways_data, f, indent=4)
+    write_evidence(output_file, virtual_gateways_data)
 
 def fetch_routes(config, output_file):
-    meshes_data = run_command(['aws', 'appmesh', 'list-meshes', '--region', config['region'], '--output', 'json'])
+    meshes_data = run_command(config, ['aws', 'appmesh', 'list-meshes', '--region', config['region'], '--output', 'json'])
     routes_data = []
     for mesh in meshes_data['meshes']:
         mesh_name = mesh['meshName']
-        routers = run_command(['aws', 'appmesh', 'list-virtual-routers', '--mesh-name', mesh_name, '--output', 'json'])
+        routers = run_command(config, ['aws', 'appmesh', 'list-virtual-routers', '--mesh-name', mesh_name, '--output', 'json'])
         for router in routers['virtualRouters']:
             router_name = router['virtualRouterName']
-            routes = run_command(['aws', 'appmesh', 'list-routes', '--mesh-name', mesh_name, '--virtual-router-name', router_name, '--output', 'json'])
+            routes = run_command(config, ['aws', 'appmesh', 'list-routes', '--mesh-name', mesh_name, '--virtual-router-name', router_name, '--output', 'json'])
             for route in routes['routes']:
                 route_name = route['routeName']
-                route_details = run_command(['aws', 'appmesh', 'describe-route', '--mesh-name', mesh_name, '--virtual-router-name', router_name, '--route-name', route_name, '--output', 'json'])
+                route_details = run_command(config, ['aws', 'appmesh', 'describe-route', '--mesh-name', mesh_name, '--virtual-router-name', router_name, '--route-name', route_name, '--output', 'json'])
                 routes_data.append(route_details)
-    with open(output_file, 'w') as f:
-        json.dump(routes_data, f, indent=4)
-
-# Main function to execute each evidence collection task for both environments
-def main():
-    for env_name, config in environments.items():
-        # Set AWS environment variables for each environment
-        os.environ['AWS_ACCESS_KEY_ID'] = config['access_key']
-        os.environ['AWS_SECRET_ACCESS_KEY'] = config['secret_key']
-        os.environ['AWS_DEFAULT_REGION'] = config['region']
-        
-        # Ensure directories exist for output files
-        for file_path in config['output_files'].values():
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    write_evidence(output_file, routes_data)
 
-        # Collect evidence for ELBv2, WAFv2, and App Mesh configurations
-        fetch_load_balancers(config, config['output_files']['elbv2_load_balancers'])
-        fetch_listeners(config, config['output_files']['elbv2_listeners'])
-        fetch_listener_rules(config, config['output_files']['elbv2_listener_rules'])
-        fetch_target_groups(config, config['output_files']['elbv2_target_groups'])
-        fetch_elbv2_tags(config, config['output_files']['elbv2_tags'])
+def region_collectors(config, scheduler, delta):
+    # Collect evidence for ELBv2, WAFv2, and App Mesh configurations
+    scheduler.add('elbv2_load_balancers', delta.collect, fetch_load_balancers, 'elbv2_load_balancers', 'elasticloadbalancing', service='elbv2')
+    scheduler.add('elbv2_listeners', delta.collect, fetch_listeners, 'elbv2_listeners', 'elasticloadbalancing', service='elbv2')
+    scheduler.add('elbv2_listener_rules', delta.collect, fetch_listener_rules, 'elbv2_listener_rules', 'elasticloadbalancing', service='elbv2')
+    scheduler.add('elbv2_target_groups', delta.collect, fetch_target_groups, 'elbv2_target_groups', service='elbv2')
+    scheduler.add('elbv2_tags', delta.collect, fetch_elbv2_tags, 'elbv2_tags', 'elasticloadbalancing', 'tagging', service='elbv2')
 
-        fetch_web_acls(config, config['output_files']['wafv2_web_acls'])
-        fetch_rules(config, config['output_files']['wafv2_rules'])
-        fetch_ip_sets(config, config['output_files']['wafv2_ip_sets'])
-        fetch_logging_config(config, config['output_files']['wafv2_logging_config'])
-        fetch_wafv2_tags(config, config['output_files']['wafv2_tags'])
+    scheduler.add('wafv2_web_acls', delta.collect, fetch_web_acls, 'wafv2_web_acls', 'wafv2', service='wafv2')
+    scheduler.add('wafv2_rules', delta.collect, fetch_rules, 'wafv2_rules', 'wafv2', service='wafv2')
+    scheduler.add('wafv2_ip_sets', delta.collect, fetch_ip_sets, 'wafv2_ip_sets', 'wafv2', service='wafv2')
+    scheduler.add('wafv2_logging_config', delta.collect, fetch_logging_config, 'wafv2_logging_config', 'wafv2', service='wafv2')
+    scheduler.add('wafv2_tags', delta.collect, fetch_wafv2_tags, 'wafv2_tags', 'wafv2', 'tagging', service='wafv2')
 
-        fetch_meshes(config, config['output_files']['meshes'])
-        fetch_virtual_services(config, config['output_files']['virtual_services'])
-        fetch_virtual_routers(config, config['output_files']['virtual_routers'])
-        fetch_virtual_nodes(config, config['output_files']['virtual_nodes'])
-        fetch_virtual_gateways(config, config['output_files']['virtual_gateways'])
-        fetch_routes(config, config['output_files']['routes'])
+    scheduler.add('meshes', delta.collect, fetch_meshes, 'meshes', 'appmesh', service='appmesh')
+    scheduler.add('virtual_services', delta.collect, fetch_virtual_services, 'virtual_services', 'appmesh', service='appmesh')
+    scheduler.add('virtual_routers', delta.collect, fetch_virtual_routers, 'virtual_routers', 'appmesh', service='appmesh')
+    scheduler.add('virtual_nodes', delta.collect, fetch_virtual_nodes, 'virtual_nodes', 'appmesh', service='appmesh')
+    scheduler.add('virtual_gateways', delta.collect, fetch_virtual_gateways, 'virtual_gateways', 'appmesh', service='appmesh')
+    scheduler.add('routes', delta.collect, fetch_routes, 'routes', 'appmesh', service='appmesh')
 
+# Main function to execute each evidence collection task for both environments
+def main():
+    run_collection(environments, 'networking', region_collectors)
     print("AWS ELBv2, WAFv2, and App Mesh configuration evidence collection completed for both environments.")
 
 # Execute main function
@@ -1,9 +1,13 @@
 # Purpose: Provide Evidence for AWS Security Related Services.#
 ###############################################################
 import os
-import subprocess
 import datetime
-import json
+
+import _config_path
+from _config.collection import run_collection
+from _config.engine import AWSCommandError
+from _config.formats import LARGE_OUTPUT_FORMAT, write_evidence
+from _config.streaming import open_writer, iter_items
 
 # Define current year and month for directory paths
 YEAR = datetime.datetime.now().year
@@ -64,79 +68,77 @@ environments = {
     }
 }
 
-def run_command(command):
+def run_command(config, command):
     try:
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
-        return json.loads(result.stdout)
-    except subprocess.CalledProcessError as e:
+        return config['engine'].run_command(command)
+    except AWSCommandError as e:
         print(f"Command failed: {' '.join(command)}\nError: {e}")
         return {}
 
 # GuardDuty Evidence Collection Functions
 def fetch_detectors(config, output_file):
-    detectors_data = run_command(['aws', 'guardduty', 'list-detectors', '--region', config['region'], '--output', 'json'])
+    detectors_data = run_command(config, ['aws', 'guardduty', 'list-detectors', '--region', config['region'], '--output', 'json'])
     detailed_detectors_data = []
     for detector_id in detectors_data['DetectorIds']:
-        detector_details = run_command(['aws', 'guardduty', 'get-detector', '--detector-id', detector_id, '--output', 'json'])
+        detector_details = run_command(config, ['aws', 'guardduty', 'get-detector', '--detector-id', detector_id, '--output', 'json'])
         detailed_detectors_data.append(detector_details)
-    with open(output_file, 'w') as f:
-        json.dump(detailed_detectors_data, f, indent=4)
+    write_evidence(output_file, detailed_detectors_data)
 
 def fetch_guardduty_members(config, output_file):
-    detectors_data = run_command(['aws', 'guardduty', 'list-detectors', '--region', config['region'], '--output', 'json'])
+    detectors_data = run_command(config, ['aws', 'guardduty', 'list-detectors', '--region', config['region'], '--output', 'json'])
     members_data = []
     for detector_id in detectors_data['DetectorIds']:
-        member_accounts = run_command(['aws', 'guardduty', 'list-members', '--detector-id', detector_id, '--output', 'json'])
+        member_accounts = run_command(config, ['aws', 'guardduty', 'list-members', '--detector-id', detector_id, '--output', 'json'])
         members_data.extend(member_accounts.get('Members', []))
-    with open(output_file, 'w') as f:
-        json.dump(members_data, f, indent=4)
+    write_evidence(output_file, members_data)
 
 def fetch_ip_sets(config, output_file):
-    detectors_data = run_command(['aws', 'guardduty', 'list-detectors', '--region', config['region'], '--output', 'json'])
-    ip_sets_data = []
+    detectors_data = run_command(config, ['aws', 'guardduty', 'list-detectors', '--region', config['region'], '--output', 'json'])
+    ip_set_keys = []
     for detector_id in detectors_data['DetectorIds']:
-        ip_sets = run_command(['aws', 'guardduty', 'list-ip-sets', '--detector-id', detector_id, '--output', 'json'])
-        for ip_set_id in ip_sets['IpSetIds']:
-            ip_set_details = run_command(['aws', 'guardduty', 'get-ip-set', '--detector-id', detector_id, '--ip-set-id', ip_set_id, '--output', 'json'])
-            ip_sets_data.append(ip_set_details)
-    with open(output_file, 'w') as f:
-        json.dump(ip_sets_data, f, indent=4)
+        ip_sets = run_command(config, ['aws', 'guardduty', 'list-ip-sets', '--detector-id', detector_id, '--output', 'json'])
+        ip_set_keys.extend((detector_id, ip_set_id) for ip_set_id in ip_sets['IpSetIds'])
+    ip_sets_data = config['fanout'].map(
+        lambda key: run_command(config, ['aws', 'guardduty', 'get-ip-set', '--detector-id', key[0], '--ip-set-id', key[1], '--output', 'json']),
+        ip_set_keys, service='guardduty')
+    write_evidence(output_file, ip_sets_data)
 
 def fetch_guardduty_publishing_destinations(config, output_file):
-    detectors_data = run_command(['aws', 'guardduty', 'list-detectors', '--region', config['region'], '--output', 'json'])
-    publishing_destinations_data = []
+    detectors_data = run_command(config, ['aws', 'guardduty', 'list-detectors', '--region', config['region'], '--output', 'json'])
+    destination_keys = []
     for detector_id in detectors_data['DetectorIds']:
-        destinations = run_command(['aws', 'guardduty', 'list-publishing-destinations', '--detector-id', detector_id, '--output', 'json'])
-        for destination in destinations['Destinations']:
-            destination_details = run_command(['aws', 'guardduty', 'describe-publishing-destination', '--detector-id', detector_id, '--destination-id', destination['DestinationId'], '--output', 'json'])
-            publishing_destinations_data.append(destination_details)
-    with open(output_file, 'w') as f:
-        json.dump(publishing_destinations_data, f, indent=4)
+        destinations = run_command(config, ['aws', 'guardduty', 'list-publishing-destinations', '--detector-id', detector_id, '--output', 'json'])
+        destination_keys.extend((detector_id, destination['DestinationId']) for destination in destinations['Destinations'])
+    publishing_destinations_data = config['fanout'].map(
+        lambda key: run_command(config, ['aws', 'guardduty', 'describe-publishing-destination', '--detector-id', key[0], '--destination-id', key[1], '--output', 'json']),
+        destination_keys, service='guardduty')
+    write_evidence(output_file, publishing_destinations_data)
 
 def fetch_guardduty_coverage(config, output_file):
-    detectors_data = run_command(['aws', 'guardduty', 'list-detectors', '--region', config['region'], '--output', 'json'])
-    coverage_data = []
-    for detector_id in detectors_data['DetectorIds']:
-        coverage_details = run_command(['aws', 'guardduty', 'list-coverage', '--detector-id', detector_id, '--output', 'json'])
-        coverage_data.extend(coverage_details.get('CoveredResources', []))
-    with open(output_file, 'w') as f:
-        json.dump(coverage_data, f, indent=4)
+    detectors_data = run_command(config, ['aws', 'guardduty', 'list-detectors', '--region', config['region'], '--output', 'json'])
+    # Coverage lists every covered resource, write them to disk page by page as compressed JSON Lines
+    with open_writer(output_file, LARGE_OUTPUT_FORMAT) as writer:
+        for detector_id in detectors_data['DetectorIds']:
+            command = ['aws', 'guardduty', 'list-coverage', '--detector-id', detector_id, '--output', 'json']
+            try:
+                writer.write_all(iter_items(config['engine'].paginate(command), 'Resources'))
+            except AWSCommandError as e:
+                print(f"Command failed: {' '.join(command)}\nError: {e}")
 
 def fetch_organization_configuration(config, output_file):
-    detectors_data = run_command(['aws', 'guardduty', 'list-detectors', '--region', config['region'], '--output', 'json'])
+    detectors_data = run_command(config, ['aws', 'guardduty', 'list-detectors', '--region', config['region'], '--output', 'json'])
     organization_config_data = []
     for detector_id in detectors_data['DetectorIds']:
-        org_config = run_command(['aws', 'guardduty', 'describe-organization-configuration', '--detector-id', detector_id, '--output', 'json'])
+        org_config = run_command(config, ['aws', 'guardduty', 'describe-organization-configuration', '--detector-id', detector_id, '--output', 'json'])
         organization_config_data.append(org_config)
-    with open(output_file, 'w') as f:
-        json.dump(organization_config_data, f, indent=4)
+    write_evidence(output_file, organization_config_data)
 
 # Fetch details of malware scans within the last 31 days
 def fetch_malware_scans(config, output_file):
-    detectors_data = run_command(['aws', 'guardduty', 'list-detectors', '--region', config['region'], '--output', 'json'])
+    detectors_data = run_command(config, ['aws', 'guardduty', 'list-detectors', '--region', config['region'], '--output', 'json'])
     malware_scans_data = []
     for detector_id in detectors_data['DetectorIds']:
-        malware_scans = run_command([
+        malware_scans = run_command(config, [
             'aws', 'guardduty', 'describe-malware-scans',
             '--detector-id', detector_id,
             '--start-time', START_DATE,
@@ -144,47 +146,43 @@ def fetch_malware_scans(config, output_file):
             '--output', 'json'
         ])
         malware_scans_data.extend(malware_scans.get('MalwareScans', []))
-    with open(output_file, 'w') as f:
-        json.dump(malware_scans_data, f, indent=4)
+    write_evidence(output_file, malware_scans_data)
 
 # IAM Evidence Collection Functions
 def fetch_iam_users(config, output_file):
-    users_data = run_command(['aws', 'iam', 'list-users', '--region', config['region'], '--output', 'json'])
+    users_data = run_command(config, ['aws', 'iam', 'list-users', '--region', config['region'], '--output', 'json'])
     detailed_users_data = []
     for user in users_data['Users']:
         user_name = user['UserName']
-        user_details = run_command(['aws', 'iam', 'get-user', '--user-name', user_name, '--output', 'json'])
+        user_details = run_command(config, ['aws', 'iam', 'get-user', '--user-name', user_name, '--output', 'json'])
         detailed_users_data.append(user_details)
-    with open(output_file, 'w') as f:
-        json.dump(detailed_users_data, f, indent=4)
+    write_evidence(output_file, detailed_users_data)
 
 def fetch_roles(config, output_file):
-    roles_data = run_command(['aws', 'iam', 'list-roles', '--region', config['region'], '--output', 'json'])
+    roles_data = run_command(config, ['aws', 'iam', 'list-roles', '--region', config['region'], '--output', 'json'])
     detailed_roles_data = []
     for role in roles_data['Roles']:
         role_name = role['RoleName']
-        role_details = run_command(['aws', 'iam', 'get-role', '--role-name', role_name, '--output', 'json'])
+        role_details = run_command(config, ['aws', 'iam', 'get-role', '--role-name', role_name, '--output', 'json'])
         detailed_roles_data.append(role_details)
-    with open(output_file, 'w') as f:
-        json.dump(detailed_roles_data, f, indent=4)
+    write_evidence(output_file, detailed_roles_data)
 
 # Fetch detailed information for each IAM policy
 def fetch_iam_policies(config, output_file):
-    policies_data = run_command(['aws', 'iam', 'list-policies', '--scope', 'Local', '--region', config['region'], '--output', 'json'])
+    policies_data = run_command(config, ['aws', 'iam', 'list-policies', '--scope', 'Local', '--region', config['region'], '--output', 'json'])
     detailed_policies_data = []
     for policy in policies_data['Policies']:
         policy_arn = policy['Arn']
-        policy_details = run_command(['aws', 'iam', 'get-policy', '--policy-arn', policy_arn, '--output', 'json'])
+        policy_details = run_command(config, ['aws', 'iam', 'get-policy', '--policy-arn', policy_arn, '--output', 'json'])
         policy_version_id = policy_details['Policy']['DefaultVersionId']
-        policy_version = run_command(['aws', 'iam', 'get-policy-version', '--policy-arn', policy_arn, '--version-id', policy_version_id, '--output', 'json'])
+        policy_version = run_command(config, ['aws', 'iam', 'get-policy-version', '--policy-arn', policy_arn, '--version-id', policy_version_id, '--output', 'json'])
         policy_details['Policy']['PolicyVersion'] = policy_version
         detailed_policies_data.append(policy_details)
-    with open(output_file, 'w') as f:
-        json.dump(detailed_policies_data, f, indent=4)
+    write_evidence(output_file, detailed_policies_data)
 
 # Fetch permissions boundaries for each IAM role and user
 def fetch_permissions_boundaries(config, output_file):
-    roles_data = run_command(['aws', 'iam', 'list-roles', '--output', 'json'])
+    roles_data = run_command(config, ['aws', 'iam', 'list-roles', '--output', 'json'])
     permissions_data = []
     for role in roles_data['Roles']:
         if 'PermissionsBoundary' in role:
@@ -193,7 +191,7 @@ def fetch_permissions_boundaries(config, output_file):
                 'RoleName': role['RoleName'],
                 'PermissionsBoundary': boundary
             })
-    users_data = run_command(['aws', 'iam', 'list-users', '--output', 'json'])
+    users_data = run_command(config, ['aws', 'iam', 'list-users', '--output', 'json'])
     for user in users_data['Users']:
         if 'PermissionsBoundary' in user:
             boundary = user['PermissionsBoundary']
@@ -201,34 +199,31 @@ def fetch_permissions_boundaries(config, output_file):
                 'UserName': user['UserName'],
                 'PermissionsBoundary': boundary
             })
-    with open(output_file, 'w') as f:
-        json.dump(permissions_data, f, indent=4)
+    write_evidence(output_file, permissions_data)
 
 # Fetch MFA devices for each IAM user
 def fetch_mfa_devices(config, output_file):
-    users_data = run_command(['aws', 'iam', 'list-users', '--region', config['region'], '--output', 'json'])
+    users_data = run_command(config, ['aws', 'iam', 'list-users', '--region', config['region'], '--output', 'json'])
     mfa_data = []
     for user in users_data['Users']:
         user_name = user['UserName']
-        mfa_devices = run_command(['aws', 'iam', 'list-mfa-devices', '--user-name', user_name, '--output', 'json'])
+        mfa_devices = run_command(config, ['aws', 'iam', 'list-mfa-devices', '--user-name', user_name, '--output', 'json'])
         mfa_data.extend(mfa_devices['MFADevices'])
-    with open(output_file, 'w') as f:
-        json.dump(mfa_data, f, indent=4)
+    write_evidence(output_file, mfa_data)
 
 # Fetch access keys for each IAM user, including those created in the past 31 days
 def fetch_access_keys(config, output_file):
-    users_data = run_command(['aws', 'iam', 'list-users', '--region', config['region'], '--output', 'json'])
+    users_data = run_command(config, ['aws', 'iam', 'list-users', '--region', config['region'], '--output', 'json'])
     access_keys_data = []
     for user in users_data['Users']:
         user_name = user['UserName']
-        access_keys = run_command(['aws', 'iam', 'list-access-keys', '--user-name', user_name, '--output', 'json'])
+        access_keys = run_command(config, ['aws', 'iam', 'list-access-keys', '--user-name', user_name, '--output', 'json'])
         recent_keys = [key for key in access_keys['AccessKeyMetadata'] if key['CreateDate'] >= START_DATE]
         access_keys_data.append({
             'UserName': user_name,
             'AccessKeys': recent_keys
         })
-    with open(output_file, 'w') as f:
-        json.dump(access_keys_data, f, indent=4)
+    write_evidence(output_file, access_keys_data)
 
 # Fetch tags for IAM resources (e.g., users and roles)
 def fetch_iam_tags(config, output_file):
@@ -236,49 +231,40 @@ def fetch_iam_tags(config, output_file):
     tags_data = []
     for resource_type in resources:
         list_command = 'list-users' if resource_type == 'User' else 'list-roles'
-        resources_data = run_command(['aws', 'iam', list_command, '--region', config['region'], '--output', 'json'])
+        resources_data = run_command(config, ['aws', 'iam', list_command, '--region', config['region'], '--output', 'json'])
         for resource in resources_data[resource_type + 's']:
             resource_name = resource['UserName'] if resource_type == 'User' else resource['RoleName']
-            tags = run_command(['aws', 'iam', 'list-user-tags' if resource_type == 'User' else 'list-role-tags', '--' + resource_type.lower() + '-name', resource_name, '--output', 'json'])
+            tags = run_command(config, ['aws', 'iam', 'list-user-tags' if resource_type == 'User' else 'list-role-tags', '--' + resource_type.lower() + '-name', resource_name, '--output', 'json'])
             tags_data.append({
                 resource_type + 'Name': resource_name,
                 'Tags': tags['Tags']
             })
-    with open(output_file, 'w') as f:
-        json.dump(tags_data, f, indent=4)
-
-def main():
-    for env_name, config in environments.items():
-        # Set AWS environment variables for each environment
-        os.environ.update({
-            'AWS_ACCESS_KEY_ID': config['access_key'],
-            'AWS_SECRET_ACCESS_KEY': config['secret_key'],
-            'AWS_DEFAULT_REGION': config['region']
-        })
-        
-        # Ensure directories exist for output files
-        for file_path in config['output_files'].values():
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    write_evidence(output_file, tags_data)
 
-        # Collect evidence for AWS GuardDuty configurations
-        fetch_detectors(config, config['output_files']['detectors'])
-        fetch_guardduty_members(config, config['output_files']['members'])
-        fetch_ip_sets(config, config['output_files']['ip_sets'])
-        fetch_guardduty_publishing_destinations(config, config['output_files']['publishing_destinations'])
-        fetch_guardduty_coverage(config, config['output_files']['coverage'])
-        fetch_malware_scan_settings(config, config['output_files']['malware_scan_settings'])
-        fetch_organization_configuration(config, config['output_files']['organization_configuration'])
-        fetch_malware_scans(config, config['output_files']['malware_scans'])
+def region_collectors(config, scheduler, delta):
+    # Collect evidence for AWS GuardDuty configurations
+    scheduler.add('detectors', delta.collect, fetch_detectors, 'detectors', 'guardduty', service='guardduty')
+    scheduler.add('members', delta.collect, fetch_guardduty_members, 'members', 'guardduty', service='guardduty')
+    scheduler.add('ip_sets', delta.collect, fetch_ip_sets, 'ip_sets', 'guardduty', service='guardduty')
+    scheduler.add('publishing_destinations', delta.collect, fetch_guardduty_publishing_destinations, 'publishing_destinations', 'guardduty', service='guardduty')
+    scheduler.add('coverage', delta.collect, fetch_guardduty_coverage, 'coverage', service='guardduty')
+    scheduler.add('malware_scan_settings', delta.collect, fetch_malware_scan_settings, 'malware_scan_settings', 'guardduty', service='guardduty')
+    scheduler.add('organization_configuration', delta.collect, fetch_organization_configuration, 'organization_configuration', 'guardduty', service='guardduty')
+    scheduler.add('malware_scans', delta.collect, fetch_malware_scans, 'malware_scans', service='guardduty')
 
-        # Collect evidence for AWS IAM configurations
-        fetch_iam_users(config, config['output_files']['users'])
-        fetch_roles(config, config['output_files']['roles'])
-        fetch_iam_policies(config, config['output_files']['policies'])
-        fetch_permissions_boundaries(config, config['output_files']['permissions_boundaries'])
-        fetch_mfa_devices(config, config['output_files']['mfa_devices'])
-        fetch_access_keys(config, config['output_files']['access_keys'])
-        fetch_iam_tags(config, config['output_files']['tags'])
+def account_collectors(config, scheduler):
+    # IAM is a global service, collected once per account alongside the region sweep
+    scheduler.add('users', fetch_iam_users, config, config['output_files']['users'], service='iam')
+    scheduler.add('roles', fetch_roles, config, config['output_files']['roles'], service='iam')
+    scheduler.add('policies', fetch_iam_policies, config, config['output_files']['policies'], service='iam')
+    scheduler.add('permissions_boundaries', fetch_permissions_boundaries, config,
+                  config['output_files']['permissions_boundaries'], service='iam')
+    scheduler.add('mfa_devices', fetch_mfa_devices, config, config['output_files']['mfa_devices'], service='iam')
+    scheduler.add('access_keys', fetch_access_keys, config, config['output_files']['access_keys'], service='iam')
+    scheduler.add('tags', fetch_iam_tags, config, config['output_files']['tags'], service='iam')
 
+def main():
+    run_collection(environments, 'security', region_collectors, account_collectors)
     print("AWS GuardDuty and IAM configuration evidence collection completed for all environments.")
 
 if __name__ == "__main__":
@@ -1,7 +1,9 @@
 import os
-import subprocess
 import datetime
-import json
+
+import _config_path
+from _config.collection import run_collection
+from _config.formats import write_evidence
 
 # Define current year and month for directory paths
 YEAR = datetime.datetime.now().year
@@ -43,64 +45,53 @@ environments = {
 }
 
 # Helper function to run AWS CLI commands
-def run_command(command):
-    result = subprocess.run(command, capture_output=True, text=True)
-    return json.loads(result.stdout)
+def run_command(config, command):
+    return config['engine'].run_command(command)
 
 # Fetch all SES email identities
 def fetch_email_identities(config, output_file):
-    identities_data = run_command(['aws', 'sesv2', 'list-email-identities', '--region', config['region'], '--output', 'json'])
-    with open(output_file, 'w') as f:
-        json.dump(identities_data, f, indent=4)
+    identities_data = run_command(config, ['aws', 'sesv2', 'list-email-identities', '--region', config['region'], '--output', 'json'])
+    write_evidence(output_file, identities_data)
 
 # Fetch configuration sets
 def fetch_configuration_sets(config, output_file):
-    config_sets_data = run_command(['aws', 'sesv2', 'list-configuration-sets', '--region', config['region'], '--output', 'json'])
-    with open(output_file, 'w') as f:
-        json.dump(config_sets_data, f, indent=4)
+    config_sets_data = run_command(config, ['aws', 'sesv2', 'list-configuration-sets', '--region', config['region'], '--output', 'json'])
+    write_evidence(output_file, config_sets_data)
 
 # Fetch dedicated IPs
 def fetch_dedicated_ips(config, output_file):
-    dedicated_ips_data = run_command(['aws', 'sesv2', 'list-dedicated-ips', '--region', config['region'], '--output', 'json'])
-    with open(output_file, 'w') as f:
-        json.dump(dedicated_ips_data, f, indent=4)
+    dedicated_ips_data = run_command(config, ['aws', 'sesv2', 'list-dedicated-ips', '--region', config['region'], '--output', 'json'])
+    write_evidence(output_file, dedicated_ips_data)
 
 # Fetch event destinations for a configuration set
 def fetch_event_destinations(config, output_file, config_set_name):
-    event_destinations_data = run_command([
+    event_destinations_data = run_command(config, [
         'aws', 'sesv2', 'list-event-destinations',
         '--configuration-set-name', config_set_name,
         '--region', config['region'],
         '--output', 'json'
     ])
-    with open(output_file, 'w') as f:
-        json.dump(event_destinations_data, f, indent=4)
+    write_evidence(output_file, event_destinations_data)
 
 # Fetch tags for a specific SES resource
 def fetch_sesv2_tags(config, output_file, resource_arn):
-    tags_data = run_command(['aws', 'sesv2', 'list-tags-for-resource', '--resource-arn', resource_arn, '--region', config['region'], '--output', 'json'])
-    with open(output_file, 'w') as f:
-        json.dump(tags_data, f, indent=4)
+    tags_data = run_command(config, ['aws', 'sesv2', 'list-tags-for-resource', '--resource-arn', resource_arn, '--region', config['region'], '--output', 'json'])
+    write_evidence(output_file, tags_data)
 
-# Main function to execute each evidence collection task
-def main():
-    for env_name, config in environments.items():
-        # Set AWS environment variables for each environment
-        os.environ['AWS_ACCESS_KEY_ID'] = config['access_key']
-        os.environ['AWS_SECRET_ACCESS_KEY'] = config['secret_key']
-        os.environ['AWS_DEFAULT_REGION'] = config['region']
-        
-        # Ensure directories exist for output files
-        for file_path in config['output_files'].values():
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+def collect_sesv2(config):
+    # Collect evidence for AWS SES v2 configurations
+    fetch_email_identities(config, config['output_files']['identities'])
+    fetch_configuration_sets(config, config['output_files']['configuration_sets'])
+    fetch_dedicated_ips(config, config['output_files']['dedicated_ips'])
+    fetch_event_destinations(config, config['output_files']['event_destinations'], config_set_name)
+    fetch_sesv2_tags(config, config['output_files']['tags'], resource_arn)
 
-        # Collect evidence for AWS SES v2 configurations
-        fetch_email_identities(config, config['output_files']['identities'])
-        fetch_configuration_sets(config, config['output_files']['configuration_sets'])
-        fetch_dedicated_ips(config, config['output_files']['dedicated_ips'])
-        fetch_event_destinations(config, config['output_files']['event_destinations'], config_set_name)
-        fetch_sesv2_tags(config, config['output_files']['tags'], resource_arn)
+def region_collectors(config, scheduler, delta):
+    scheduler.add('sesv2', collect_sesv2, config, service='sesv2')
 
+# Main function to execute each evidence collection task
+def main():
+    run_collection(environments, 'simpleemailservice', region_collectors)
     print("AWS SES v2 configuration evidence collection completed.")
 
 # Execute main function
@@ -0,0 +1,88 @@
+import os
+import sys
+import json
+import tempfile
+import unittest
+import importlib.util
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import _config_path
+from _config.engine import AWSCommandError
+
+
+def load_script(name):
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', f"{name}.py")
+    spec = importlib.util.spec_from_file_location(name.replace('.', '_'), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+automation = load_script('automation.services')
+
+FUNCTIONS = [
+    {'FunctionName': 'with-policy', 'FunctionArn': 'arn:aws:lambda:us-east-1:1:function:with-policy', 'Role': 'role-a'},
+    {'FunctionName': 'no-policy', 'FunctionArn': 'arn:aws:lambda:us-east-1:1:function:no-policy', 'Role': 'role-b'},
+]
+
+
+class FakeEngine:
+    env_name = 'test'
+    region = 'us-east-1'
+
+    def run_command(self, command):
+        if command[2] == 'list-functions':
+            return {'Functions': FUNCTIONS}
+        if command[2] == 'get-policy':
+            if command[command.index('--function-name') + 1] == 'no-policy':
+                raise AWSCommandError("lambda GetPolicy failed: ResourceNotFoundException")
+            return {'Policy': '{}'}
+        raise AssertionError(f"Unexpected command {command}")
+
+    def paginate(self, command):
+        if command[2] == 'list-event-source-mappings':
+            yield {'EventSourceMappings': []}
+        else:
+            yield {'ResourceTagMappingList': []}
+
+
+class FakeDelta:
+    def __init__(self):
+        self.recorded = None
+
+    def changed(self, services):
+        return True
+
+    def reuse(self, *keys):
+        return False
+
+    def record(self, *keys):
+        self.recorded = keys
+
+
+class CollectLambdaTest(unittest.TestCase):
+
+    def test_function_without_policy_keeps_other_views(self):
+        with tempfile.TemporaryDirectory() as directory:
+            config = {
+                'engine': FakeEngine(),
+                'region': 'us-east-1',
+                'output_files': {key: os.path.join(directory, f"{key}.json") for key in automation.LAMBDA_FILES},
+            }
+            delta = FakeDelta()
+            automation.collect_lambda(config, delta)
+
+            with open(config['output_files']['function_policies']) as f:
+                policies = json.load(f)
+            self.assertEqual(policies, [
+                {'FunctionName': 'with-policy', 'Policy': {'Policy': '{}'}},
+                {'FunctionName': 'no-policy', 'Policy': {}},
+            ])
+            with open(config['output_files']['execution_roles']) as f:
+                self.assertEqual([role['ExecutionRole'] for role in json.load(f)], ['role-a', 'role-b'])
+            self.assertEqual(delta.recorded, tuple(automation.LAMBDA_FILES))
+
+
+if __name__ == '__main__':
+    unittest.main()